@@ -1,69 +1,155 @@
+import os
+import sys
+if __name__ == '__main__':
+    # Server dev chạy eventlet: vá socket/threading trước mọi import để luồng nền của
+    # message bus không chặn event loop (worker eventlet của gunicorn tự vá sẵn)
+    import eventlet
+    eventlet.monkey_patch()
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from flask import Flask, request, jsonify, Response
-import requests
 from flask_cors import CORS
-import os
-import jwt
-from flask_socketio import SocketIO, emit
-import socketio as socketio_client  # Sử dụng client để forward sang chat-service
+import requests
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from common import metrics, profiling
+from common.bus import INBOUND_QUEUE, MESSAGE_BUS_URL, BusUnavailable, create_bus
+from common.deadline import (DEADLINE_HEADER, Deadline, DeadlineExceeded, current_deadline,
+                             deadline_response, init_app as init_deadlines)
+from upstream import UpstreamPool, forward_headers, passthrough_response, request_body, response_headers
+from cache import CacheEntry, ResponseCache, SharedInvalidation, is_cacheable
+from dashboard import UpstreamError, build_admin_dashboard
+from auth import authenticate, authorize
+from routing import SERVICES, build_target_url, route_table
+from realtime import RoomRelay
+from resilience import CircuitOpenError, resilience
 
 app = Flask(__name__)
 # Cấu hình CORS cho phép Frontend truy cập vào tất cả các route
-CORS(app, resources={r"/*": {"origins": "*"}})
+# (và đọc được header phân trang/cache do service trả về)
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'ETag', 'X-Cache', 'Server-Timing', 'X-Profile-Id'])
+
+# Số liệu độ trễ/DB/in-flight tại /metrics và header Server-Timing (xem common/metrics.py)
+metrics.init_app(app, 'gateway')
+# Profile theo yêu cầu (header X-Profile hoặc PROFILE_SAMPLE_RATE), xem common/profiling.py
+profiling.init_app(app, 'gateway')
 
 # Cấu hình SocketIO tại Gateway (Cổng 8000)
 # Sử dụng async_mode='eventlet' để chạy ổn định trong môi trường Docker
+# Không dùng message queue của Socket.IO: tin nhắn giữa các worker đi qua message bus
+# (common/bus.py), mỗi worker chỉ emit tới client của chính nó
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 
-JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'vinfast_secret_key_mac_dinh_123')
-
-# Định nghĩa danh sách các service nội bộ
-SERVICES = {
-    "users": os.environ.get("USER_SERVICE_URL", "http://users:5001/api/v1"),
-    "catalog": os.environ.get("CATALOG_SERVICE_URL", "http://catalog:5002/api/v1"),
-    "orders": os.environ.get("ORDER_SERVICE_URL", "http://orders:5003/api/v1"),
-    "chat": os.environ.get("CHAT_SERVICE_URL", "http://chat:5005/api/v1")
-}
+# Deadline Client gửi kèm (X-Deadline-Ms, nếu có) và số liệu /metrics/deadlines
+init_deadlines(app)
+
+# Pool kết nối keep-alive dùng chung cho mọi request proxy
+upstream_pool = UpstreamPool(SERVICES)
+
+# Cache phản hồi GET của các route công khai (danh sách xe, chi tiết xe)
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("GATEWAY_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("GATEWAY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+)
+
+# Chế độ trả phản hồi: 'passthrough' (mặc định) chuyển nguyên byte của service,
+# 'json' giải mã và encode lại JSON như cách cũ (chỉ dùng khi cần sửa payload)
+RESPONSE_MODE = os.environ.get("GATEWAY_RESPONSE_MODE", "passthrough")
+
+# --- CHAT REAL-TIME QUA MESSAGE BUS ---
+# Gateway giữ room của client; tin gửi lên vào hàng đợi INBOUND_QUEUE cho Chat Service
+# lưu, tin đã lưu được Chat Service publish lên kênh của phòng rồi emit tới client ở đây
+bus = create_bus()
+if MESSAGE_BUS_URL.startswith('memory://'):
+    # Chat Service chạy tiến trình riêng (python app.py) thì không đọc được hàng đợi trong bộ nhớ:
+    # send_message bị từ chối (sự kiện chat_error) thay vì mất tin trong im lặng
+    print("⚠️ MESSAGE_BUS_URL=memory://: chat real-time chỉ hoạt động khi Chat Service chạy chung tiến trình. "
+          "Chạy Redis và đặt MESSAGE_BUS_URL=redis://127.0.0.1:6379/0 cho cả Gateway và Chat Service")
+room_relay = RoomRelay(bus, lambda event, data, room: socketio.emit(event, data, room=room))
+metrics.register_collector(room_relay.collect)
+
+# Cache phản hồi nằm riêng trong từng worker: lệnh xóa cache sau request ghi được phát qua bus
+cache_invalidation = SharedInvalidation(response_cache, bus)
+
+@app.before_request
+def subscribe_cache_invalidation():
+    cache_invalidation.ensure_subscribed()
 
-# --- KẾT NỐI SOCKET NỘI BỘ SANG CHAT SERVICE ---
-chat_internal_url = os.environ.get("CHAT_INTERNAL_URL", "http://chat:5005")
-sio_to_chat = socketio_client.Client()
+@socketio.on('join')
+def handle_join(data):
+    """Cho client vào phòng chat của đơn hàng và theo dõi kênh bus của phòng"""
+    if not data or 'order_id' not in data:
+        return
+    # Ép kiểu order_id về chuỗi để đảm bảo SocketIO nhận diện đúng Room
+    room = str(data['order_id'])
+    join_room(room)
+    room_relay.join(request.sid, room)
+    metrics.record_event('join')
+
+@socketio.on('leave')
+def handle_leave(data):
+    """Rời phòng chat, hủy theo dõi kênh bus nếu không còn client nào trong phòng"""
+    if not data or 'order_id' not in data:
+        return
+    room = str(data['order_id'])
+    leave_room(room)
+    room_relay.leave(request.sid, room)
+    metrics.record_event('leave')
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    room_relay.disconnect(request.sid)
+    metrics.record_event('disconnect')
 
-def connect_to_chat_service():
-    """Hàm tự động kết nối lại tới Chat Service nếu mất kết nối"""
+@socketio.on('send_message')
+def handle_send_message(data):
+    """Đưa tin nhắn của Client vào hàng đợi để Chat Service lưu và phát tới phòng"""
+    if not data or 'order_id' not in data or 'content' not in data:
+        return
+    metrics.record_event('send_message')
     try:
-        if not sio_to_chat.connected:
-            sio_to_chat.connect(chat_internal_url)
-            print("✅ Gateway đã kết nối thành công tới Chat Service Socket.")
+        bus.push(INBOUND_QUEUE, data)
+    except BusUnavailable as e:
+        emit('chat_error', {'order_id': data['order_id'], 'message': "Chat tạm thời không khả dụng, tin nhắn chưa được gửi"})
+        print(f"❌ Tin nhắn bị từ chối: {str(e)}")
     except Exception as e:
-        print(f"❌ Lỗi kết nối tới Chat Service Socket: {str(e)}")
-
-# Khởi tạo kết nối lần đầu
-connect_to_chat_service()
+        emit('chat_error', {'order_id': data['order_id'], 'message': "Không gửi được tin nhắn, vui lòng thử lại"})
+        print(f"❌ Lỗi gửi tin nhắn lên message bus: {str(e)}")
+
+# --- BFF: ADMIN DASHBOARD ---
+
+@app.route('/bff/admin/dashboard', methods=['GET'])
+def admin_dashboard():
+    """Một lời gọi trả về trang đơn hàng đã ghép tên khách hàng, tên xe và thống kê doanh thu"""
+    identity, error = authenticate(request.headers.get('Authorization'))
+    if error:
+        return jsonify({"message": error}), 401
+    if identity['X-User-Role'] != 'admin':
+        return jsonify({"message": "Chỉ Admin mới có quyền truy cập"}), 403
+    # Kèm JWT của Admin: service nội bộ vẫn xác thực được khi chưa đặt GATEWAY_SECRET
+    headers = dict(identity, Authorization=request.headers.get('Authorization'))
+    try:
+        return jsonify(build_admin_dashboard(upstream_pool, headers, request.args)), 200
+    except UpstreamError as e:
+        return jsonify({"error": e.message, "service": e.service}), e.status
 
-# --- LOGIC WEBSOCKET PROXY (Forwarding) ---
+# --- LOGIC HTTP ROUTER ---
 
-@socketio.on('join')
-def handle_join_proxy(data):
-    """Chuyển tiếp sự kiện join phòng từ Client sang Chat Service"""
-    connect_to_chat_service()
-    if sio_to_chat.connected:
-        sio_to_chat.emit('join', data)
+def cached_response(entry, cache_status):
+    """Dựng phản hồi từ cache, trả 304 nếu ETag khớp If-None-Match của Client."""
+    status, headers, body = entry.render(request.headers.get('If-None-Match'), cache_status)
+    return Response(body, status=status, headers=headers)
 
-@socketio.on('send_message')
-def handle_send_message_proxy(data):
-    """Chuyển tiếp tin nhắn từ Client sang Chat Service"""
-    connect_to_chat_service()
-    if sio_to_chat.connected:
-        sio_to_chat.emit('send_message', data)
-
-@sio_to_chat.on('receive_message')
-def handle_receive_from_chat(data):
-    """Nhận tin nhắn từ Chat Service và bắn ngược về cho Frontend"""
-    # Ép kiểu order_id về chuỗi để đảm bảo SocketIO nhận diện đúng Room
-    room_id = str(data.get('order_id'))
-    socketio.emit('receive_message', data, room=room_id)
+def circuit_open_response(error):
+    """503 trả ngay khi mạch của service đang mở, Client thử lại sau Retry-After giây."""
+    response = jsonify({"error": str(error), "service": error.service})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
 
-# --- LOGIC HTTP ROUTER ---
+@app.route('/health/upstreams', methods=['GET'])
+def upstream_health():
+    """Trạng thái circuit breaker của từng service nội bộ (theo worker hiện tại)"""
+    return jsonify(resilience.snapshot()), 200
 
 @app.route('/<service>/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def gateway_router(service, path):
@@ -71,54 +157,82 @@ def gateway_router(service, path):
     if service not in SERVICES:
         return jsonify({"error": "Dịch vụ không tồn tại"}), 404
     
-    base_url = SERVICES[service].rstrip('/')
-    clean_path = path.lstrip('/')
-    
-    # SỬA LỖI ĐỊNH TUYẾN: Kiểm tra nếu path gửi tới đã có api/v1 thì không nhân đôi
-    if "api/v1" in clean_path:
-        target_url = f"{base_url.replace('/api/v1', '')}/{clean_path}"
-    else:
-        target_url = f"{base_url}/{clean_path}"
+    # Tra bảng định tuyến đã biên dịch: chính sách auth, timeout, cache, retry của route
+    route, route_error = route_table.match(service, request.method, path)
+    if route_error:
+        return jsonify({"message": route_error[1]}), route_error[0]
+
+    target_url = build_target_url(service, path, request.query_string.decode())
     
-    # Loại bỏ header 'host' để tránh xung đột proxy
-    headers = {k: v for k, v in request.headers.items() if k.lower() != 'host'}
+    # Loại bỏ header 'host' và các header hop-by-hop để tránh xung đột proxy
+    headers = forward_headers(request.headers)
     
-    # Các API công khai không cần kiểm tra JWT
-    public_paths = ['users/login', 'users/register', 'catalog/cars']
-    is_public = any(p in f"{service}/{path}" for p in public_paths)
-
-    if not is_public:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header: 
-            return jsonify({"message": "Vui lòng đăng nhập"}), 401
+    # Kiểm tra JWT/quyền theo chính sách của route (API công khai bỏ qua)
+    identity, auth_error = authorize(route, request.headers.get('Authorization'))
+    if auth_error:
+        return jsonify({"message": auth_error[1]}), auth_error[0]
+    headers.update(identity)
+
+    # Route GET công khai có cấu hình TTL thì phục vụ từ cache nếu còn hạn
+    cache_ttl = route.cache_ttl if request.method == 'GET' else None
+    if cache_ttl:
+        cache_key = response_cache.key(service, path, request.query_string.decode(),
+                                       request.headers.get('Accept-Encoding', ''))
+        entry = response_cache.get(cache_key)
+        if entry:
+            return cached_response(entry, 'HIT')
+
+    method, body = request.method, request_body(request)
+    # Ngân sách thời gian của route cho cả lượt (kể cả thử lại); deadline của Client nếu ngắn hơn
+    deadline = Deadline.after(route.timeout or SERVICES[service]['read_timeout']).earliest(current_deadline())
+
+    def send():
+        # Thực hiện chuyển tiếp request qua pool kết nối của service, body được stream;
+        # service nhận phần ngân sách còn lại qua X-Deadline-Ms
         try:
-            token = auth_header.split(" ")[1]
-            decoded = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            # Đính kèm User Info vào header để các service nội bộ sử dụng
-            headers['X-User-Id'] = str(decoded.get('user_id'))
-            headers['X-User-Role'] = decoded.get('role')
-        except Exception: 
-            return jsonify({"message": "Phiên làm việc hết hạn"}), 401
+            return upstream_pool.request(service, method, target_url,
+                                         headers=dict(headers, **{DEADLINE_HEADER: deadline.header_value()}),
+                                         body=body, read_timeout=deadline.timeout(route.timeout, 'gateway'))
+        except requests.exceptions.Timeout as e:
+            if deadline.expired():
+                raise DeadlineExceeded('gateway') from e
+            raise
 
     try:
-        # Thực hiện chuyển tiếp request
-        response = requests.request(
-            method=request.method, 
-            url=target_url, 
-            headers=headers, 
-            data=request.get_data(), 
-            timeout=10
-        )
-        
-        # Trả về kết quả JSON hoặc Content thô
+        # Circuit breaker của service; GET được thử lại (backoff có jitter) và hedge nếu cấu hình
+        response = resilience.call(service, method, route.retries, send,
+                                   retryable=(requests.exceptions.ConnectionError,))
+        cache_invalidation.invalidate_after_write(service, path, request.method, response.status_code)
+
+        if cache_ttl:
+            upstream_headers = response_headers(response)
+            if is_cacheable(response.status_code, upstream_headers):
+                content = response.raw.read(decode_content=False)
+                response.close()
+                entry = CacheEntry(response.status_code, upstream_headers, content,
+                                   response.headers.get('ETag'), cache_ttl)
+                response_cache.put(cache_key, entry)
+                return cached_response(entry, 'MISS')
+
+        if RESPONSE_MODE != 'json':
+            return passthrough_response(response)
+
+        # Chế độ cũ: Trả về kết quả JSON hoặc Content thô
         try:
             return jsonify(response.json()), response.status_code
         except Exception:
             return response.content, response.status_code
+        finally:
+            response.close()
             
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except DeadlineExceeded as e:
+        return deadline_response(e)
     except Exception as e:
         return jsonify({"error": f"Lỗi kết nối tới {service}: {str(e)}"}), 503
 
 if __name__ == '__main__':
+    # Server dev; production chạy qua common/serve.py (xem Dockerfile)
     # Quan trọng: Sử dụng socketio.run để hỗ trợ song song HTTP và WebSocket
-    socketio.run(app, host='0.0.0.0', port=8000, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('GATEWAY_PORT', 8000)), debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
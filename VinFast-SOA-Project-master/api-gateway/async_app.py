@@ -0,0 +1,231 @@
+# api-gateway/async_app.py
+"""Engine Gateway bất đồng bộ (asyncio + aiohttp).
+
+Phục vụ cùng định tuyến /<service>/<path>, kiểm tra JWT và gắn header
+X-User-Id/X-User-Role như app.py, nhưng mỗi request chờ service nội bộ chỉ
+chiếm một coroutine thay vì một worker, nên hàng nghìn request có thể cùng
+chờ một service chậm. Socket.IO vẫn do engine Flask (app.py) phục vụ.
+
+Chạy: GATEWAY_PORT=8001 python async_app.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web, ClientConnectorError, ClientError, ClientSession, ClientTimeout, TCPConnector
+from auth import authorize
+from common import metrics
+from common.bus import create_bus
+from common.deadline import DEADLINE_HEADER, Deadline, DeadlineExceeded, stats as deadline_stats
+from routing import SERVICES, build_target_url, route_table
+from resilience import CircuitOpenError, resilience
+from cache import CacheEntry, ResponseCache, SharedInvalidation, is_cacheable
+from upstream import CORS_HEADER_PREFIX, HOP_BY_HOP_HEADERS, STREAM_CHUNK_SIZE, forward_headers
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Authorization, Content-Type',
+    'Access-Control-Expose-Headers': 'X-Next-Cursor, ETag, X-Cache, Server-Timing'
+}
+
+# Cache phản hồi GET của các route công khai (cùng cấu hình với app.py)
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("GATEWAY_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("GATEWAY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+)
+# Lệnh xóa cache sau request ghi được phát qua message bus tới mọi tiến trình Gateway
+cache_invalidation = SharedInvalidation(response_cache, create_bus())
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Gắn header CORS cho mọi phản hồi (tương đương flask_cors bên app.py)."""
+    if request.method == 'OPTIONS':
+        return web.Response(status=200, headers=CORS_HEADERS)
+    response = await handler(request)
+    response.headers.update(CORS_HEADERS)
+    return response
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Đo thời gian/in-flight của request (tương đương common.metrics.init_app bên app.py)."""
+    started = time.perf_counter()
+    metrics.registry.add('http_requests_in_flight')
+    try:
+        response = await handler(request)
+    finally:
+        metrics.registry.add('http_requests_in_flight', delta=-1)
+    elapsed = time.perf_counter() - started
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+    metrics.registry.observe('http_request_duration_seconds',
+                             (('route', route), ('method', request.method), ('status', response.status)), elapsed)
+    # Phản hồi stream đã gửi header thì không gắn thêm được
+    if not response.prepared:
+        response.headers['Server-Timing'] = f"gateway;dur={elapsed * 1000:.1f}"
+    return response
+
+def upstream_headers(request):
+    """Lọc header hop-by-hop/định danh, giữ Content-Length để body được stream nguyên vẹn."""
+    headers = forward_headers(request.headers)
+    if request.content_length:
+        headers['Content-Length'] = str(request.content_length)
+    return headers
+
+def response_headers(upstream):
+    """Giữ lại header của service (Content-Type, ETag, Cache-Control, ...) khi trả về Client."""
+    return {
+        k: v for k, v in upstream.headers.items()
+        if k.lower() not in HOP_BY_HOP_HEADERS and not k.lower().startswith(CORS_HEADER_PREFIX)
+    }
+
+def cached_response(request, entry, cache_status):
+    """Dựng phản hồi từ cache, trả 304 nếu ETag khớp If-None-Match của Client."""
+    status, headers, body = entry.render(request.headers.get('If-None-Match'), cache_status)
+    response = web.Response(status=status, body=body)
+    for k, v in headers:
+        response.headers[k] = v
+    return response
+
+async def gateway_router(request):
+    """Định tuyến tất cả các yêu cầu HTTP tới các service tương ứng"""
+    service = request.match_info['service']
+    path = request.match_info['path']
+    if service not in SERVICES:
+        return web.json_response({"error": "Dịch vụ không tồn tại"}, status=404)
+
+    # Tra bảng định tuyến đã biên dịch: chính sách auth, timeout, cache, retry của route
+    route, route_error = route_table.match(service, request.method, path)
+    if route_error:
+        return web.json_response({"message": route_error[1]}, status=route_error[0])
+
+    target_url = build_target_url(service, path, request.query_string)
+    headers = upstream_headers(request)
+
+    # Kiểm tra JWT/quyền theo chính sách của route (API công khai bỏ qua)
+    identity, auth_error = authorize(route, request.headers.get('Authorization'))
+    if auth_error:
+        return web.json_response({"message": auth_error[1]}, status=auth_error[0])
+    headers.update(identity)
+
+    # Route GET công khai có cấu hình TTL thì phục vụ từ cache nếu còn hạn
+    cache_ttl = route.cache_ttl if request.method == 'GET' else None
+    if cache_ttl:
+        cache_key = response_cache.key(service, path, request.query_string,
+                                       request.headers.get('Accept-Encoding', ''))
+        entry = response_cache.get(cache_key)
+        if entry:
+            return cached_response(request, entry, 'HIT')
+
+    config = SERVICES[service]
+    session = request.app['sessions'][service]
+    body = request.content if request.body_exists else None
+    # Ngân sách thời gian của route cho cả lượt (kể cả thử lại); deadline của Client nếu ngắn hơn
+    deadline = Deadline.after(route.timeout or config['read_timeout']).earliest(
+        Deadline.from_header(request.headers.get(DEADLINE_HEADER)))
+
+    async def send():
+        timeout = ClientTimeout(sock_connect=config['connect_timeout'],
+                                sock_read=deadline.timeout(route.timeout, 'gateway'))
+        started = time.perf_counter()
+        try:
+            upstream = await session.request(request.method, target_url, data=body, timeout=timeout,
+                                             headers=dict(headers, **{DEADLINE_HEADER: deadline.header_value()}),
+                                             allow_redirects=False)
+        except (ClientError, asyncio.TimeoutError) as e:
+            metrics.observe_upstream(service, 'error', time.perf_counter() - started)
+            if isinstance(e, asyncio.TimeoutError) and deadline.expired():
+                raise DeadlineExceeded('gateway') from e
+            raise
+        metrics.observe_upstream(service, upstream.status, time.perf_counter() - started)
+        return upstream
+
+    try:
+        # Circuit breaker của service; GET được thử lại (backoff có jitter) và hedge nếu cấu hình
+        upstream = await resilience.call_async(service, request.method, route.retries, send,
+                                               retryable=(ClientConnectorError,))
+        async with upstream:
+            if request.method != 'GET':
+                # publish lên bus là I/O chặn: chạy ngoài event loop
+                await asyncio.get_running_loop().run_in_executor(
+                    None, cache_invalidation.invalidate_after_write, service, path, request.method, upstream.status)
+
+            if cache_ttl:
+                upstream_headers = list(response_headers(upstream).items())
+                if is_cacheable(upstream.status, upstream_headers):
+                    entry = CacheEntry(upstream.status, upstream_headers, await upstream.read(),
+                                       upstream.headers.get('ETag'), cache_ttl)
+                    response_cache.put(cache_key, entry)
+                    return cached_response(request, entry, 'MISS')
+
+            # Chuyển nguyên byte, status và header từ service về Client theo từng khối
+            response = web.StreamResponse(status=upstream.status, headers=response_headers(upstream))
+            if upstream.content_length is not None:
+                response.content_length = upstream.content_length
+            response.headers.update(CORS_HEADERS)
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_chunked(STREAM_CHUNK_SIZE):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+    except CircuitOpenError as e:
+        return web.json_response({"error": str(e), "service": e.service}, status=503,
+                                 headers={'Retry-After': str(e.retry_after)})
+    except DeadlineExceeded as e:
+        deadline_stats.cancelled(e.stage)
+        return web.json_response({"message": str(e)}, status=504)
+    except (ClientError, asyncio.TimeoutError) as e:
+        return web.json_response({"error": f"Lỗi kết nối tới {service}: {str(e)}"}, status=503)
+
+async def upstream_health(request):
+    """Trạng thái circuit breaker của từng service nội bộ (theo tiến trình hiện tại)"""
+    return web.json_response(resilience.snapshot())
+
+async def deadline_metrics(request):
+    """Số request bị hủy vì hết deadline (theo tiến trình hiện tại)"""
+    return web.json_response(deadline_stats.snapshot())
+
+async def metrics_endpoint(request):
+    return web.Response(text=metrics.render(), content_type='text/plain')
+
+async def open_sessions(app):
+    """Tạo một ClientSession (pool keep-alive) riêng cho từng service khi khởi động."""
+    app['sessions'] = {
+        name: ClientSession(
+            connector=TCPConnector(limit=config['async_pool_size']),
+            auto_decompress=False
+        )
+        for name, config in SERVICES.items()
+    }
+
+async def subscribe_cache_invalidation(app):
+    cache_invalidation.ensure_subscribed()
+
+async def close_sessions(app):
+    for session in app['sessions'].values():
+        await session.close()
+
+def create_app():
+    middlewares = [cors_middleware]
+    if metrics.ENABLED:
+        metrics.set_service('gateway')
+        middlewares.append(metrics_middleware)
+    app = web.Application(middlewares=middlewares)
+    if metrics.ENABLED:
+        app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_get('/health/upstreams', upstream_health)
+    app.router.add_get('/metrics/deadlines', deadline_metrics)
+    app.router.add_route('*', '/{service}/{path:.+}', gateway_router)
+    app.on_startup.append(open_sessions)
+    app.on_startup.append(subscribe_cache_invalidation)
+    app.on_cleanup.append(close_sessions)
+    return app
+
+if __name__ == '__main__':
+    port = int(os.environ.get('GATEWAY_PORT', 8000))
+    print(f"Async Gateway đang chạy trên cổng {port}...")
+    web.run_app(create_app(), host='0.0.0.0', port=port, access_log=None)
@@ -0,0 +1,107 @@
+# api-gateway/auth.py
+"""Xác thực JWT tại Gateway, có cache các token đã kiểm tra chữ ký.
+
+Mỗi token hợp lệ chỉ được giải mã/kiểm tra HS256 một lần; các request sau dùng
+lại claims đã lưu (khóa là SHA-256 của token, không giữ token gốc trong bộ nhớ)
+cho tới khi token hết hạn theo `exp` hoặc quá AUTH_CACHE_MAX_TTL giây.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import jwt
+
+JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'vinfast_secret_key_mac_dinh_123')
+# Secret dùng chung với service nội bộ, gửi kèm header định danh để service biết
+# X-User-Id/X-User-Role do Gateway gắn chứ không phải Client gọi thẳng vào cổng service
+GATEWAY_SECRET = os.environ.get('GATEWAY_SECRET', '')
+GATEWAY_SECRET_HEADER = 'X-Gateway-Secret'
+
+
+class TokenCache:
+    """LRU giới hạn số mục: digest(token) -> (header định danh, thời điểm hết hạn)."""
+
+    def __init__(self, max_entries=10000, max_ttl=300):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key, now):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            identity, expires_at = item
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return identity
+
+    def put(self, key, identity, exp, now):
+        if self.max_entries <= 0:
+            return
+        expires_at = now + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._entries[key] = (identity, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(
+    max_entries=int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 10000)),
+    max_ttl=int(os.environ.get('AUTH_CACHE_MAX_TTL', 300))
+)
+
+
+def authenticate(auth_header, cache=token_cache):
+    """Xác thực JWT, trả về (header định danh cho service nội bộ, lỗi)."""
+    if not auth_header:
+        return None, "Vui lòng đăng nhập"
+    parts = auth_header.split(" ")
+    if len(parts) != 2:
+        return None, "Phiên làm việc hết hạn"
+    token = parts[1]
+
+    now = time.time()
+    key = cache.key(token)
+    identity = cache.get(key, now)
+    if identity is not None:
+        return identity, None
+    try:
+        decoded = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except Exception:
+        return None, "Phiên làm việc hết hạn"
+    # Đính kèm User Info vào header để các service nội bộ sử dụng
+    identity = {
+        'X-User-Id': str(decoded.get('user_id')),
+        'X-User-Role': decoded.get('role')
+    }
+    if GATEWAY_SECRET:
+        identity[GATEWAY_SECRET_HEADER] = GATEWAY_SECRET
+    cache.put(key, identity, decoded.get('exp'), now)
+    return identity, None
+
+
+def authorize(route, auth_header):
+    """Áp dụng chính sách auth của route: trả về (header định danh, lỗi dạng (mã HTTP, thông báo))."""
+    if route.auth == 'public':
+        return {}, None
+    if route.auth == 'internal':
+        return None, (403, "API nội bộ, không truy cập qua Gateway")
+    identity, error = authenticate(auth_header)
+    if error:
+        return None, (401, error)
+    if route.auth == 'admin' and identity['X-User-Role'] != 'admin':
+        return None, (403, "Chỉ Admin mới có quyền truy cập")
+    return identity, None
@@ -0,0 +1,170 @@
+# api-gateway/cache.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from routing import normalize_path
+from common.bus import CACHE_INVALIDATION_CHANNEL
+
+# Request ghi thành công (2xx) làm thay đổi tồn kho -> xóa cache của các tiền tố tương ứng.
+# (service, đoạn path, tiền tố cache cần xóa). Tồn kho chỉ đổi qua Order Service
+# (giữ chỗ khi tạo đơn, xác nhận khi thanh toán); API inventory/ là nội bộ, không qua Gateway.
+INVALIDATION_RULES = [
+    ("orders", "orders", "catalog/"),
+]
+
+# Các header không lưu cùng phản hồi trong cache (Gateway tự tính lại)
+SKIPPED_HEADERS = {'content-length', 'etag', 'age', 'date'}
+
+
+def etag_matches(if_none_match, etag):
+    """So khớp header If-None-Match với ETag (so sánh yếu, hỗ trợ '*' và danh sách)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    wanted = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+class CacheEntry:
+    """Một phản hồi đã lưu: status, header, body (byte nguyên bản) và ETag."""
+
+    def __init__(self, status, headers, body, etag, ttl):
+        self.status = status
+        self.headers = [(k, v) for k, v in headers if k.lower() not in SKIPPED_HEADERS]
+        self.body = body
+        self.etag = etag or '"%s"' % hashlib.sha1(body).hexdigest()
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def render(self, if_none_match, cache_status):
+        """Trả về (status, headers, body) cho Client; 304 nếu Client đã có đúng phiên bản."""
+        headers = [
+            ('ETag', self.etag),
+            ('Age', str(int(time.monotonic() - self.stored_at))),
+            ('X-Cache', cache_status)
+        ]
+        if etag_matches(if_none_match, self.etag):
+            keep = {'cache-control', 'content-location', 'expires', 'vary', 'last-modified'}
+            return 304, headers + [(k, v) for k, v in self.headers if k.lower() in keep], b''
+        return self.status, self.headers + headers, self.body
+
+
+class ResponseCache:
+    """Cache phản hồi GET tại Gateway (TTL lấy từ cache_ttl của route), giới hạn bộ nhớ bằng LRU."""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(service, path, query_string='', accept_encoding=''):
+        return f"{service}/{normalize_path(path)}?{query_string}|{accept_encoding}"
+
+    def get(self, key):
+        """Lấy phản hồi còn hạn (và đánh dấu vừa dùng), hoặc None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        """Lưu phản hồi, loại bỏ các mục ít dùng nhất khi vượt giới hạn số mục/bộ nhớ."""
+        if entry.size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, prefix=''):
+        """Xóa mọi phản hồi có key bắt đầu bằng `prefix` (rỗng = xóa toàn bộ)."""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+
+    def invalidate_after_write(self, service, path, method, status):
+        """Áp dụng INVALIDATION_RULES sau một request ghi thành công, trả về các tiền tố đã xóa."""
+        if method == 'GET' or not 200 <= status < 300:
+            return []
+        route = normalize_path(path)
+        prefixes = []
+        for rule_service, fragment, prefix in INVALIDATION_RULES:
+            if service == rule_service and fragment in route:
+                self.invalidate(prefix)
+                prefixes.append(prefix)
+        return prefixes
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+class SharedInvalidation:
+    """Đồng bộ việc xóa cache giữa các worker Gateway qua message bus.
+
+    Mỗi worker gunicorn có ResponseCache riêng: request ghi đi qua worker A chỉ xóa cache
+    của A. Worker xử lý request ghi xóa cache của mình ngay rồi publish tiền tố lên
+    CACHE_INVALIDATION_CHANNEL; mọi worker subscribe kênh này và xóa theo. Khi bus mất kết
+    nối (hoặc memory:// với nhiều worker) lệnh xóa bị lỡ, cache_ttl của route là giới hạn
+    trên cho thời gian đọc dữ liệu cũ.
+    """
+
+    def __init__(self, cache, bus, channel=CACHE_INVALIDATION_CHANNEL):
+        self.cache = cache
+        self.bus = bus
+        self.channel = channel
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_subscribed(self):
+        # gunicorn preload: luồng lắng nghe bus của master không theo sang worker sau fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self.bus.subscribe(self.channel, self._receive)
+
+    def invalidate_after_write(self, service, path, method, status):
+        """Xóa cache cục bộ theo INVALIDATION_RULES rồi báo các worker khác xóa theo."""
+        for prefix in self.cache.invalidate_after_write(service, path, method, status):
+            try:
+                self.bus.publish(self.channel, {'prefix': prefix})
+            except Exception as e:
+                print(f"❌ Lỗi publish lệnh xóa cache '{prefix}': {str(e)}")
+
+    def _receive(self, channel, message):
+        self.cache.invalidate(message.get('prefix', ''))
+
+
+def is_cacheable(status, headers):
+    """Chỉ cache phản hồi 200 mà service không cấm lưu (no-store/private)."""
+    if status != 200:
+        return False
+    cache_control = ''
+    for k, v in headers:
+        if k.lower() == 'cache-control':
+            cache_control = v.lower()
+    return 'no-store' not in cache_control and 'private' not in cache_control
@@ -0,0 +1,120 @@
+# api-gateway/dashboard.py
+"""BFF cho trang Admin: gộp đơn hàng, tên khách hàng và tên xe thành một payload.
+
+Thay cho việc trình duyệt gọi /users/<id> cho từng đơn và tự ghép với cả danh
+sách xe: Gateway lấy một trang đơn hàng (kèm thống kê), rồi tra cứu song song
+các user và mẫu xe được tham chiếu bằng các lời gọi theo lô (chia nhỏ theo giới
+hạn của từng service). Tra cứu lỗi thì trang vẫn hiển thị, chỉ thiếu tên.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import requests
+from resilience import CircuitOpenError, resilience
+from routing import build_target_url
+
+# Luồng dùng để gọi song song các service nội bộ
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='bff')
+
+# Tham số phân trang/lọc của trang đơn hàng được chuyển tiếp sang Order Service
+ORDER_QUERY_PARAMS = ('limit', 'cursor', 'status', 'date_from', 'date_to')
+
+# Số id tối đa mỗi lời gọi tra cứu theo lô: MAX_BULK_LOOKUP của User Service,
+# MAX_PAGE_SIZE (tham số ids) của Catalog Service
+USER_BATCH_SIZE = 200
+CAR_BATCH_SIZE = 500
+
+
+class UpstreamError(Exception):
+    """Service nội bộ trả lỗi hoặc không kết nối được."""
+
+    def __init__(self, service, message, status=502):
+        super().__init__(message)
+        self.service = service
+        self.message = message
+        self.status = status
+
+
+def _call(pool, service, method, path, headers, query=None, payload=None):
+    """Gọi một service qua pool kết nối, trả về (body JSON, header phản hồi)."""
+    url = build_target_url(service, path, urlencode(query or {}))
+    body = None
+    if payload is not None:
+        body = json.dumps(payload).encode()
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+    try:
+        # Cùng circuit breaker/thử lại với proxy; GET được thử lại một lần khi lỗi kết nối
+        response = resilience.call(
+            service, method, 1,
+            lambda: pool.request(service, method, url, headers=headers, body=body, stream=False),
+            retryable=(requests.exceptions.ConnectionError,)
+        )
+    except CircuitOpenError as e:
+        raise UpstreamError(service, str(e), 503)
+    except Exception as e:
+        raise UpstreamError(service, f"Lỗi kết nối tới {service}: {str(e)}", 503)
+    if response.status_code >= 400:
+        try:
+            message = response.json().get('message', response.reason)
+        except ValueError:
+            message = response.reason
+        raise UpstreamError(service, message, response.status_code)
+    return response.json(), response.headers
+
+
+def _batches(ids, size):
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def _collect(calls, extract):
+    """Gộp kết quả các lời gọi tra cứu theo {id: bản ghi}; lô bị lỗi được bỏ qua."""
+    found = {}
+    for call in calls:
+        try:
+            records = extract(call.result()[0])
+        except UpstreamError as e:
+            print(f"⚠️ Dashboard thiếu dữ liệu từ {e.service}: {e.message}")
+            continue
+        found.update((record['id'], record) for record in records)
+    return found
+
+
+def build_admin_dashboard(pool, identity, args):
+    """Dựng payload Dashboard: trang đơn hàng đã ghép user/xe, con trỏ trang sau và thống kê."""
+    query = {k: args[k] for k in ORDER_QUERY_PARAMS if args.get(k)}
+
+    # Bước 1: trang đơn hàng và thống kê tổng (cùng Order Service) chạy song song
+    orders_call = _executor.submit(_call, pool, 'orders', 'GET', 'orders', identity, query)
+    stats_call = _executor.submit(_call, pool, 'orders', 'GET', 'orders/stats', identity)
+    orders, order_headers = orders_call.result()
+
+    # Bước 2: tra cứu theo lô các user và mẫu xe được tham chiếu, các lô chạy song song
+    user_ids = sorted({order['user_id'] for order in orders})
+    car_ids = sorted({item['car_model_id'] for order in orders for item in order.get('items', [])})
+    users_calls = [_executor.submit(_call, pool, 'users', 'POST', 'users/bulk', identity, payload={'ids': batch})
+                   for batch in _batches(user_ids, USER_BATCH_SIZE)]
+    cars_calls = [_executor.submit(_call, pool, 'catalog', 'GET', 'catalog/cars', identity, {
+        'ids': ','.join(str(i) for i in batch),
+        'fields': 'id,model_name',
+        'limit': len(batch)
+    }) for batch in _batches(car_ids, CAR_BATCH_SIZE)]
+
+    # Thiếu tên khách/xe không làm hỏng cả trang: hiển thị "Khách #id" và bỏ trống tên xe
+    users = _collect(users_calls, lambda body: body['users'])
+    cars = _collect(cars_calls, lambda body: body)
+    stats, _ = stats_call.result()
+
+    for order in orders:
+        user = users.get(order['user_id'])
+        order['user_name'] = user['name'] if user else f"Khách #{order['user_id']}"
+        order['user_email'] = user['email'] if user else None
+        for item in order.get('items', []):
+            car = cars.get(item['car_model_id'])
+            item['model_name'] = car['model_name'] if car else None
+
+    return {
+        'orders': orders,
+        'next_cursor': order_headers.get('X-Next-Cursor'),
+        'summary': stats
+    }
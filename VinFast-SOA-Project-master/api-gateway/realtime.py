@@ -0,0 +1,66 @@
+# api-gateway/realtime.py
+"""Phát tin nhắn chat tới client Socket.IO đang kết nối vào worker Gateway này.
+
+Mỗi worker chỉ subscribe kênh bus của những phòng có ít nhất một client của nó,
+và hủy subscribe khi client cuối cùng rời phòng/ngắt kết nối. Tin nhận từ bus được
+emit cục bộ (không qua message queue của Socket.IO) nên mỗi client nhận đúng một lần.
+"""
+
+import threading
+from common import metrics
+from common.bus import room_channel
+
+
+class RoomRelay:
+    """Theo dõi phòng của từng client (sid) và subscribe/unsubscribe kênh bus tương ứng."""
+
+    def __init__(self, bus, emit):
+        self.bus = bus
+        self.emit = emit
+        self._members = {}   # room -> set(sid)
+        self._rooms = {}     # sid -> set(room)
+        self._lock = threading.Lock()
+
+    def join(self, sid, room):
+        with self._lock:
+            self._rooms.setdefault(sid, set()).add(room)
+            members = self._members.setdefault(room, set())
+            first = not members
+            members.add(sid)
+        if first:
+            self.bus.subscribe(room_channel(room), self._deliver)
+
+    def leave(self, sid, room):
+        with self._lock:
+            self._rooms.get(sid, set()).discard(room)
+            members = self._members.get(room)
+            if members is None:
+                return
+            members.discard(sid)
+            last = not members
+            if last:
+                del self._members[room]
+        if last:
+            self.bus.unsubscribe(room_channel(room), self._deliver)
+
+    def disconnect(self, sid):
+        with self._lock:
+            rooms = self._rooms.pop(sid, set())
+        for room in rooms:
+            self.leave(sid, room)
+
+    def _deliver(self, channel, message):
+        # Tin nhắn mới không có trường event; báo id thật sau khi ghi theo lô là message_persisted
+        event = message.get('event', 'receive_message')
+        self.emit(event, message, str(message.get('order_id')))
+        metrics.record_event(event, 'out')
+
+    def stats(self):
+        with self._lock:
+            return {'rooms': len(self._members), 'clients': len(self._rooms)}
+
+    def collect(self):
+        """Số phòng/client đang theo dõi cho /metrics (common/metrics.py)."""
+        stats = self.stats()
+        return [('chat_relay_rooms', 'gauge', (), stats['rooms']),
+                ('chat_relay_clients', 'gauge', (), stats['clients'])]
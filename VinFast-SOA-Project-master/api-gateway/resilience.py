@@ -0,0 +1,289 @@
+# api-gateway/resilience.py
+"""Circuit breaker, thử lại có backoff và hedged request khi gọi service nội bộ.
+
+Cấu hình riêng cho từng service qua biến môi trường (xem routing.service_config):
+
+- Circuit breaker: sau <PREFIX>_BREAKER_FAILURES lỗi liên tiếp (lỗi kết nối, timeout,
+  502/503/504) thì mở mạch, Gateway trả 503 ngay kèm Retry-After thay vì chờ timeout.
+  Sau <PREFIX>_BREAKER_RESET giây cho đúng một request thăm dò (half-open): thành công
+  thì đóng mạch, lỗi thì mở lại.
+- Thử lại: chỉ với GET (idempotent), tối đa `retries` của route, khi lỗi kết nối hoặc
+  service trả 502/503/504. Chờ ngẫu nhiên trong [0, <PREFIX>_RETRY_BACKOFF_MS * 2^lần)
+  (full jitter) để các worker không dồn request vào service vừa khởi động lại.
+- Hedged request: GET tới service có <PREFIX>_HEDGE_AFTER_MS > 0 mà chưa có phản hồi
+  sau ngần ấy ms thì gửi thêm một bản, dùng phản hồi về trước và đóng bản còn lại.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from common import metrics
+from common.deadline import DeadlineExceeded
+from routing import SERVICES
+
+# Service trả các mã này được coi là đang lỗi/quá tải (tính vào breaker, GET được thử lại)
+FAILURE_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+RETRY_BACKOFF_MAX = float(os.environ.get("GATEWAY_RETRY_BACKOFF_MAX_MS", 1000)) / 1000
+HEDGE_WORKERS = int(os.environ.get("GATEWAY_HEDGE_WORKERS", 64))
+
+
+class CircuitOpenError(Exception):
+    """Mạch của service đang mở: trả lỗi ngay, không gọi service."""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"Dịch vụ {service} tạm thời không khả dụng")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Breaker đếm lỗi liên tiếp của một service (closed -> open -> half_open -> closed)."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0,
+                       'retries': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    def allow(self):
+        """Cho request đi tiếp không; ở half-open chỉ một request thăm dò tại một thời điểm."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.reset_timeout:
+                    self._stats['rejected'] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self._stats['rejected'] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            if self.state == self.HALF_OPEN:
+                print(f"✅ Service {self.name} đã hồi phục, đóng circuit breaker")
+                self.state = self.CLOSED
+                self._probing = False
+            if self.state == self.CLOSED:
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                print(f"⚠️ Mở circuit breaker cho {self.name} sau {self._failures} lỗi liên tiếp")
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+                self._probing = False
+                self._stats['opened'] += 1
+
+    def abandon(self):
+        """Request bị hủy giữa chừng (Client ngắt kết nối): không tính là lỗi hay thành công."""
+        with self._lock:
+            self._probing = False
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def retry_after(self):
+        """Số giây (làm tròn lên) tới lần thăm dò kế tiếp."""
+        with self._lock:
+            remaining = self.reset_timeout - (self.clock() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats, state=self.state, consecutive_failures=self._failures)
+
+
+def _discard(future):
+    """Đóng phản hồi của bản request thua trong hedged request (trả kết nối về pool)."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Resilience:
+    """Gọi service qua breaker + thử lại + hedging; dùng chung cho engine Flask và asyncio."""
+
+    def __init__(self, services):
+        self.services = services
+        self.breakers = {
+            name: CircuitBreaker(name, config['breaker_failures'], config['breaker_reset'])
+            for name, config in services.items()
+        }
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def attempts(self, method, retries):
+        return 1 + (retries if method in IDEMPOTENT_METHODS else 0)
+
+    def backoff(self, service, attempt):
+        """Thời gian chờ trước lần thử lại thứ `attempt` (full jitter)."""
+        ceiling = min(RETRY_BACKOFF_MAX, self.services[service]['retry_backoff'] * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def _hedge_after(self, service, method):
+        return self.services[service]['hedge_after'] if method in IDEMPOTENT_METHODS else 0
+
+    def _hedge_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='hedge')
+        return self._executor
+
+    def call(self, service, method, retries, send, retryable=()):
+        """Gọi send() (trả về requests.Response) theo chính sách của service.
+
+        Lỗi kết nối thuộc `retryable` được thử lại với GET; hết lượt thì ném lại lỗi.
+        Ném CircuitOpenError nếu mạch đang mở.
+        """
+        breaker = self.breakers[service]
+        attempts = self.attempts(method, retries)
+        hedge_after = self._hedge_after(service, method)
+        for attempt in range(attempts):
+            if attempt:
+                breaker.count('retries')
+                time.sleep(self.backoff(service, attempt))
+            if not breaker.allow():
+                raise CircuitOpenError(service, breaker.retry_after())
+            try:
+                response = self._hedged(send, hedge_after, breaker) if hedge_after else send()
+            except DeadlineExceeded:
+                # Hết ngân sách thời gian của request, không phải lỗi của service
+                breaker.abandon()
+                raise
+            except retryable:
+                breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                continue
+            except BaseException:
+                breaker.record_failure()
+                raise
+            if response.status_code in FAILURE_STATUSES:
+                breaker.record_failure()
+                if attempt < attempts - 1:
+                    response.close()
+                    continue
+            else:
+                breaker.record_success()
+            return response
+
+    def _hedged(self, send, delay, breaker):
+        executor = self._hedge_executor()
+        primary = executor.submit(send)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        breaker.count('hedges')
+        backup = executor.submit(send)
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is backup:
+                    breaker.count('hedge_wins')
+                for other in (pending | done) - {future}:
+                    other.add_done_callback(_discard)
+                return future.result()
+        raise error
+
+    async def call_async(self, service, method, retries, send, retryable=()):
+        """Như call() nhưng send là coroutine function trả về aiohttp.ClientResponse."""
+        breaker = self.breakers[service]
+        attempts = self.attempts(method, retries)
+        hedge_after = self._hedge_after(service, method)
+        for attempt in range(attempts):
+            if attempt:
+                breaker.count('retries')
+                await asyncio.sleep(self.backoff(service, attempt))
+            if not breaker.allow():
+                raise CircuitOpenError(service, breaker.retry_after())
+            try:
+                if hedge_after:
+                    response = await self._hedged_async(send, hedge_after, breaker)
+                else:
+                    response = await send()
+            except (asyncio.CancelledError, DeadlineExceeded):
+                breaker.abandon()
+                raise
+            except retryable:
+                breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                continue
+            except BaseException:
+                breaker.record_failure()
+                raise
+            if response.status in FAILURE_STATUSES:
+                breaker.record_failure()
+                if attempt < attempts - 1:
+                    response.release()
+                    continue
+            else:
+                breaker.record_success()
+            return response
+
+    async def _hedged_async(self, send, delay, breaker):
+        primary = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        breaker.count('hedges')
+        backup = asyncio.ensure_future(send())
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if task is backup:
+                    breaker.count('hedge_wins')
+                for other in (pending | done) - {task}:
+                    other.add_done_callback(_discard)
+                    other.cancel()
+                return task.result()
+        raise error
+
+    def snapshot(self):
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+    def collect(self):
+        """Trạng thái breaker cho /metrics: 0 = closed, 1 = half_open, 2 = open."""
+        states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        samples = []
+        for name, snapshot in self.snapshot().items():
+            labels = (('upstream', name),)
+            samples.append(('upstream_breaker_state', 'gauge', labels, states[snapshot['state']]))
+            for key in ('rejected', 'opened', 'retries', 'hedges', 'hedge_wins'):
+                samples.append((f'upstream_{key}_total', 'counter', labels, snapshot[key]))
+        return samples
+
+
+# Breaker của worker hiện tại (mỗi worker/tiến trình theo dõi riêng)
+resilience = Resilience(SERVICES)
+metrics.register_collector(resilience.collect)
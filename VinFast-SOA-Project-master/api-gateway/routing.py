@@ -0,0 +1,166 @@
+# api-gateway/routing.py
+
+import json
+import os
+import re
+import threading
+import time
+
+def service_config(name, default_url):
+    """Đọc URL, kích thước pool, timeout và giới hạn chịu lỗi của một service từ biến môi trường.
+
+    Ví dụ với service "catalog": CATALOG_SERVICE_URL, CATALOG_POOL_SIZE,
+    CATALOG_ASYNC_POOL_SIZE, CATALOG_CONNECT_TIMEOUT, CATALOG_READ_TIMEOUT,
+    CATALOG_BREAKER_FAILURES, CATALOG_BREAKER_RESET, CATALOG_RETRY_BACKOFF_MS,
+    CATALOG_HEDGE_AFTER_MS (xem resilience.py).
+    """
+    prefix = {"users": "USER", "orders": "ORDER"}.get(name, name.upper())
+    return {
+        "url": os.environ.get(f"{prefix}_SERVICE_URL", default_url),
+        "pool_size": int(os.environ.get(f"{prefix}_POOL_SIZE", 20)),
+        # Engine asyncio chờ I/O rất rẻ nên cho phép nhiều kết nối đồng thời hơn
+        "async_pool_size": int(os.environ.get(f"{prefix}_ASYNC_POOL_SIZE", 1000)),
+        "connect_timeout": float(os.environ.get(f"{prefix}_CONNECT_TIMEOUT", 2)),
+        "read_timeout": float(os.environ.get(f"{prefix}_READ_TIMEOUT", 10)),
+        # Số lỗi liên tiếp để mở circuit breaker và số giây mạch mở trước khi thăm dò lại
+        "breaker_failures": int(os.environ.get(f"{prefix}_BREAKER_FAILURES", 5)),
+        "breaker_reset": float(os.environ.get(f"{prefix}_BREAKER_RESET", 5)),
+        "retry_backoff": float(os.environ.get(f"{prefix}_RETRY_BACKOFF_MS", 50)) / 1000,
+        # 0 = tắt hedged request
+        "hedge_after": float(os.environ.get(f"{prefix}_HEDGE_AFTER_MS", 0)) / 1000
+    }
+
+# Định nghĩa danh sách các service nội bộ
+SERVICES = {
+    "users": service_config("users", "http://users:5001/api/v1"),
+    "catalog": service_config("catalog", "http://catalog:5002/api/v1"),
+    "orders": service_config("orders", "http://orders:5003/api/v1"),
+    "chat": service_config("chat", "http://chat:5005/api/v1")
+}
+
+# File khai báo bảng định tuyến (đọc lại tự động khi file thay đổi, không cần khởi động lại)
+ROUTES_FILE = os.environ.get('GATEWAY_ROUTES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routes.json'))
+ROUTES_RELOAD_INTERVAL = float(os.environ.get('GATEWAY_ROUTES_RELOAD_INTERVAL', 2))
+
+AUTH_POLICIES = ('public', 'user', 'admin', 'internal')
+ALL_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# Kiểu tham số trong path template, ví dụ "orders/{order_id:int}/pay"
+PARAM_PATTERNS = {'str': '[^/]+', 'int': '[0-9]+', 'path': '.+'}
+PARAM_RE = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+def normalize_path(path):
+    """Bỏ dấu '/' đầu/cuối và tiền tố api/v1: /catalog/cars và /api/v1/catalog/cars là cùng một route."""
+    clean_path = path.strip('/')
+    if clean_path.startswith('api/v1/'):
+        clean_path = clean_path[len('api/v1/'):]
+    return clean_path
+
+def build_target_url(service, path, query_string=''):
+    """Ghép URL đích (kèm query string) trên service nội bộ từ path mà Client gửi tới Gateway."""
+    target_url = f"{SERVICES[service]['url'].rstrip('/')}/{normalize_path(path)}"
+    return f"{target_url}?{query_string}" if query_string else target_url
+
+
+class Route:
+    """Một dòng trong bảng định tuyến."""
+
+    def __init__(self, service, path, methods=None, auth='user', timeout=None, cache_ttl=None, retries=0):
+        if service not in SERVICES:
+            raise ValueError(f"Service không tồn tại: {service}")
+        if auth not in AUTH_POLICIES:
+            raise ValueError(f"Chính sách auth không hợp lệ: {auth}")
+        self.service = service
+        self.path = path.strip('/')
+        self.methods = tuple(m.upper() for m in (methods or ALL_METHODS))
+        self.auth = auth
+        self.timeout = timeout
+        # Chỉ cache GET công khai: phản hồi không phụ thuộc người gọi
+        self.cache_ttl = cache_ttl if auth == 'public' and cache_ttl else None
+        self.retries = int(retries or 0)
+
+    @property
+    def public(self):
+        return self.auth == 'public'
+
+    def pattern(self):
+        """Chuyển path template thành regex (không có nhóm bắt để ghép được nhiều route)."""
+        regex, position = '', 0
+        for match in PARAM_RE.finditer(self.path):
+            kind = match.group(2) or 'str'
+            if kind not in PARAM_PATTERNS:
+                raise ValueError(f"Kiểu tham số không hợp lệ trong {self.path}: {kind}")
+            regex += re.escape(self.path[position:match.start()]) + PARAM_PATTERNS[kind]
+            position = match.end()
+        return regex + re.escape(self.path[position:])
+
+
+class RouteTable:
+    """Bảng định tuyến đã biên dịch: mỗi cặp (service, method) là một regex ghép từ mọi route.
+
+    Route khai báo trước được ưu tiên. Chi phí khớp là một lần tra dict và một lần
+    chạy regex, không phụ thuộc vào việc duyệt từng route bằng Python.
+    """
+
+    def __init__(self, path=ROUTES_FILE, reload_interval=ROUTES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._compiled = {}
+        self.reload()
+
+    @staticmethod
+    def compile(routes):
+        grouped = {}
+        for route in routes:
+            for method in route.methods:
+                grouped.setdefault((route.service, method), []).append(route)
+        compiled = {}
+        for key, group in grouped.items():
+            regex = '|'.join(f"(?P<r{i}>{route.pattern()})" for i, route in enumerate(group))
+            compiled[key] = (re.compile(f"^(?:{regex})$"), group)
+        return compiled
+
+    def reload(self):
+        """Đọc và biên dịch lại file định tuyến; file lỗi thì giữ nguyên bảng cũ."""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding='utf-8') as f:
+            routes = [Route(**entry) for entry in json.load(f)['routes']]
+        self._compiled = self.compile(routes)
+        self._mtime = mtime
+        return len(routes)
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                if os.stat(self.path).st_mtime != self._mtime:
+                    print(f"🔁 Đã nạp lại {self.reload()} route từ {self.path}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Không nạp lại được bảng định tuyến, giữ bảng cũ: {e}")
+
+    def match(self, service, method, path):
+        """Trả về (route, lỗi): lỗi là (mã HTTP, thông báo) khi không có route phù hợp."""
+        self.maybe_reload()
+        compiled = self._compiled
+        clean_path = normalize_path(path)
+        entry = compiled.get((service, method))
+        if entry:
+            matched = entry[0].match(clean_path)
+            if matched:
+                return entry[1][int(matched.lastgroup[1:])], None
+        # Path tồn tại nhưng với method khác -> 405 thay vì 404
+        for other in ALL_METHODS:
+            if other != method and (service, other) in compiled and compiled[(service, other)][0].match(clean_path):
+                return None, (405, "Phương thức không được hỗ trợ")
+        return None, (404, "API không tồn tại")
+
+
+route_table = RouteTable()
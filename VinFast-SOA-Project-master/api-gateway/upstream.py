@@ -0,0 +1,139 @@
+# api-gateway/upstream.py
+
+import threading
+import time
+import requests
+from flask import Response
+from requests.adapters import HTTPAdapter
+from common.metrics import observe_upstream
+
+# Các header chỉ có ý nghĩa trên từng chặng kết nối, không được chuyển tiếp qua proxy
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length'
+}
+
+# Header định danh chỉ do Gateway gắn sau khi xác thực JWT, bỏ bản Client tự gửi lên
+IDENTITY_HEADERS = {'x-user-id', 'x-user-role', 'x-gateway-secret'}
+
+# Header CORS của service nội bộ bị bỏ qua, Gateway tự gắn CORS của mình
+CORS_HEADER_PREFIX = 'access-control-'
+
+# Kích thước mỗi khối dữ liệu khi đọc/ghi body dạng stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _BodyStream:
+    """Bọc request.stream để requests biết trước Content-Length nhưng vẫn đọc body theo từng khối."""
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+def request_body(flask_request):
+    """Trả về body của request gốc dưới dạng stream thay vì đọc toàn bộ vào bộ nhớ."""
+    length = flask_request.content_length
+    if length:
+        return _BodyStream(flask_request.stream, length)
+    if flask_request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        # Không biết trước độ dài -> chuyển tiếp dạng chunked
+        return iter(lambda: flask_request.stream.read(STREAM_CHUNK_SIZE), b'')
+    return None
+
+
+def forward_headers(headers):
+    """Lọc bỏ các header hop-by-hop (giữ kết nối keep-alive) và header định danh giả mạo."""
+    return {k: v for k, v in headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() not in IDENTITY_HEADERS}
+
+
+def response_headers(upstream):
+    """Giữ lại các header của service (Content-Type, ETag, Cache-Control, ...) khi trả về Client."""
+    headers = []
+    for k, v in upstream.raw.headers.items():
+        lower = k.lower()
+        if lower in HOP_BY_HOP_HEADERS or lower.startswith(CORS_HEADER_PREFIX):
+            continue
+        headers.append((k, v))
+    length = upstream.headers.get('Content-Length')
+    if length is not None:
+        headers.append(('Content-Length', length))
+    return headers
+
+
+def passthrough_response(upstream):
+    """Chuyển nguyên byte, status và header từ service về Client, không decode/encode lại JSON.
+
+    Body được đọc trực tiếp từ socket (không giải nén) theo từng khối; nếu service
+    không gửi Content-Length thì Client nhận dạng chunked. Kết nối được trả về pool
+    khi Client đọc xong.
+    """
+    body = upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    response = Response(body, status=upstream.status_code, headers=response_headers(upstream))
+    response.call_on_close(upstream.close)
+    return response
+
+
+class UpstreamPool:
+    """Quản lý một Session (pool kết nối keep-alive) riêng cho từng service nội bộ."""
+
+    def __init__(self, services):
+        self._services = services
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, name):
+        """Lấy (hoặc tạo lần đầu) Session dùng chung cho service `name`."""
+        session = self._sessions.get(name)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(name)
+                if session is None:
+                    config = self._services[name]
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=config['pool_size'],
+                        max_retries=0
+                    )
+                    session = requests.Session()
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[name] = session
+        return session
+
+    def timeout(self, name, read_timeout=None):
+        """Timeout (connect, read) cấu hình riêng cho từng service (route có thể ghi đè read)."""
+        config = self._services[name]
+        return (config['connect_timeout'], read_timeout or config['read_timeout'])
+
+    def request(self, name, method, url, headers=None, body=None, stream=True, read_timeout=None):
+        """Gửi request tới service qua pool; mặc định không đọc trước body phản hồi."""
+        started = time.perf_counter()
+        try:
+            response = self.session(name).request(
+                method=method,
+                url=url,
+                headers=headers,
+                data=body,
+                timeout=self.timeout(name, read_timeout),
+                stream=stream
+            )
+        except requests.exceptions.RequestException:
+            observe_upstream(name, 'error', time.perf_counter() - started)
+            raise
+        observe_upstream(name, response.status_code, time.perf_counter() - started)
+        return response
+
+    def close(self):
+        """Đóng toàn bộ kết nối đang giữ trong pool."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
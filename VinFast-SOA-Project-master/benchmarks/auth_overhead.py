@@ -0,0 +1,63 @@
+# benchmarks/auth_overhead.py
+"""Đo chi phí xác thực JWT của Gateway cho mỗi request, có và không có cache.
+
+Tạo `--users` token HS256 khác nhau (mỗi token như một phiên đăng nhập), rồi gọi
+`auth.authenticate` `--requests` lần với token chọn ngẫu nhiên: lần đầu với cache
+tắt (giải mã + kiểm tra chữ ký mỗi lần), lần sau với cache bật.
+
+Chạy: python benchmarks/auth_overhead.py --users 1000 --requests 200000
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+
+import harness
+
+def load_auth():
+    sys.path.insert(0, harness.service_dir('api-gateway'))
+    import auth
+    return auth
+
+def make_headers(auth, count):
+    import jwt
+    exp = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    return [
+        "Bearer " + jwt.encode({'user_id': i, 'role': 'customer', 'exp': exp}, auth.JWT_SECRET, algorithm='HS256')
+        for i in range(1, count + 1)
+    ]
+
+def measure(auth, cache, headers, requests):
+    """Trả về (µs mỗi request, số lỗi)."""
+    rng = random.Random(42)
+    picks = [rng.choice(headers) for _ in range(requests)]
+    errors = 0
+    start = time.perf_counter()
+    for header in picks:
+        _, error = auth.authenticate(header, cache=cache)
+        if error:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    return round(elapsed / requests * 1e6, 2), errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='Số token khác nhau đang hoạt động')
+    parser.add_argument('--requests', type=int, default=200000)
+    args = parser.parse_args()
+
+    auth = load_auth()
+    headers = make_headers(auth, args.users)
+    rows = []
+    for name, cache in [('no_cache', auth.TokenCache(max_entries=0)),
+                        ('lru_cache', auth.TokenCache(max_entries=args.users * 2))]:
+        us, errors = measure(auth, cache, headers, args.requests)
+        rows.append({'mode': name, 'us_per_request': us,
+                     'requests_per_core_s': int(1e6 / us) if us else 0, 'errors': errors})
+
+    harness.print_table(rows, ['mode', 'us_per_request', 'requests_per_core_s', 'errors'])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# benchmarks/catalog_listing.py
+"""Đo API danh sách xe của catalog-service khi catalog lớn dần.
+
+Với mỗi kích thước catalog, script tạo `N` mẫu xe, mỗi mẫu có `--locations`
+dòng tồn kho, rồi so sánh cách cũ (1 query SUM cho mỗi xe) với truy vấn
+GROUP BY hiện tại: số câu SQL và thời gian tải TOÀN BỘ catalog. API mới phân trang,
+nên phía mới đi hết các trang GET /api/v1/catalog/cars?limit=<MAX_PAGE_SIZE> theo
+header X-Next-Cursor; hai bên phải trả cùng số xe (thoát mã 1 nếu lệch).
+
+Chạy: python benchmarks/catalog_listing.py --sizes 500,1000,2000,4000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import harness
+
+def load_catalog_app(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    sys.path.insert(0, harness.service_dir('catalog-service'))
+    import app as catalog_app
+    return catalog_app
+
+def populate(catalog_app, models, locations):
+    """Thêm `models` mẫu xe giả lập, mỗi mẫu có `locations` chi nhánh tồn kho."""
+    db, CarModel, Inventory = catalog_app.db, catalog_app.CarModel, catalog_app.Inventory
+    start_id = (db.session.query(db.func.max(CarModel.id)).scalar() or 0) + 1
+    specs = json.dumps({"motor_type": "Điện", "range": "400 km"})
+    db.session.execute(CarModel.__table__.insert(), [
+        {"id": i, "model_name": f"Bench Model {i}", "base_price": 500000000 + i,
+         "description": "Mẫu xe benchmark", "specs": specs, "image_url": None}
+        for i in range(start_id, start_id + models)
+    ])
+    db.session.execute(Inventory.__table__.insert(), [
+        {"car_model_id": i, "dealer_location": f"Đại lý {loc}", "stock_quantity": 5}
+        for i in range(start_id, start_id + models) for loc in range(locations)
+    ])
+    db.session.commit()
+
+def legacy_listing(catalog_app):
+    """Cách cũ: tải toàn bộ xe rồi chạy 1 câu SUM tồn kho cho từng xe."""
+    db, CarModel, Inventory = catalog_app.db, catalog_app.CarModel, catalog_app.Inventory
+    result = []
+    for car in CarModel.query.all():
+        car_data = car.to_dict()
+        car_data['stock_quantity'] = db.session.query(db.func.sum(Inventory.stock_quantity)) \
+            .filter(Inventory.car_model_id == car.id).scalar() or 0
+        result.append(car_data)
+    return result
+
+def paged_listing(catalog_app, client):
+    """Cách mới: đi hết các trang (cỡ trang tối đa) theo X-Next-Cursor, trả về (danh sách xe, số trang)."""
+    result, pages, cursor = [], 0, None
+    while True:
+        url = f'/api/v1/catalog/cars?limit={catalog_app.MAX_PAGE_SIZE}'
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        result.extend(response.get_json())
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return result, pages
+
+def measure(catalog_app, fn, repeat):
+    """Chạy `fn` `repeat` lần, trả về (số câu SQL mỗi lần, thời gian trung bình ms)."""
+    from sqlalchemy import event
+    engine = catalog_app.db.engine
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+            catalog_app.db.session.remove()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements) // repeat, round(elapsed / repeat * 1000, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='500,1000,2000,4000', help='Các kích thước catalog (số mẫu xe) cần đo')
+    parser.add_argument('--locations', type=int, default=5, help='Số chi nhánh tồn kho cho mỗi mẫu xe')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='catalog-bench-')
+    catalog_app = load_catalog_app(os.path.join(workdir, 'catalog.db'))
+    app = catalog_app.app
+    client = app.test_client()
+    rows = []
+    mismatched = []
+
+    with app.app_context():
+        catalog_app.initialize_db()
+        total = catalog_app.CarModel.query.count()
+        for size in (int(s) for s in args.sizes.split(',')):
+            populate(catalog_app, size - total, args.locations)
+            total = size
+            legacy_queries, legacy_ms = measure(catalog_app, lambda: legacy_listing(catalog_app), args.repeat)
+            queries, ms = measure(catalog_app, lambda: paged_listing(catalog_app, client), args.repeat)
+            legacy_count = len(legacy_listing(catalog_app))
+            listed, pages = paged_listing(catalog_app, client)
+            if len(listed) != legacy_count:
+                mismatched.append(size)
+            rows.append({
+                'models': size, 'inventory_rows': size * args.locations,
+                'legacy_queries': legacy_queries, 'legacy_ms': legacy_ms,
+                'pages': pages, 'listed': len(listed),
+                'queries': queries, 'ms': ms, 'ms_per_1k_models': round(ms / size * 1000, 2)
+            })
+
+    harness.print_table(rows, ['models', 'inventory_rows', 'legacy_queries', 'legacy_ms',
+                               'pages', 'listed', 'queries', 'ms', 'ms_per_1k_models'])
+    if mismatched:
+        print(f"❌ API phân trang trả thiếu/thừa xe so với cách cũ ở kích thước: {mismatched}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
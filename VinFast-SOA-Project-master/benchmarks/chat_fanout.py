@@ -0,0 +1,158 @@
+# benchmarks/chat_fanout.py
+"""Đo chat real-time qua Gateway với hàng nghìn phòng chat đồng thời.
+
+Khởi động Chat Service và Gateway (DB SQLite tạm) dùng chung message bus
+`--bus-url` (cần một Redis đang chạy, ví dụ `docker run -p 6379:6379 redis:7-alpine`).
+Mỗi phòng có `--members` client Socket.IO (websocket) nối vào Gateway; client đầu
+tiên của mỗi phòng gửi `--messages` tin, các client còn lại đo độ trễ từ lúc gửi tới
+lúc nhận. Kiểm tra không client nào nhận tin của phòng khác và không thiếu/trùng tin.
+`--gateway-workers` > 1 chạy Gateway qua common/serve.py để đo phát tin giữa các worker.
+
+Chạy: python benchmarks/chat_fanout.py --rooms 2000 --members 2 --messages 5
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import socketio
+
+import harness
+
+def raise_fd_limit():
+    """Mỗi client là một socket: nâng giới hạn file descriptor (các service con kế thừa)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def start_services(args):
+    workdir = tempfile.mkdtemp(prefix='chat-fanout-')
+    chat_port, gateway_port = harness.free_port(), harness.free_port()
+    env = {
+        'MESSAGE_BUS_URL': args.bus_url,
+        'CHAT_PORT': str(chat_port),
+        'GATEWAY_PORT': str(gateway_port),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'chat.db')}",
+        'CHAT_SERVICE_URL': f'http://127.0.0.1:{chat_port}/api/v1'
+    }
+    chat = harness.start_process(['app.py'], cwd=harness.service_dir('chat-service'), port=chat_port, env=env)
+    if args.gateway_workers > 1:
+        command = ['-m', 'common.serve', 'app:app', '--chdir', 'api-gateway', '--port', str(gateway_port),
+                   '--workers', str(args.gateway_workers), '--socketio']
+        gateway = harness.start_process(command, cwd=harness.PROJECT_ROOT, port=gateway_port, env=env)
+    else:
+        gateway = harness.start_process(['app.py'], cwd=harness.service_dir('api-gateway'), port=gateway_port, env=env)
+    return [chat, gateway], f'http://127.0.0.1:{gateway_port}'
+
+async def run(url, args):
+    latencies = []
+    counters = {'received': 0, 'wrong_room': 0, 'connect_errors': 0}
+    sent_at = {}
+    deliveries = {}   # nội dung tin -> số client đã nhận
+
+    def on_message(room):
+        def handler(data):
+            if str(data.get('order_id')) != room:
+                counters['wrong_room'] += 1
+                return
+            counters['received'] += 1
+            content = data.get('content')
+            deliveries[content] = deliveries.get(content, 0) + 1
+            started = sent_at.get(content)
+            if started is not None:
+                latencies.append(time.perf_counter() - started)
+        return handler
+
+    async def connect(room):
+        client = socketio.AsyncClient(reconnection=False)
+        client.on('receive_message', on_message(room))
+        try:
+            await client.connect(url, transports=['websocket'])
+            await client.emit('join', {'order_id': int(room)})
+        except Exception:
+            counters['connect_errors'] += 1
+            return None
+        return client
+
+    rooms = [str(100000 + i) for i in range(args.rooms)]
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def limited(room):
+        async with semaphore:
+            return room, await connect(room)
+
+    started = time.perf_counter()
+    joined = await asyncio.gather(*(limited(room) for room in rooms for _ in range(args.members)))
+    connect_s = time.perf_counter() - started
+    members = {}
+    for room, client in joined:
+        if client is not None:
+            members.setdefault(room, []).append(client)
+    # Chờ Gateway subscribe xong kênh bus của các phòng
+    await asyncio.sleep(args.settle)
+
+    expected = sum(len(clients) - 1 for clients in members.values()) * args.messages
+
+    async def send(room, client):
+        for n in range(args.messages):
+            content = f'{room}-{n}'
+            sent_at[content] = time.perf_counter()
+            await client.emit('send_message', {'order_id': int(room), 'role': 'customer',
+                                               'name': 'Bench', 'content': content})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(room, clients[0]) for room, clients in members.items()))
+    deadline = time.monotonic() + args.timeout
+    while counters['received'] < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    await asyncio.gather(*(client.disconnect() for _, client in joined if client is not None),
+                         return_exceptions=True)
+
+    missing = duplicates = 0
+    for room, clients in members.items():
+        for n in range(args.messages):
+            got = deliveries.get(f'{room}-{n}', 0)
+            missing += max(len(clients) - 1 - got, 0)
+            duplicates += max(got - (len(clients) - 1), 0)
+
+    summary = harness.summarize(latencies, elapsed)
+    return {
+        'rooms': len(members), 'clients': sum(len(c) for c in members.values()),
+        'connect_s': round(connect_s, 2), 'connect_errors': counters['connect_errors'],
+        'expected': expected, 'received': counters['received'],
+        'missing': missing, 'duplicates': duplicates, 'wrong_room': counters['wrong_room'],
+        'deliveries_s': summary['rps'], 'p50_ms': summary['p50_ms'], 'p95_ms': summary['p95_ms'],
+        'p99_ms': summary['p99_ms'], 'max_ms': summary['max_ms']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=2)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--bus-url', default='redis://127.0.0.1:6379/0')
+    parser.add_argument('--gateway-workers', type=int, default=1)
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    parser.add_argument('--settle', type=float, default=1.0, help='Giây chờ sau khi join trước khi gửi')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    if args.bus_url.startswith('memory://'):
+        parser.error('Gateway và Chat Service chạy ở hai tiến trình: cần --bus-url redis://...')
+    raise_fd_limit()
+    processes, url = start_services(args)
+    try:
+        row = asyncio.run(run(url, args))
+    finally:
+        for proc in processes:
+            harness.stop_process(proc)
+    harness.print_table([row], ['rooms', 'clients', 'connect_s', 'connect_errors', 'expected', 'received',
+                                'missing', 'duplicates', 'wrong_room', 'deliveries_s', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# benchmarks/chat_persistence.py
+"""Đo số tin nhắn chat xử lý được mỗi giây: ghi đồng bộ so với ghi theo lô.
+
+Mỗi chế độ CHAT_PERSISTENCE chạy trong một tiến trình riêng với DB SQLite mới:
+`--clients` client Socket.IO (test client của Flask-SocketIO, không qua mạng) vào
+cùng các phòng chat và gửi tổng cộng `--messages` tin qua sự kiện send_message.
+Thời gian đo là thời gian handler xử lý (lưu + phát tới phòng). Cuối cùng đóng
+hàng đợi ghi và kiểm tra số tin trong DB đúng bằng số tin đã gửi. Ở chế độ batched tin
+được phát ngay với id null rồi id thật đến sau qua message_persisted: persist_lag_ms là
+độ trễ tới khi có id thật, unconfirmed là số tin phát với id null mà không bao giờ nhận id.
+
+Chạy: python benchmarks/chat_persistence.py --messages 5000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='chat-persistence-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    os.environ['CHAT_PERSISTENCE'] = mode
+    sys.path.insert(0, harness.service_dir('chat-service'))
+    import app as chat_app
+    chat_app.initialize_db()
+
+    clients = [chat_app.socketio.test_client(chat_app.app) for _ in range(args.clients)]
+    for i, client in enumerate(clients):
+        client.emit('join', {'order_id': i % args.rooms})
+
+    without_id, confirmed = set(), set()
+
+    def drain():
+        for packet in (packet for c in clients for packet in c.get_received()):
+            data = packet['args'][0]
+            if packet['name'] == 'receive_message' and data.get('id') is None:
+                without_id.add(data['client_id'])
+            elif packet['name'] == 'message_persisted':
+                confirmed.add(data['client_id'])
+
+    latencies = []
+    started = time.perf_counter()
+    for n in range(args.messages):
+        client = clients[n % len(clients)]
+        start = time.perf_counter()
+        client.emit('send_message', {'order_id': n % args.rooms, 'role': 'customer',
+                                     'name': 'Bench', 'content': f'Tin nhắn {n}'})
+        latencies.append(time.perf_counter() - start)
+        if n % 500 == 0:
+            drain()
+    elapsed = time.perf_counter() - started
+
+    chat_app.message_writer.close()
+    drain()
+    stats = chat_app.message_writer.stats()
+    with chat_app.app.app_context():
+        stored = chat_app.Message.query.count()
+
+    summary = harness.summarize(latencies, elapsed)
+    print(json.dumps({
+        'mode': mode, 'messages_s': summary['rps'], 'p50_ms': summary['p50_ms'], 'p99_ms': summary['p99_ms'],
+        'flushes': stats['flushes'], 'flush_ms_avg': stats['flush_ms_avg'], 'max_batch': stats['max_batch'],
+        'persist_lag_ms_avg': stats['persist_lag_ms_avg'], 'persist_lag_ms_max': stats['persist_lag_ms_max'],
+        'stored': stored, 'lost': args.messages - stored, 'unconfirmed': len(without_id - confirmed)
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--modes', default='sync,batched')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args)
+        return
+
+    rows = []
+    for mode in args.modes.split(','):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                 '--messages', str(args.messages), '--clients', str(args.clients),
+                                 '--rooms', str(args.rooms)],
+                                check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+    harness.print_table(rows, ['mode', 'messages_s', 'p50_ms', 'p99_ms', 'flushes',
+                               'flush_ms_avg', 'max_batch', 'persist_lag_ms_avg', 'persist_lag_ms_max',
+                               'stored', 'lost', 'unconfirmed'])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# benchmarks/gateway_engines.py
+"""So sánh engine Gateway Flask (app.py) và engine asyncio (async_app.py).
+
+Một service catalog giả lập trả lời sau `--delay` giây để mô phỏng service chậm;
+script bắn `--requests` request GET /catalog/catalog/cars với `--concurrency`
+kết nối đồng thời qua từng engine rồi in thông lượng và độ trễ.
+
+Chạy: python benchmarks/gateway_engines.py --concurrency 500 --delay 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+import harness
+
+CARS = [{"id": i, "model_name": f"VinFast Test {i}", "base_price": 500000000, "stock_quantity": 10}
+        for i in range(1, 51)]
+
+def run_stub(port, delay):
+    """Service catalog giả lập: trả danh sách xe sau `delay` giây."""
+    body = json.dumps(CARS).encode()
+
+    async def cars(request):
+        await asyncio.sleep(delay)
+        # no-store: đo đường proxy của Gateway, không đo cache phản hồi
+        return web.Response(body=body, content_type='application/json', headers={'Cache-Control': 'no-store'})
+
+    app = web.Application()
+    app.router.add_get('/api/v1/catalog/cars', cars)
+    web.run_app(app, host='127.0.0.1', port=port, access_log=None, print=None)
+
+async def drive_load(url, total, concurrency):
+    """Bắn `total` request với tối đa `concurrency` request cùng lúc, trả về kết quả đo."""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = ClientTimeout(total=60)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency), timeout=timeout) as session:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            return
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    return harness.summarize(latencies, elapsed, errors)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.2, help='Độ trễ của service giả lập (giây)')
+    parser.add_argument('--engines', default='flask,async')
+    parser.add_argument('--stub', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub:
+        run_stub(args.stub, args.delay)
+        return
+
+    stub_port = harness.free_port()
+    stub = harness.start_process([os.path.abspath(__file__), '--stub', str(stub_port), '--delay', str(args.delay)],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), port=stub_port)
+    entrypoints = {'flask': 'app.py', 'async': 'async_app.py'}
+    rows = []
+    try:
+        for engine in args.engines.split(','):
+            port = harness.free_port()
+            env = {
+                'GATEWAY_PORT': str(port),
+                'CATALOG_SERVICE_URL': f'http://127.0.0.1:{stub_port}/api/v1'
+            }
+            gateway = harness.start_process([entrypoints[engine]], cwd=harness.service_dir('api-gateway'),
+                                            port=port, env=env)
+            try:
+                url = f'http://127.0.0.1:{port}/catalog/catalog/cars'
+                result = asyncio.run(drive_load(url, args.requests, args.concurrency))
+            finally:
+                harness.stop_process(gateway)
+            result['engine'] = engine
+            rows.append(result)
+    finally:
+        harness.stop_process(stub)
+
+    print(f"\nGET /catalog/catalog/cars, concurrency={args.concurrency}, upstream delay={args.delay}s")
+    harness.print_table(rows, ['engine', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# benchmarks/gateway_faults.py
+"""Đo độ trễ đuôi của Gateway khi service catalog gặp sự cố (fault injection).
+
+Một service catalog giả lập được điều khiển qua endpoint /__fault, lần lượt qua các pha
+(mỗi pha `--phase-duration` giây):
+  steady    bình thường, `--tail-ratio` request chậm thêm `--tail-delay` giây (đuôi dài)
+  outage    treo: không trả lời cho tới khi Gateway hết read timeout
+  down      từ chối kết nối (service đang khởi động lại)
+  recovery  bình thường trở lại
+`--concurrency` client liên tục gọi GET /catalog/catalog/cars/<id> qua Gateway (app.py).
+So sánh hai cấu hình: `baseline` (tắt breaker, không thử lại, không hedge) và `resilient`
+(circuit breaker, thử lại có jitter, hedged request sau `--hedge-after-ms`).
+503 kèm Retry-After (breaker đang mở) được đếm riêng là `fast_fail`.
+
+Chạy: python benchmarks/gateway_faults.py --concurrency 50 --phase-duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+import harness
+
+PHASES = ('steady', 'outage', 'down', 'recovery')
+
+def run_stub(port, tail_ratio, tail_delay):
+    """Service catalog giả lập có thể chuyển chế độ lỗi qua POST /__fault?mode=..."""
+    state = {'mode': 'ok'}
+
+    async def fault(request):
+        state['mode'] = request.query['mode']
+        return web.json_response(state)
+
+    async def car(request):
+        if state['mode'] == 'down':
+            # Đóng kết nối không trả lời, giống service đang khởi động lại
+            request.transport.close()
+            raise web.HTTPServiceUnavailable()
+        if state['mode'] == 'hang':
+            await asyncio.sleep(3600)
+        if random.random() < tail_ratio:
+            await asyncio.sleep(tail_delay)
+        body = {"id": int(request.match_info['car_id']), "model_name": "VinFast Test", "base_price": 500000000}
+        return web.json_response(body, headers={'Cache-Control': 'no-store'})
+
+    app = web.Application()
+    app.router.add_post('/__fault', fault)
+    app.router.add_get('/api/v1/catalog/cars/{car_id}', car)
+    web.run_app(app, host='127.0.0.1', port=port, access_log=None, print=None)
+
+async def drive_phase(session, url, concurrency, duration):
+    """Gọi liên tục trong `duration` giây, trả về kết quả đo của pha."""
+    latencies, counters = [], {'errors': 0, 'fast_fail': 0}
+    stop_at = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{url}/{random.randint(1, 50)}") as response:
+                    await response.read()
+                    status, retry_after = response.status, response.headers.get('Retry-After')
+            except Exception:
+                counters['errors'] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            if status == 503 and retry_after:
+                counters['fast_fail'] += 1
+            elif status != 200:
+                counters['errors'] += 1
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    summary = harness.summarize(latencies, time.perf_counter() - started, counters['errors'])
+    summary['fast_fail'] = counters['fast_fail']
+    return summary
+
+async def run_scenario(gateway_url, stub_url, args):
+    rows = []
+    modes = {'steady': 'ok', 'outage': 'hang', 'down': 'down', 'recovery': 'ok'}
+    timeout = ClientTimeout(total=60)
+    async with ClientSession(connector=TCPConnector(limit=args.concurrency), timeout=timeout) as session:
+        for phase in PHASES:
+            async with session.post(f"{stub_url}/__fault", params={'mode': modes[phase]}) as response:
+                await response.read()
+            result = await drive_phase(session, f"{gateway_url}/catalog/catalog/cars",
+                                       args.concurrency, args.phase_duration)
+            result['phase'] = phase
+            rows.append(result)
+        async with session.get(f"{gateway_url}/health/upstreams") as response:
+            breaker = (await response.json())['catalog']
+    return rows, breaker
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--phase-duration', type=float, default=10)
+    parser.add_argument('--read-timeout', type=float, default=2, help='CATALOG_READ_TIMEOUT của Gateway (giây)')
+    parser.add_argument('--tail-ratio', type=float, default=0.05)
+    parser.add_argument('--tail-delay', type=float, default=0.3)
+    parser.add_argument('--hedge-after-ms', type=float, default=50)
+    parser.add_argument('--configs', default='baseline,resilient')
+    parser.add_argument('--stub', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub:
+        run_stub(args.stub, args.tail_ratio, args.tail_delay)
+        return
+
+    configs = {
+        'baseline': {'CATALOG_BREAKER_FAILURES': str(10 ** 9), 'CATALOG_HEDGE_AFTER_MS': '0'},
+        'resilient': {'CATALOG_HEDGE_AFTER_MS': str(args.hedge_after_ms)}
+    }
+    rows = []
+    for name in args.configs.split(','):
+        stub_port, port = harness.free_port(), harness.free_port()
+        stub = harness.start_process([os.path.abspath(__file__), '--stub', str(stub_port),
+                                      '--tail-ratio', str(args.tail_ratio), '--tail-delay', str(args.tail_delay)],
+                                     cwd=os.path.dirname(os.path.abspath(__file__)), port=stub_port)
+        env = dict(configs[name], GATEWAY_PORT=str(port), CATALOG_READ_TIMEOUT=str(args.read_timeout),
+                   CATALOG_SERVICE_URL=f'http://127.0.0.1:{stub_port}/api/v1')
+        try:
+            gateway = harness.start_process(['app.py'], cwd=harness.service_dir('api-gateway'), port=port, env=env)
+            try:
+                results, breaker = asyncio.run(run_scenario(f'http://127.0.0.1:{port}',
+                                                            f'http://127.0.0.1:{stub_port}', args))
+            finally:
+                harness.stop_process(gateway)
+        finally:
+            harness.stop_process(stub)
+        for result in results:
+            result['config'] = name
+            rows.append(result)
+        print(f"{name}: breaker catalog = {json.dumps(breaker)}")
+
+    print(f"\nGET /catalog/catalog/cars/<id>, concurrency={args.concurrency}, "
+          f"read timeout={args.read_timeout}s, pha {args.phase_duration}s")
+    harness.print_table(rows, ['config', 'phase', 'requests', 'errors', 'fast_fail', 'rps',
+                               'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+
+if __name__ == '__main__':
+    sys.exit(main())
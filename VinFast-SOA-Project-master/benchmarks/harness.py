@@ -0,0 +1,86 @@
+# benchmarks/harness.py
+"""Các hàm dùng chung cho script benchmark: khởi động tiến trình, đo và in kết quả."""
+
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def service_dir(name):
+    """Đường dẫn tới thư mục của một service, ví dụ service_dir('api-gateway')."""
+    return os.path.join(PROJECT_ROOT, name)
+
+def free_port():
+    """Xin hệ điều hành một cổng TCP còn trống."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+    """Chờ tới khi có tiến trình lắng nghe trên cổng `port`."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Không có tiến trình nào lắng nghe trên cổng {port} sau {timeout}s")
+
+def start_process(args, cwd, port, env=None, quiet=True):
+    """Chạy một tiến trình (thường là một service) và chờ nó sẵn sàng trên `port`."""
+    full_env = dict(os.environ)
+    full_env.update(env or {})
+    output = subprocess.DEVNULL if quiet else None
+    proc = subprocess.Popen([sys.executable] + list(args), cwd=cwd, env=full_env,
+                            stdout=output, stderr=output, start_new_session=True)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        stop_process(proc)
+        raise
+    return proc
+
+def stop_process(proc):
+    """Dừng tiến trình và các tiến trình con của nó (ví dụ reloader của Flask)."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+def percentile(values, p):
+    """Percentile theo phương pháp nearest-rank (values không cần sắp xếp trước)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(latencies, elapsed, errors=0):
+    """Tóm tắt một lượt đo: thông lượng và độ trễ p50/p95/p99 (ms)."""
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0
+    }
+
+def print_table(rows, columns):
+    """In danh sách dict dưới dạng bảng văn bản đơn giản."""
+    widths = {c: max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    print('  '.join('-' * widths[c] for c in columns))
+    for row in rows:
+        print('  '.join(str(row.get(c, '')).ljust(widths[c]) for c in columns))
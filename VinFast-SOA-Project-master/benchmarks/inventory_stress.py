@@ -0,0 +1,141 @@
+# benchmarks/inventory_stress.py
+"""Stress test chống bán vượt tồn kho của catalog-service.
+
+Khởi động catalog-service trên một DB SQLite tạm, nạp `--stock` xe (mặc định bằng số
+request, chia đều các chi nhánh) cho một mẫu xe để phần lớn request thực sự tranh nhau trừ
+kho trước khi hết hàng, rồi `--workers` luồng liên tục gọi trừ kho / giữ chỗ / hủy giữ
+chỗ. Cuối cùng đối chiếu: tồn kho không âm, (tồn ban đầu - tồn cuối) == số xe đã trừ
+hoặc đang giữ chỗ theo phản hồi API, và == tổng số lượng các phiếu held/committed trong
+DB (số phiếu cũng phải bằng số lượt gọi thành công). Thoát với mã 1 nếu lệch.
+
+Chạy: python benchmarks/inventory_stress.py --workers 64 --requests 4000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+
+def call(base_url, method, path, payload=None):
+    """Gọi API catalog, trả về (status, body JSON)."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(f"{base_url}{path}", data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+
+def seed_stock(db_path, car_id, stock):
+    """Đặt tổng tồn kho của mẫu xe thành `stock`, chia đều cho các chi nhánh đang có."""
+    with sqlite3.connect(db_path) as conn:
+        rows = [r[0] for r in conn.execute("SELECT id FROM inventory WHERE car_model_id = ? ORDER BY id", (car_id,))]
+        if not rows:
+            raise RuntimeError(f"Mẫu xe #{car_id} không có dòng tồn kho")
+        for index, inventory_id in enumerate(rows):
+            share = stock // len(rows) + (1 if index < stock % len(rows) else 0)
+            conn.execute("UPDATE inventory SET stock_quantity = ? WHERE id = ?", (share, inventory_id))
+
+def reservation_totals(db_path, car_id):
+    """(số phiếu, tổng số lượng) các phiếu đang giữ hoặc đã trừ kho của mẫu xe."""
+    with sqlite3.connect(db_path) as conn:
+        count, quantity = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM reservations "
+            "WHERE car_model_id = ? AND status IN ('held', 'committed')", (car_id,)).fetchone()
+    return count, quantity
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--car-id', type=int, default=1)
+    parser.add_argument('--stock', type=int, help='Tồn kho nạp trước khi chạy (mặc định bằng --requests)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='inventory-stress-')
+    db_path = os.path.join(workdir, 'catalog.db')
+    port = harness.free_port()
+    catalog = harness.start_process(['app.py'], cwd=harness.service_dir('catalog-service'), port=port, env={
+        'DATABASE_URL': f"sqlite:///{db_path}",
+        'CATALOG_PORT': str(port)
+    })
+    base_url = f"http://127.0.0.1:{port}/api/v1"
+    # reduced/held/released: số xe; successes: số lượt trừ kho/giữ chỗ thành công còn hiệu lực
+    counters = {'reduced': 0, 'held': 0, 'released': 0, 'successes': 0,
+                'rejected': 0, 'busy': 0, 'errors': 0}
+    lock = threading.Lock()
+    latencies = []
+
+    def worker(_):
+        action = random.choice(['reduce', 'reserve', 'reserve_release'])
+        quantity = random.randint(1, 3)
+        start = time.perf_counter()
+        if action == 'reduce':
+            status, _ = call(base_url, 'POST', '/inventory/reduce', {'car_id': args.car_id, 'quantity': quantity})
+            key = 'reduced' if status == 200 else None
+        else:
+            status, body = call(base_url, 'POST', '/inventory/reservations',
+                                {'car_id': args.car_id, 'quantity': quantity})
+            key = 'held' if status == 201 else None
+            if status == 201 and action == 'reserve_release':
+                release_status, _ = call(base_url, 'POST', f"/inventory/reservations/{body['reservation_id']}/release")
+                key = 'released' if release_status == 200 else 'held'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if key:
+                counters[key] += quantity
+                if key != 'released':
+                    counters['successes'] += 1
+            elif status == 400:
+                counters['rejected'] += 1
+            elif status == 503:
+                counters['busy'] += 1
+            else:
+                counters['errors'] += 1
+
+    try:
+        seed_stock(db_path, args.car_id, args.stock if args.stock is not None else args.requests)
+        _, car = call(base_url, 'GET', f'/catalog/cars/{args.car_id}')
+        initial_stock = car['stock_quantity']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(worker, range(args.requests)))
+        elapsed = time.perf_counter() - started
+        _, car = call(base_url, 'GET', f'/catalog/cars/{args.car_id}')
+        final_stock = car['stock_quantity']
+    finally:
+        harness.stop_process(catalog)
+    reservations, reserved_quantity = reservation_totals(db_path, args.car_id)
+
+    taken = counters['reduced'] + counters['held']
+    summary = harness.summarize(latencies, elapsed)
+    print(f"Tồn kho ban đầu: {initial_stock}, tồn kho cuối: {final_stock}")
+    print(f"Đã trừ: {counters['reduced']}, đang giữ chỗ: {counters['held']}, đã hủy: {counters['released']}")
+    print(f"Bị từ chối (hết hàng): {counters['rejected']}, DB bận: {counters['busy']}, lỗi khác: {counters['errors']}")
+    print(f"Phiếu held/committed trong DB: {reservations} phiếu, {reserved_quantity} xe "
+          f"(lượt gọi thành công: {counters['successes']})")
+    print(f"Thông lượng: {summary['rps']} req/s, p50={summary['p50_ms']}ms, p99={summary['p99_ms']}ms")
+
+    if final_stock < 0 or initial_stock - final_stock != taken:
+        print("❌ PHÁT HIỆN BÁN VƯỢT TỒN KHO")
+        return 1
+    if reserved_quantity != taken or reservations != counters['successes']:
+        print("❌ Số phiếu giữ chỗ trong DB lệch với số lượt giữ chỗ/trừ kho thành công")
+        return 1
+    print("✅ Không có bán vượt tồn kho")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
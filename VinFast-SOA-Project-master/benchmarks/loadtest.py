@@ -0,0 +1,407 @@
+# benchmarks/loadtest.py
+"""Tải tổng hợp toàn hệ thống qua Gateway, so sánh với baseline để phát hiện hồi quy.
+
+Khởi động User, Catalog, Order, Chat và Gateway (mỗi service một DB SQLite tạm, tồn kho
+được nâng lên `--stock` để đặt hàng không hết xe), đăng ký `--users` tài khoản rồi chạy
+`--concurrency` người dùng ảo liên tục trong `--duration` giây (sau `--warmup` giây khởi động
+không tính). Mỗi lượt, người dùng ảo chọn một kịch bản theo trọng số `--mix`:
+  browse    GET danh sách xe, rồi xem chi tiết 2 xe
+  login     đăng nhập lại (băm mật khẩu)
+  purchase  tạo đơn (giữ chỗ bên Catalog), thanh toán, xem đơn của mình
+  admin     xác nhận lịch một đơn đã thanh toán (gửi thông báo chat), thống kê, xem mọi đơn
+  chat      gửi tin qua Socket.IO của Gateway (message bus -> Chat Service lưu -> phát lại phòng),
+            đo từ lúc gửi tới lúc nhận lại tin của chính mình; rồi xem lịch sử chat của phòng
+Kết quả theo từng route (mẫu đường dẫn): số request, lỗi (mã HTTP khác mong đợi, lỗi
+kết nối, tin chat không nhận lại được trong `--chat-timeout` giây), thông lượng, p50/p95/p99/max.
+Kịch bản chat cần message bus dùng chung giữa Gateway và Chat Service: `--bus-url`
+(mặc định Redis local, ví dụ `docker run -p 6379:6379 redis:7-alpine`).
+
+`--save FILE` lưu kết quả làm baseline; `--baseline FILE` so sánh: route có p95/p99 tăng quá
+`--tolerance` (và quá `--min-delta-ms`), thông lượng giảm quá `--tolerance` hoặc tỉ lệ lỗi
+tăng bị đánh dấu REGRESSION và script thoát với mã 1 (dùng được trong CI).
+`--server gunicorn` chạy các service qua common/serve.py như trong Docker (`--workers` worker).
+
+Chạy: python benchmarks/loadtest.py --concurrency 50 --duration 60 --save baseline.json
+      python benchmarks/loadtest.py --concurrency 50 --duration 60 --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import socketio
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+import harness
+
+DEFAULT_MIX = 'browse=50,login=10,purchase=25,admin=10,chat=5'
+
+# (tên, thư mục, biến cổng, hàm khởi tạo DB cho common/serve.py, dùng Socket.IO)
+SERVICES = [
+    ('users', 'user-service', 'USER_PORT', 'initialize_db', False),
+    ('catalog', 'catalog-service', 'CATALOG_PORT', 'initialize_db', False),
+    ('orders', 'order-service', 'ORDER_PORT', 'initialize_db', False),
+    ('chat', 'chat-service', 'CHAT_PORT', 'initialize_db', True),
+    ('gateway', 'api-gateway', 'GATEWAY_PORT', None, True)
+]
+
+ADMIN = {'email': 'admin@vinfast.com', 'password': 'admin123'}
+
+# Mỗi người dùng ảo chat trong phòng riêng (id lớn, không trùng đơn hàng thật)
+CHAT_ROOM_BASE = 900000
+CHAT_ROUTE = 'WS send_message -> receive_message'
+
+# Bước chuẩn bị: số request đăng ký/đăng nhập song song và số lần thử lại khi User Service bận
+SETUP_CONCURRENCY = 4
+SETUP_BUSY_RETRIES = 30
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in VirtualUser.SCENARIOS:
+            raise SystemExit(f"Kịch bản không hợp lệ: {name} (có: {', '.join(VirtualUser.SCENARIOS)})")
+        mix[name] = float(weight)
+    return mix
+
+def start_services(args):
+    """Chạy các service trên cổng trống, trả về (danh sách tiến trình, URL Gateway)."""
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    ports = {name: harness.free_port() for name, *_ in SERVICES}
+    env = {port_var: str(ports[name]) for name, _, port_var, _, _ in SERVICES}
+    env.update({
+        'USER_SERVICE_URL': f"http://127.0.0.1:{ports['users']}/api/v1",
+        'CATALOG_SERVICE_URL': f"http://127.0.0.1:{ports['catalog']}/api/v1",
+        'ORDER_SERVICE_URL': f"http://127.0.0.1:{ports['orders']}/api/v1",
+        'CHAT_SERVICE_URL': f"http://127.0.0.1:{ports['chat']}/api/v1",
+        'MESSAGE_BUS_URL': args.bus_url
+    })
+    processes = []
+    try:
+        for name, directory, _, init, socketio in SERVICES:
+            service_env = dict(env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, name + '.db')}")
+            if args.server == 'gunicorn':
+                command = ['-m', 'common.serve', 'app:app', '--chdir', directory, '--port', str(ports[name]),
+                           '--workers', str(args.workers)]
+                command += ['--socketio'] if socketio else []
+                command += ['--init', init] if init else []
+                processes.append(harness.start_process(command, cwd=harness.PROJECT_ROOT, port=ports[name],
+                                                       env=service_env))
+            else:
+                processes.append(harness.start_process(['app.py'], cwd=harness.service_dir(directory),
+                                                       port=ports[name], env=service_env))
+            if name == 'catalog':
+                # Đủ xe cho mọi đơn trong lượt đo (lỗi hết hàng sẽ bị tính là lỗi)
+                with sqlite3.connect(os.path.join(workdir, 'catalog.db'), timeout=30) as conn:
+                    conn.execute('UPDATE inventory SET stock_quantity = ?', (args.stock,))
+    except Exception:
+        for proc in processes:
+            harness.stop_process(proc)
+        raise
+    return processes, f"http://127.0.0.1:{ports['gateway']}"
+
+class Recorder:
+    """Gom độ trễ/lỗi theo route; chỉ ghi khi đang trong thời gian đo (sau warmup)."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.recording = False
+
+    def add(self, route, elapsed, ok):
+        if not self.recording:
+            return
+        if ok:
+            self.latencies.setdefault(route, []).append(elapsed)
+        else:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def rows(self, elapsed):
+        rows = []
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            row = harness.summarize(self.latencies.get(route, []), elapsed, self.errors.get(route, 0))
+            row['route'] = route
+            rows.append(row)
+        everything = [v for values in self.latencies.values() for v in values]
+        total = harness.summarize(everything, elapsed, sum(self.errors.values()))
+        total['route'] = 'TOTAL'
+        rows.append(total)
+        return rows
+
+class Client:
+    """Gọi Gateway và ghi kết quả vào Recorder theo tên route."""
+
+    def __init__(self, session, base_url, recorder):
+        self.session = session
+        self.base_url = base_url
+        self.recorder = recorder
+
+    async def call(self, method, path, route, expect=200, token=None, payload=None, busy_retries=0):
+        """Trả về body JSON nếu mã HTTP đúng `expect`, ngược lại None (đã tính là lỗi).
+
+        `busy_retries`: số lần thử lại khi service báo bận (503 kèm Retry-After), dùng cho bước chuẩn bị.
+        """
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        for attempt in range(busy_retries + 1):
+            start = time.perf_counter()
+            try:
+                async with self.session.request(method, self.base_url + path, json=payload,
+                                                headers=headers) as response:
+                    body = await response.read()
+                    status, retry_after = response.status, response.headers.get('Retry-After')
+            except Exception:
+                self.recorder.add(route, time.perf_counter() - start, False)
+                return None
+            if status != 503 or retry_after is None or attempt == busy_retries:
+                break
+            await asyncio.sleep(float(retry_after))
+        ok = status == expect
+        self.recorder.add(route, time.perf_counter() - start, ok)
+        return json.loads(body) if ok and body else None
+
+class VirtualUser:
+    """Một người dùng ảo: tài khoản riêng, chọn kịch bản theo trọng số, lặp tới khi hết giờ."""
+
+    SCENARIOS = ('browse', 'login', 'purchase', 'admin', 'chat')
+
+    def __init__(self, index, client, account, shared, rng):
+        self.client = client
+        self.account = account
+        self.shared = shared
+        self.rng = rng
+        self.order_ids = []
+        self.room = CHAT_ROOM_BASE + index
+        self.socket = None
+        self.pending = {}   # nội dung tin -> future chờ nhận lại
+        self.sent = 0
+
+    async def connect_chat(self):
+        """Nối Socket.IO vào Gateway và vào phòng chat riêng (bước chuẩn bị, không tính vào kết quả)."""
+        socket = socketio.AsyncClient(reconnection=False)
+
+        @socket.on('receive_message')
+        def on_message(data):
+            future = self.pending.pop(data.get('content'), None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+
+        try:
+            await socket.connect(self.client.base_url, transports=['websocket'])
+            await socket.emit('join', {'order_id': self.room})
+        except Exception:
+            return False
+        self.socket = socket
+        return True
+
+    async def browse(self):
+        await self.client.call('GET', '/catalog/catalog/cars?limit=20', 'GET /catalog/cars')
+        for _ in range(2):
+            await self.client.call('GET', f"/catalog/catalog/cars/{self.rng.choice(self.shared['car_ids'])}",
+                                   'GET /catalog/cars/{id}')
+
+    async def login(self):
+        data = await self.client.call('POST', '/users/users/login', 'POST /users/login',
+                                      payload={'email': self.account['email'], 'password': self.account['password']})
+        if data:
+            self.account['token'] = data['access_token']
+
+    async def purchase(self):
+        token = self.account['token']
+        order = await self.client.call('POST', '/orders/orders', 'POST /orders', 201, token,
+                                       {'items': [{'car_id': self.rng.choice(self.shared['car_ids']), 'quantity': 1}]})
+        if order:
+            self.order_ids.append(order['id'])
+            paid = await self.client.call('PUT', f"/orders/orders/{order['id']}/pay", 'PUT /orders/{id}/pay',
+                                          token=token)
+            if paid:
+                self.shared['paid'].append(order['id'])
+        await self.client.call('GET', '/orders/orders?limit=20', 'GET /orders', token=token)
+
+    async def admin(self):
+        token = self.shared['admin_token']
+        if self.shared['paid']:
+            order_id = self.shared['paid'].pop(0)
+            await self.client.call('PUT', f"/orders/orders/{order_id}/confirm", 'PUT /orders/{id}/confirm',
+                                   token=token)
+        await self.client.call('GET', '/orders/orders/stats', 'GET /orders/stats', token=token)
+        await self.client.call('GET', '/orders/orders?limit=100', 'GET /orders (admin)', token=token)
+
+    async def chat(self):
+        if self.socket is not None:
+            self.sent += 1
+            content = f"vu{self.room}-{self.sent}"
+            future = asyncio.get_running_loop().create_future()
+            self.pending[content] = future
+            start = time.perf_counter()
+            try:
+                await self.socket.emit('send_message', {'order_id': self.room, 'role': 'customer',
+                                                        'name': self.account['name'], 'content': content})
+                received_at = await asyncio.wait_for(future, self.shared['chat_timeout'])
+                self.client.recorder.add(CHAT_ROUTE, received_at - start, True)
+            except Exception:
+                self.pending.pop(content, None)
+                self.client.recorder.add(CHAT_ROUTE, time.perf_counter() - start, False)
+        else:
+            self.client.recorder.add(CHAT_ROUTE, 0, False)
+        await self.client.call('GET', f"/chat/chat/{self.room}?limit=50", 'GET /chat/{order_id}',
+                               token=self.account['token'])
+
+    async def run(self, mix, stop_at, think):
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < stop_at:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+            if think:
+                await asyncio.sleep(self.rng.uniform(0, 2 * think))
+
+async def prepare(client, args):
+    """Đăng ký/đăng nhập các tài khoản, lấy token Admin và danh sách id xe (không tính vào kết quả).
+
+    Đăng ký/đăng nhập đều băm mật khẩu: hàng đợi băm của User Service nhỏ (8 việc mỗi lõi)
+    nên gửi ít request song song và thử lại khi bị báo bận (503 + Retry-After).
+    """
+    semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+    async def account(n):
+        data = {'name': f'Khách tải {n}', 'email': f'loadtest{n}@vinfast.vn', 'password': f'matkhau{n}'}
+        async with semaphore:
+            await client.call('POST', '/users/users/register', 'setup', 201, payload=data,
+                              busy_retries=SETUP_BUSY_RETRIES)
+            login = await client.call('POST', '/users/users/login', 'setup', payload=data,
+                                      busy_retries=SETUP_BUSY_RETRIES)
+        if login is None:
+            raise RuntimeError(f"Không đăng nhập được tài khoản {data['email']}")
+        return dict(data, token=login['access_token'])
+
+    accounts = await asyncio.gather(*(account(n) for n in range(args.users)))
+    admin = await client.call('POST', '/users/users/login', 'setup', payload=ADMIN, busy_retries=SETUP_BUSY_RETRIES)
+    cars = await client.call('GET', '/catalog/catalog/cars?fields=id', 'setup')
+    if admin is None or not cars:
+        raise RuntimeError("Không lấy được token Admin hoặc danh sách xe")
+    shared = {'admin_token': admin['access_token'], 'car_ids': [car['id'] for car in cars], 'paid': [],
+              'chat_timeout': args.chat_timeout}
+    return accounts, shared
+
+async def run_load(base_url, mix, args):
+    recorder = Recorder()
+    timeout = ClientTimeout(total=60)
+    async with ClientSession(connector=TCPConnector(limit=args.concurrency), timeout=timeout) as session:
+        client = Client(session, base_url, recorder)
+        accounts, shared = await prepare(client, args)
+        users = [VirtualUser(i, client, accounts[i % len(accounts)], shared, random.Random(args.seed + i))
+                 for i in range(args.concurrency)]
+        if mix.get('chat'):
+            semaphore = asyncio.Semaphore(50)
+
+            async def connect(user):
+                async with semaphore:
+                    return await user.connect_chat()
+
+            connected = await asyncio.gather(*(connect(user) for user in users))
+            if not all(connected):
+                print(f"⚠️ {connected.count(False)} người dùng ảo không nối được Socket.IO (tin chat tính là lỗi)")
+            # Chờ Gateway subscribe xong kênh bus của các phòng
+            await asyncio.sleep(1)
+        stop_at = time.perf_counter() + args.warmup + args.duration
+
+        async def start_recording():
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+            return time.perf_counter()
+
+        results = await asyncio.gather(start_recording(),
+                                       *(user.run(mix, stop_at, args.think_ms / 1000) for user in users))
+        elapsed = time.perf_counter() - results[0]
+        await asyncio.gather(*(user.socket.disconnect() for user in users if user.socket is not None),
+                             return_exceptions=True)
+    return recorder.rows(elapsed)
+
+def compare(rows, baseline, args):
+    """Thêm cột so sánh với baseline vào từng dòng, trả về danh sách route bị hồi quy."""
+    previous = {row['route']: row for row in baseline['routes']}
+    regressions = []
+    for row in rows:
+        old = previous.get(row['route'])
+        if old is None:
+            row['vs_baseline'] = 'mới'
+            continue
+        reasons = []
+        for key in ('p95_ms', 'p99_ms'):
+            if row[key] > old[key] * (1 + args.tolerance) and row[key] - old[key] > args.min_delta_ms:
+                reasons.append(f"{key} {old[key]}->{row[key]}")
+        if old['rps'] and row['rps'] < old['rps'] * (1 - args.tolerance):
+            reasons.append(f"rps {old['rps']}->{row['rps']}")
+        error_rate = row['errors'] / row['requests'] if row['requests'] else 0
+        old_error_rate = old['errors'] / old['requests'] if old['requests'] else 0
+        if error_rate > old_error_rate + 0.01:
+            reasons.append(f"lỗi {old_error_rate:.1%}->{error_rate:.1%}")
+        if reasons:
+            regressions.append(row['route'])
+            row['vs_baseline'] = 'REGRESSION: ' + ', '.join(reasons)
+        else:
+            p95_change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+            row['vs_baseline'] = f"ok (p95 {p95_change:+.0%})"
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50, help='Số người dùng ảo chạy song song')
+    parser.add_argument('--duration', type=float, default=60, help='Số giây đo')
+    parser.add_argument('--warmup', type=float, default=5, help='Số giây chạy trước khi bắt đầu đo')
+    parser.add_argument('--users', type=int, default=20, help='Số tài khoản khách hàng đăng ký trước')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Trọng số kịch bản, ví dụ browse=80,purchase=20')
+    parser.add_argument('--think-ms', type=float, default=0, help='Thời gian nghỉ trung bình giữa các kịch bản')
+    parser.add_argument('--stock', type=int, default=1000000, help='Tồn kho mỗi xe/chi nhánh trước khi đo')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--bus-url', default='redis://127.0.0.1:6379/0', help='MESSAGE_BUS_URL cho Gateway và Chat')
+    parser.add_argument('--chat-timeout', type=float, default=10, help='Giây chờ nhận lại tin chat đã gửi')
+    parser.add_argument('--server', choices=('dev', 'gunicorn'), default='dev')
+    parser.add_argument('--workers', type=int, default=2, help='Số worker mỗi service khi --server gunicorn')
+    parser.add_argument('--save', help='Lưu kết quả (JSON) để làm baseline')
+    parser.add_argument('--baseline', help='File kết quả của lần chạy trước để so sánh')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Mức chênh cho phép so với baseline (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2, help='Bỏ qua chênh lệch độ trễ nhỏ hơn mức này')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    if mix.get('chat') and args.bus_url.startswith('memory://'):
+        parser.error('Gateway và Chat Service chạy ở hai tiến trình: kịch bản chat cần --bus-url redis://...')
+
+    processes, base_url = start_services(args)
+    try:
+        rows = asyncio.run(run_load(base_url, mix, args))
+    finally:
+        for proc in reversed(processes):
+            harness.stop_process(proc)
+
+    config = {'concurrency': args.concurrency, 'duration': args.duration, 'mix': mix,
+              'think_ms': args.think_ms, 'server': args.server,
+              'workers': args.workers if args.server == 'gunicorn' else 1}
+    columns = ['route', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"⚠️ Cấu hình khác baseline: {json.dumps(baseline.get('config'), ensure_ascii=False)}")
+        regressions = compare(rows, baseline, args)
+        columns.append('vs_baseline')
+
+    print(f"\nconcurrency={args.concurrency}, {args.duration}s, server={args.server}, mix={args.mix}")
+    harness.print_table(rows, columns)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'routes': [{c: row[c] for c in columns[:8]} for row in rows]},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\nĐã lưu kết quả vào {args.save}")
+    if regressions:
+        print(f"\n❌ Hồi quy so với baseline: {', '.join(regressions)}")
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
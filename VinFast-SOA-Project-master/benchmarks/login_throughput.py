@@ -0,0 +1,94 @@
+# benchmarks/login_throughput.py
+"""Đo thông lượng đăng nhập của user-service (login/giây và login/giây/lõi CPU).
+
+Với mỗi giá trị PASSWORD_WORKERS trong `--workers` (0 = băm ngay trong luồng
+request như cách cũ), script khởi động user-service trên DB SQLite tạm, đăng ký
+`--users` tài khoản rồi bắn `--requests` lần đăng nhập với `--concurrency` luồng.
+Phản hồi 503 (hàng đợi băm đầy) được đếm riêng.
+
+Chạy: python benchmarks/login_throughput.py --workers 0,2,4 --requests 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+
+def post(base_url, path, payload):
+    request = urllib.request.Request(f"{base_url}{path}", data=json.dumps(payload).encode(), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def run(workers, args):
+    workdir = tempfile.mkdtemp(prefix='login-bench-')
+    port = harness.free_port()
+    service = harness.start_process(['app.py'], cwd=harness.service_dir('user-service'), port=port, env={
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'users.db')}",
+        'USER_PORT': str(port),
+        'PASSWORD_WORKERS': str(workers),
+        'PASSWORD_HASH_ROUNDS': str(args.rounds)
+    })
+    base_url = f"http://127.0.0.1:{port}/api/v1/users"
+    latencies, counters, lock = [], {'busy': 0, 'errors': 0}, threading.Lock()
+
+    def login(i):
+        n = i % args.users
+        start = time.perf_counter()
+        status = post(base_url, '/login', {'email': f'bench{n}@vinfast.vn', 'password': f'matkhau{n}'})
+        elapsed = time.perf_counter() - start
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            elif status == 503:
+                counters['busy'] += 1
+            else:
+                counters['errors'] += 1
+
+    try:
+        for n in range(args.users):
+            post(base_url, '/register', {'name': f'Bench {n}', 'email': f'bench{n}@vinfast.vn',
+                                         'password': f'matkhau{n}'})
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(login, range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        harness.stop_process(service)
+
+    summary = harness.summarize(latencies, elapsed, counters['busy'] + counters['errors'])
+    # Băm trong luồng request bị GIL giới hạn ở một lõi
+    cores = min(workers, os.cpu_count() or 1) if workers > 0 else 1
+    return {
+        'workers': workers, 'cores': cores, 'logins_s': summary['rps'],
+        'logins_s_core': round(summary['rps'] / cores, 1),
+        'p50_ms': summary['p50_ms'], 'p99_ms': summary['p99_ms'],
+        'busy_503': counters['busy'], 'errors': counters['errors']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='0,2,4', help='Các giá trị PASSWORD_WORKERS cần đo')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=29000, help='PASSWORD_HASH_ROUNDS')
+    args = parser.parse_args()
+
+    rows = [run(int(w), args) for w in args.workers.split(',')]
+    harness.print_table(rows, ['workers', 'cores', 'logins_s', 'logins_s_core',
+                               'p50_ms', 'p99_ms', 'busy_503', 'errors'])
+
+if __name__ == '__main__':
+    sys.exit(main())
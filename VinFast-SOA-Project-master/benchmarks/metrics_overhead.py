@@ -0,0 +1,70 @@
+# benchmarks/metrics_overhead.py
+"""Đo chi phí của common/metrics.py: METRICS_ENABLED=0 so với bật.
+
+Mỗi chế độ chạy trong một tiến trình riêng (cờ bật/tắt đọc lúc import) với catalog-service
+trên DB SQLite mới, gọi qua test client của Flask (không qua mạng) `--requests` lần xen kẽ
+GET /api/v1/catalog/cars/<id> và GET /api/v1/catalog/cars. Khi bật, kiểm tra thêm header
+Server-Timing và kích thước trang /metrics.
+
+Chạy: python benchmarks/metrics_overhead.py --requests 5000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='metrics-overhead-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'catalog.db')}"
+    os.environ['METRICS_ENABLED'] = '1' if mode == 'on' else '0'
+    sys.path.insert(0, harness.service_dir('catalog-service'))
+    import app as catalog_app
+
+    with catalog_app.app.app_context():
+        catalog_app.initialize_db()
+    client = catalog_app.app.test_client()
+    paths = ['/api/v1/catalog/cars/1', '/api/v1/catalog/cars']
+
+    latencies = []
+    started = time.perf_counter()
+    for n in range(args.requests):
+        start = time.perf_counter()
+        response = client.get(paths[n % len(paths)])
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    metrics_page = client.get('/metrics')
+    summary = harness.summarize(latencies, elapsed)
+    print(json.dumps({
+        'mode': mode, 'rps': summary['rps'], 'p50_ms': summary['p50_ms'], 'p99_ms': summary['p99_ms'],
+        'server_timing': response.headers.get('Server-Timing', '-'),
+        'metrics_bytes': len(metrics_page.data) if metrics_page.status_code == 200 else 0
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--modes', default='off,on')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args)
+        return
+
+    rows = []
+    for mode in args.modes.split(','):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                 '--requests', str(args.requests)],
+                                check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+    harness.print_table(rows, ['mode', 'rps', 'p50_ms', 'p99_ms', 'metrics_bytes', 'server_timing'])
+
+if __name__ == '__main__':
+    sys.exit(main())
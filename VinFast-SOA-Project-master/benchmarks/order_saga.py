@@ -0,0 +1,162 @@
+# benchmarks/order_saga.py
+"""Kiểm tra Saga đặt hàng/thanh toán giữa order-service và catalog-service.
+
+Khởi động Catalog, Order (DB SQLite tạm, giữ xe `--hold-seconds` giây) và Gateway, rồi kiểm tra:
+  - thanh toán hai lần cùng một đơn: cả hai 200, kho chỉ bị trừ một lần;
+  - thanh toán đơn đã hết hạn giữ xe: 409 (đơn chuyển Cancelled), thanh toán lại vẫn 409
+    và đơn không bao giờ thành Paid khi không còn xe được giữ;
+  - đơn bỏ dở được hoàn kho nhờ luồng quét nền của Catalog, không cần request giữ chỗ mới;
+  - giỏ hàng sai kiểu (car_id lẫn chuỗi/số, số lượng âm) bị từ chối 400, không phải 500;
+  - cache chi tiết xe ở Gateway bị xóa sau khi tạo đơn qua Gateway (tồn kho mới được trả về).
+Thoát với mã 1 nếu có kiểm tra thất bại.
+
+Chạy: python benchmarks/order_saga.py
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import harness
+
+USER_HEADERS = {'X-User-Id': '1', 'X-User-Role': 'customer'}
+
+def call(url, method, payload=None, headers=None, with_headers=False):
+    """Gọi API, trả về (status, body JSON) hoặc (status, body JSON, header) nếu `with_headers`."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            result = response.status, json.loads(response.read() or b'null'), response.headers
+    except urllib.error.HTTPError as e:
+        result = e.code, json.loads(e.read() or b'null'), e.headers
+    return result if with_headers else result[:2]
+
+class Checks:
+    def __init__(self):
+        self.failed = []
+
+    def expect(self, name, actual, expected):
+        ok = actual == expected
+        print(f"{'✅' if ok else '❌'} {name}: {actual}" + ('' if ok else f" (mong đợi {expected})"))
+        if not ok:
+            self.failed.append(name)
+
+def start_services(args):
+    workdir = tempfile.mkdtemp(prefix='order-saga-')
+    catalog_port, order_port, gateway_port = harness.free_port(), harness.free_port(), harness.free_port()
+    catalog = harness.start_process(['app.py'], cwd=harness.service_dir('catalog-service'), port=catalog_port, env={
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'catalog.db')}",
+        'CATALOG_PORT': str(catalog_port),
+        'RESERVATION_SWEEP_SECONDS': str(args.sweep_seconds)
+    })
+    processes = [catalog]
+    env = {
+        'ORDER_HOLD_SECONDS': str(args.hold_seconds),
+        'CATALOG_SERVICE_URL': f'http://127.0.0.1:{catalog_port}/api/v1',
+        'ORDER_SERVICE_URL': f'http://127.0.0.1:{order_port}/api/v1',
+        'CHAT_SERVICE_URL': 'http://127.0.0.1:9/api/v1'
+    }
+    try:
+        processes.append(harness.start_process(['app.py'], cwd=harness.service_dir('order-service'), port=order_port,
+                                               env=dict(env, ORDER_PORT=str(order_port), DATABASE_URL=
+                                                        f"sqlite:///{os.path.join(workdir, 'orders.db')}")))
+        processes.append(harness.start_process(['app.py'], cwd=harness.service_dir('api-gateway'), port=gateway_port,
+                                               env=dict(env, GATEWAY_PORT=str(gateway_port))))
+    except Exception:
+        for proc in processes:
+            harness.stop_process(proc)
+        raise
+    urls = {'catalog': env['CATALOG_SERVICE_URL'], 'orders': env['ORDER_SERVICE_URL'],
+            'gateway': f'http://127.0.0.1:{gateway_port}'}
+    return processes, urls
+
+def run_checks(catalog_url, order_url, args, checks):
+    def stock():
+        return call(f"{catalog_url}/catalog/cars/{args.car_id}", 'GET')[1]['stock_quantity']
+
+    initial_stock = stock()
+    def create_order():
+        status, order = call(f"{order_url}/orders", 'POST',
+                             {'items': [{'car_id': args.car_id, 'quantity': 1}]}, USER_HEADERS)
+        if status != 201:
+            raise RuntimeError(f"Không tạo được đơn hàng: {status} {order}")
+        return order['id']
+
+    def pay(order_id):
+        return call(f"{order_url}/orders/{order_id}/pay", 'PUT', headers=USER_HEADERS)[0]
+
+    # Giỏ hàng sai kiểu: kiểm tra trước khi sắp xếp/trừ kho
+    for name, items in (('car_id lẫn chuỗi và số', [{'car_id': args.car_id}, {'car_id': str(args.car_id + 1)}]),
+                        ('số lượng âm', [{'car_id': args.car_id, 'quantity': -1}])):
+        status, _ = call(f"{catalog_url}/inventory/reservations/batch", 'POST', {'items': items})
+        checks.expect(f'giữ chỗ giỏ hàng sai ({name})', status, 400)
+
+    # Thanh toán lặp lại
+    paid = create_order()
+    checks.expect('thanh toán lần 1', pay(paid), 200)
+    checks.expect('thanh toán lần 2 (lặp lại)', pay(paid), 200)
+
+    # Thanh toán sau khi hết hạn giữ xe; một đơn khác bị bỏ dở (không bao giờ thanh toán)
+    expired = create_order()
+    create_order()
+    time.sleep(args.hold_seconds + 1)
+    checks.expect('thanh toán đơn hết hạn giữ xe', pay(expired), 409)
+    checks.expect('thanh toán lại đơn đã hủy', pay(expired), 409)
+    statuses = {o['id']: o['status'] for o in call(f"{order_url}/orders", 'GET', headers=USER_HEADERS)[1]}
+    checks.expect('trạng thái đơn đã thanh toán', statuses.get(paid), 'Paid')
+    checks.expect('trạng thái đơn hết hạn', statuses.get(expired), 'Cancelled')
+
+    # Chỉ còn GET (không giữ chỗ/xác nhận/hủy): luồng quét nền phải hoàn kho của đơn bỏ dở
+    time.sleep(args.sweep_seconds + 1)
+    checks.expect('kho chỉ bị trừ bởi đơn đã thanh toán', initial_stock - stock(), 1)
+
+def check_gateway_cache(gateway_url, args, checks):
+    """Chi tiết xe được cache ở Gateway; tạo đơn qua Gateway phải xóa cache đó."""
+    import jwt
+    token = jwt.encode({'user_id': 1, 'role': 'customer',
+                        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+                       'vinfast_secret_key_mac_dinh_123', algorithm='HS256')
+    car_url = f"{gateway_url}/catalog/catalog/cars/{args.car_id}"
+
+    call(car_url, 'GET')
+    _, car, headers = call(car_url, 'GET', with_headers=True)
+    checks.expect('chi tiết xe lần 2 lấy từ cache Gateway', headers.get('X-Cache'), 'HIT')
+    status, _ = call(f"{gateway_url}/orders/orders", 'POST', {'items': [{'car_id': args.car_id, 'quantity': 1}]},
+                     {'Authorization': f'Bearer {token}'})
+    checks.expect('tạo đơn qua Gateway', status, 201)
+    _, after, headers = call(car_url, 'GET', with_headers=True)
+    checks.expect('chi tiết xe sau khi tạo đơn', headers.get('X-Cache'), 'MISS')
+    checks.expect('tồn kho sau khi tạo đơn', after['stock_quantity'], car['stock_quantity'] - 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hold-seconds', type=int, default=2)
+    parser.add_argument('--sweep-seconds', type=float, default=1, help='RESERVATION_SWEEP_SECONDS của Catalog')
+    parser.add_argument('--car-id', type=int, default=1)
+    args = parser.parse_args()
+
+    checks = Checks()
+    processes, urls = start_services(args)
+    try:
+        run_checks(urls['catalog'], urls['orders'], args, checks)
+        check_gateway_cache(urls['gateway'], args, checks)
+    finally:
+        for proc in reversed(processes):
+            harness.stop_process(proc)
+
+    if checks.failed:
+        print(f"❌ {len(checks.failed)} kiểm tra thất bại")
+        return 1
+    print("✅ Mọi kiểm tra đều đạt")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
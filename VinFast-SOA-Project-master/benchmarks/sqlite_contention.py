@@ -0,0 +1,130 @@
+# benchmarks/sqlite_contention.py
+"""Đo tranh chấp đọc/ghi trên SQLite: cấu hình mặc định so với common/db.py.
+
+Mỗi chế độ chạy trong một tiến trình riêng trên một file SQLite mới. `--threads`
+luồng chạy trong `--duration` giây: tỉ lệ `--write-ratio` là giao dịch ghi giống
+luồng đặt hàng/chat (đọc tồn kho, trừ kho có điều kiện, thêm tin nhắn), phần còn
+lại là truy vấn đọc (tổng tồn kho theo xe, 50 tin nhắn mới nhất của một đơn).
+Lỗi "database is locked" được đếm riêng.
+
+Chạy: python benchmarks/sqlite_contention.py --threads 16 --duration 10 --write-ratio 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import harness
+
+CARS = 50
+
+def make_engine(mode, path):
+    from sqlalchemy import create_engine
+    uri = f"sqlite:///{path}"
+    if mode == 'default':
+        return create_engine(uri)
+    sys.path.insert(0, harness.PROJECT_ROOT)
+    from common.db import engine_options, tune_sqlite_connection
+    from sqlalchemy import event
+    engine = create_engine(uri, **engine_options(uri))
+    event.listen(engine, 'connect', tune_sqlite_connection)
+    return engine
+
+def prepare(engine):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE inventory (id INTEGER PRIMARY KEY, car_id INTEGER, stock INTEGER)"))
+        conn.execute(text("CREATE INDEX ix_inventory_car ON inventory (car_id)"))
+        conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, order_id INTEGER, content TEXT)"))
+        conn.execute(text("CREATE INDEX ix_messages_order ON messages (order_id, id)"))
+        conn.execute(text("INSERT INTO inventory (car_id, stock) VALUES (:car, 1000000)"),
+                     [{'car': car} for car in range(CARS) for _ in range(2)])
+
+def run_mode(mode, args):
+    """Chạy một chế độ, in kết quả dạng JSON (được tiến trình cha đọc lại)."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    workdir = tempfile.mkdtemp(prefix='sqlite-contention-')
+    engine = make_engine(mode, os.path.join(workdir, 'bench.db'))
+    prepare(engine)
+
+    latencies = {'read': [], 'write': []}
+    counters = {'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            kind = 'write' if rng.random() < args.write_ratio else 'read'
+            car, order = rng.randrange(CARS), rng.randrange(1000)
+            start = time.perf_counter()
+            try:
+                if kind == 'write':
+                    with engine.begin() as conn:
+                        conn.execute(text("SELECT SUM(stock) FROM inventory WHERE car_id = :car"), {'car': car})
+                        conn.execute(text("UPDATE inventory SET stock = stock - 1 "
+                                          "WHERE id = (SELECT id FROM inventory WHERE car_id = :car "
+                                          "ORDER BY stock DESC LIMIT 1) AND stock > 0"), {'car': car})
+                        conn.execute(text("INSERT INTO messages (order_id, content) VALUES (:order, 'xin chào')"),
+                                     {'order': order})
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(text("SELECT car_id, SUM(stock) FROM inventory GROUP BY car_id")).all()
+                        conn.execute(text("SELECT * FROM messages WHERE order_id = :order "
+                                          "ORDER BY id DESC LIMIT 50"), {'order': order}).all()
+            except OperationalError as e:
+                with lock:
+                    counters['locked' if 'locked' in str(e) else 'errors'] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[kind].append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    reads = harness.summarize(latencies['read'], elapsed)
+    writes = harness.summarize(latencies['write'], elapsed)
+    print(json.dumps({
+        'mode': mode, 'ops_s': round(reads['rps'] + writes['rps'], 1),
+        'read_p99_ms': reads['p99_ms'], 'write_p50_ms': writes['p50_ms'], 'write_p99_ms': writes['p99_ms'],
+        'writes_s': writes['rps'], 'locked': counters['locked'], 'errors': counters['errors']
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--modes', default='default,tuned')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args)
+        return
+
+    rows = []
+    for mode in args.modes.split(','):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                 '--threads', str(args.threads), '--duration', str(args.duration),
+                                 '--write-ratio', str(args.write_ratio)],
+                                check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+    harness.print_table(rows, ['mode', 'ops_s', 'writes_s', 'write_p50_ms', 'write_p99_ms',
+                               'read_p99_ms', 'locked', 'errors'])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,175 +1,294 @@
 # catalog-service/app.py
 
-from flask import Flask, request, jsonify, Response
-from database import db, CarModel, Inventory 
+import time
+PROCESS_STARTED = time.perf_counter()
+
 import os
-import json
-from sqlalchemy import func
+import sys
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request, jsonify, Response
+from database import db, CarModel, Inventory, CAR_FIELDS, ensure_schema
+from common import metrics, profiling
+from common.db import configure_database
+from common.deadline import DeadlineExceeded, check_deadline, init_app as init_deadlines
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import load_only
+from reservations import (ExpirySweeper, ReservationError, commit_batch, commit_reservation, expire_reservations,
+                          release_batch, release_reservation, reserve, reserve_batch)
 from flask_cors import CORS 
 
 app = Flask(__name__)
 # Cho phép CORS để API Gateway và Frontend có thể truy cập
 CORS(app, resources={r"/*": {"origins": "*"}}) 
 
-# Cấu hình DB
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///catalog_service_v3.db")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Số liệu độ trễ/DB/in-flight tại /metrics và header Server-Timing (xem common/metrics.py)
+metrics.init_app(app, 'catalog')
+# Profile theo yêu cầu (header X-Profile hoặc PROFILE_SAMPLE_RATE), xem common/profiling.py
+profiling.init_app(app, 'catalog')
+
+# Cấu hình DB (WAL, busy timeout, pool... xem common/db.py)
+configure_database(app, "sqlite:///catalog_service_v3.db")
 
 db.init_app(app) 
 
-# --- DỮ LIỆU DEMO (Chỉ chèn nếu DB trống) ---
-CARS_DATA_DEMO = [
-    {
-        "model_name": "VinFast VF 9", "base_price": 1499000000, 
-        "description": "SUV điện hạng E, 7 chỗ. Flagship của VinFast.", 
-        "specs": json.dumps({"motor_type": "Điện", "range": "438 km", "color": "Xanh"}), 
-        "image_url": "https://giaxeoto.vn/admin/upload/images/resize/640-gia-xe-Vinfast-VF9.jpg", 
-        "inventory_HN": 5, "inventory_HCM": 10
-    },
-    {
-        "model_name": "VinFast VF 8", "base_price": 1057000000, 
-        "description": "SUV điện hạng D, 5 chỗ. Mẫu xe chủ lực toàn cầu.", 
-        "specs": json.dumps({"motor_type": "Điện", "range": "420 km", "color": "Đỏ"}),
-        "image_url": "https://danchoioto.vn/wp-content/uploads/2022/08/gia-xe-vinfast-vf8.jpg", 
-        "inventory_HN": 15, "inventory_HCM": 30
-    },
-    {
-        "model_name": "VinFast VF 7", "base_price": 850000000, 
-        "description": "SUV điện hạng C, phong cách Coupe, thiết kế hiện đại.", 
-        "specs": json.dumps({"motor_type": "Điện", "range": "400 km", "color": "Đen Tím"}),
-        "image_url": "https://giaxeoto.vn/admin/upload/images/resize/640-Vinfast-VF7-gia-xe.jpg", 
-        "inventory_HN": 20, "inventory_HCM": 25
-    },
-    {
-        "model_name": "VinFast VF 6", "base_price": 675000000, 
-        "description": "SUV điện hạng B, nhỏ gọn và linh hoạt, giá dễ tiếp cận.", 
-        "specs": json.dumps({"motor_type": "Điện", "range": "399 km", "color": "Tím Than"}),
-        "image_url": "https://giaxeoto.vn/admin/upload/images/resize/640-Vinfast-VF6-ban-thuong-mai-gia-xe.jpg", 
-        "inventory_HN": 30, "inventory_HCM": 20
-    },
-    {
-        "model_name": "VinFast VF 5 Plus", "base_price": 458000000, 
-        "description": "SUV điện hạng A, dành cho đô thị.", 
-        "specs": json.dumps({"motor_type": "Điện", "range": "326 km", "color": "Xanh Ngọc"}),
-        "image_url": "https://giaxeoto.vn/admin/upload/images/resize/640-Vinfast-VF5-plus-gia-xe.jpg", 
-        "inventory_HN": 40, "inventory_HCM": 50
-    },
-    {
-        "model_name": "VinFast LUX A2.0", "base_price": 1115000000, 
-        "description": "Sedan hạng E, động cơ xăng turbo. Thiết kế Ý đẳng cấp.", 
-        "specs": json.dumps({"motor_type": "Xăng", "engine": "2.0L", "cylinder": "4"}),
-        "image_url": "https://vinfastdongsaigon.com/content/VINFAST/san-pham/lux-a20.jpg", 
-        "inventory_HN": 10, "inventory_HCM": 5
-    },
-    {
-        "model_name": "VinFast LUX SA2.0", "base_price": 1550000000, 
-        "description": "SUV hạng E, động cơ xăng turbo. Mạnh mẽ và sang trọng.", 
-        "specs": json.dumps({"motor_type": "Xăng", "engine": "2.0L", "cylinder": "4"}),
-        "image_url": "https://danchoioto.vn/wp-content/uploads/2020/09/vinfast-lux-sa2-0.jpg", 
-        "inventory_HN": 10, "inventory_HCM": 5
-    },
-    {
-        "model_name": "VinFast Fadil", "base_price": 425000000, 
-        "description": "Hatchback hạng A, xe đô thị nhỏ gọn, tiện lợi.", 
-        "specs": json.dumps({"motor_type": "Xăng", "engine": "1.4L", "color": "Đỏ Cam"}),
-        "image_url": "https://autopro8.mediacdn.vn/134505113543774208/2023/1/29/vinfast-fadil-23-16434695001991234174472-16749685067641882387245-1674974414975-16749744151041515512318.jpg", 
-        "inventory_HN": 20, "inventory_HCM": 15
-    }
-]
+# Deadline từ Gateway/Order Service (X-Deadline-Ms): request hết hạn bị hủy, trả 504
+init_deadlines(app)
+
+# Hoàn kho cho phiếu giữ chỗ quá hạn mỗi RESERVATION_SWEEP_SECONDS giây (luồng nền của từng worker)
+expiry_sweeper = ExpirySweeper(app)
+
+@app.before_request
+def start_expiry_sweeper():
+    expiry_sweeper.ensure_started()
+
+# Ngân sách thời gian khởi động (ms): vượt quá thì in cảnh báo để phát hiện cold start chậm
+STARTUP_BUDGET_MS = int(os.environ.get("STARTUP_BUDGET_MS", 3000))
 
 def initialize_db():
-    """Tạo DB và chỉ chèn dữ liệu nếu chưa có xe nào."""
+    """Khởi tạo một lần khi service khởi động: tạo bảng/index và seed dữ liệu nếu DB trống."""
+    started = time.perf_counter()
     with app.app_context():
         db.create_all()
-        if CarModel.query.count() == 0:
+        ensure_schema()
+        if db.session.query(CarModel.id).first() is None:
+            # Chỉ nạp module dữ liệu demo khi thực sự cần seed
+            from seed_data import CARS_DATA_DEMO
             print("Đang tạo dữ liệu demo cho Catalog...")
-            for item in CARS_DATA_DEMO:
-                car = CarModel(
-                    model_name=item['model_name'], 
-                    base_price=item['base_price'],
-                    description=item['description'],
-                    specs=item['specs'],
-                    image_url=item['image_url']
-                )
-                db.session.add(car)
-                db.session.flush() # Lấy ID car trước khi commit
-                
-                db.session.add(Inventory(car_model_id=car.id, dealer_location="Hà Nội", stock_quantity=item['inventory_HN']))
-                db.session.add(Inventory(car_model_id=car.id, dealer_location="TP. HCM", stock_quantity=item['inventory_HCM']))
+            cars = [CarModel(model_name=item['model_name'], base_price=item['base_price'],
+                             description=item['description'], specs=item['specs'],
+                             image_url=item['image_url'])
+                    for item in CARS_DATA_DEMO]
+            db.session.add_all(cars)
+            db.session.flush() # Một lượt INSERT cho cả danh sách xe để lấy ID
+            db.session.add_all([
+                Inventory(car_model_id=car.id, dealer_location=location, stock_quantity=item[key])
+                for car, item in zip(cars, CARS_DATA_DEMO)
+                for location, key in (("Hà Nội", 'inventory_HN'), ("TP. HCM", 'inventory_HCM'))
+            ])
             db.session.commit()
             print("Đã khởi tạo dữ liệu thành công.")
+        db.session.remove()
 
-@app.before_request
-def setup():
-    if not hasattr(app, 'db_initialized'):
-        initialize_db()
-        app.db_initialized = True
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    startup_ms = (time.perf_counter() - PROCESS_STARTED) * 1000
+    print(f"Khởi tạo DB: {elapsed_ms:.0f}ms, tổng thời gian khởi động: {startup_ms:.0f}ms "
+          f"(ngân sách {STARTUP_BUDGET_MS}ms)")
+    if startup_ms > STARTUP_BUDGET_MS:
+        print(f"⚠️ Khởi động chậm hơn ngân sách {startup_ms - STARTUP_BUDGET_MS:.0f}ms")
+
+# --- HEALTH CHECK ---
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Tiến trình còn sống và nhận được request (không chạm DB)."""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Sẵn sàng phục vụ: DB kết nối được và bảng catalog đã được tạo."""
+    try:
+        db.session.execute(select(CarModel.id).limit(1))
+        return jsonify({"status": "ready"}), 200
+    except Exception as e:
+        return jsonify({"status": "not_ready", "error": str(e)}), 503
+    finally:
+        db.session.remove()
 
 # --- API ENDPOINTS ---
 
+# Giới hạn số xe trả về mỗi trang của danh sách
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def cars_with_stock(location=None):
+    """Truy vấn xe kèm tổng tồn kho bằng một câu GROUP BY (thay vì 1 query/xe).
+
+    Khi có `location`, chỉ lấy xe có hàng tại chi nhánh đó và tồn kho tính riêng chi nhánh đó.
+    """
+    total_stock = func.coalesce(func.sum(Inventory.stock_quantity), 0)
+    query = db.session.query(CarModel, total_stock)
+    if location:
+        query = query.join(Inventory, (Inventory.car_model_id == CarModel.id) &
+                           (Inventory.dealer_location == location))
+    else:
+        query = query.outerjoin(Inventory, Inventory.car_model_id == CarModel.id)
+    return query.group_by(CarModel.id)
+
+def int_arg(name, default=None):
+    """Đọc tham số query dạng số nguyên, ném ValueError nếu sai định dạng."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Tham số '{name}' phải là số nguyên")
+
 @app.route('/api/v1/catalog/cars', methods=['GET'])
 def get_all_cars():
-    """Lấy danh sách xe kèm tổng tồn kho để vẽ biểu đồ Admin."""
-    cars = CarModel.query.all()
-    result = []
-    for car in cars:
-        car_data = car.to_dict()
-        # Tính tổng tồn kho từ tất cả các chi nhánh
-        total_stock = db.session.query(func.sum(Inventory.stock_quantity)).filter(Inventory.car_model_id == car.id).scalar() or 0
-        car_data['stock_quantity'] = total_stock # Trường quan trọng cho Admin Chart
-        result.append(car_data)
-    return jsonify(result), 200
+    """Lấy danh sách xe kèm tổng tồn kho để vẽ biểu đồ Admin.
+
+    Query params (đều tùy chọn):
+    - limit, cursor: phân trang keyset theo id; trang kế tiếp trả trong header X-Next-Cursor
+    - min_price, max_price, motor_type, location: lọc theo giá, loại động cơ, chi nhánh
+    - ids: chỉ lấy các xe có id trong danh sách, ví dụ ids=1,3,5 (tra cứu theo lô)
+    - fields: danh sách trường cần trả về, ví dụ fields=id,model_name,stock_quantity
+    """
+    try:
+        limit = min(max(int_arg('limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        cursor = int_arg('cursor')
+        min_price = int_arg('min_price')
+        max_price = int_arg('max_price')
+        ids = [int(i) for i in request.args['ids'].split(',') if i.strip()] if request.args.get('ids') else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    fields = None
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = set(fields) - set(CAR_FIELDS) - {'stock_quantity'}
+        if unknown:
+            return jsonify({"message": f"Trường không hợp lệ: {', '.join(sorted(unknown))}"}), 400
+
+    query = cars_with_stock(request.args.get('location'))
+    if fields:
+        # Chỉ đọc các cột được yêu cầu (id luôn cần cho phân trang)
+        columns = [getattr(CarModel, f) for f in fields if f in CAR_FIELDS and f != 'id']
+        query = query.options(load_only(CarModel.id, *columns))
+    if cursor is not None:
+        query = query.filter(CarModel.id > cursor)
+    if min_price is not None:
+        query = query.filter(CarModel.base_price >= min_price)
+    if max_price is not None:
+        query = query.filter(CarModel.base_price <= max_price)
+    if request.args.get('motor_type'):
+        query = query.filter(CarModel.motor_type == request.args['motor_type'])
+    if ids:
+        query = query.filter(CarModel.id.in_(ids[:MAX_PAGE_SIZE]))
+
+    rows = query.order_by(CarModel.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = jsonify([car.to_dict(stock_quantity=total_stock, fields=fields) for car, total_stock in rows])
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(rows[-1][0].id)
+    return response, 200
 
 @app.route('/api/v1/catalog/cars/<int:car_id>', methods=['GET'])
 def get_car_details(car_id):
     """Lấy chi tiết 1 mẫu xe kèm tổng tồn kho."""
-    car = CarModel.query.get(car_id)
-    if car:
-        car_data = car.to_dict()
-        total_stock = db.session.query(func.sum(Inventory.stock_quantity)).filter(Inventory.car_model_id == car.id).scalar() or 0
-        car_data['stock_quantity'] = total_stock
-        return jsonify(car_data), 200
+    row = cars_with_stock().filter(CarModel.id == car_id).first()
+    if row:
+        car, total_stock = row
+        return jsonify(car.to_dict(stock_quantity=total_stock)), 200
     return jsonify({"message": "Mẫu xe không tồn tại"}), 404
 
+def run_inventory_action(action, success_status=200):
+    """Chạy một thao tác kho trong một transaction, chuyển lỗi nghiệp vụ/khóa DB thành mã HTTP."""
+    try:
+        result = action()
+        # Chờ khóa ghi quá lâu và bên gọi đã bỏ cuộc: không giữ/trừ kho nữa
+        check_deadline('inventory')
+        db.session.commit()
+        return jsonify(result), success_status
+    except DeadlineExceeded:
+        db.session.rollback()
+        raise
+    except ReservationError as e:
+        db.session.rollback()
+        return jsonify({"message": e.message}), e.status
+    except OperationalError:
+        # SQLite trả "database is locked" khi quá nhiều request ghi cùng lúc
+        db.session.rollback()
+        return jsonify({"message": "Kho đang bận, vui lòng thử lại"}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Lỗi xử lý kho: {str(e)}"}), 500
+
 @app.route('/api/v1/inventory/reduce', methods=['POST'])
 def reduce_stock():
-    """API xử lý trừ kho phục vụ Saga Pattern từ Order Service."""
-    data = request.json
-    car_id = data.get('car_id')
-    quantity = data.get('quantity', 1)
+    """API xử lý trừ kho phục vụ Saga Pattern từ Order Service (trừ ngay, không giữ chỗ)."""
+    data = request.json or {}
 
-    if not car_id:
-        return jsonify({"message": "Thiếu ID mẫu xe"}), 400
+    def action():
+        reservation = reserve(data.get('car_id'), data.get('quantity', 1), status='committed')
+        return {"message": "Trừ kho thành công", "unit_price": reservation.unit_price}
 
-    # Lấy tồn kho tổng cộng từ tất cả chi nhánh
-    inventory_items = Inventory.query.filter_by(car_model_id=car_id).all()
-    total_available = sum(item.stock_quantity for item in inventory_items)
+    return run_inventory_action(action)
 
-    if total_available < quantity:
-        return jsonify({"message": f"Hết hàng! Hiện chỉ còn {total_available} chiếc"}), 400
+@app.route('/api/v1/inventory/reservations', methods=['POST'])
+def create_reservation():
+    """Giữ chỗ tồn kho cho đơn chưa thanh toán; tự hoàn kho nếu quá `ttl_seconds` chưa xác nhận."""
+    data = request.json or {}
 
-    try:
-        # Thực hiện trừ kho (Ưu tiên trừ ở chi nhánh có nhiều hàng trước)
-        remaining_to_reduce = quantity
-        for item in sorted(inventory_items, key=lambda x: x.stock_quantity, reverse=True):
-            if remaining_to_reduce <= 0: break
-            
-            reduce_amount = min(item.stock_quantity, remaining_to_reduce)
-            item.stock_quantity -= reduce_amount
-            remaining_to_reduce -= reduce_amount
-
-        car = CarModel.query.get(car_id)
-        db.session.commit()
-        
-        return jsonify({
-            "message": "Trừ kho thành công",
-            "unit_price": car.base_price
-        }), 200
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"message": f"Lỗi xử lý kho: {str(e)}"}), 500
+    def action():
+        expire_reservations()
+        reservation = reserve(data.get('car_id'), data.get('quantity', 1), data.get('ttl_seconds'))
+        return reservation.to_dict()
+
+    return run_inventory_action(action, 201)
+
+@app.route('/api/v1/inventory/reservations/batch', methods=['POST'])
+def create_reservation_batch():
+    """Giữ chỗ cả giỏ hàng trong một lượt gọi (đủ hàng cho tất cả hoặc không giữ gì)."""
+    data = request.json or {}
+
+    def action():
+        expire_reservations()
+        reservations = reserve_batch(data.get('items') or [], data.get('ttl_seconds'))
+        return {
+            "reservations": [r.to_dict() for r in reservations],
+            "total_amount": sum(r.unit_price * r.quantity for r in reservations)
+        }
+
+    return run_inventory_action(action, 201)
+
+@app.route('/api/v1/inventory/reservations/commit', methods=['POST'])
+def confirm_reservation_batch():
+    """Xác nhận nhiều phiếu giữ chỗ của một đơn hàng trong một lượt gọi."""
+    data = request.json or {}
+
+    def action():
+        expire_reservations()
+        return {"reservations": [r.to_dict() for r in commit_batch(data.get('reservation_ids'))]}
+
+    return run_inventory_action(action)
+
+@app.route('/api/v1/inventory/reservations/release', methods=['POST'])
+def cancel_reservation_batch():
+    """Hủy nhiều phiếu giữ chỗ (bù trừ khi tạo đơn thất bại) trong một lượt gọi."""
+    data = request.json or {}
+
+    def action():
+        expire_reservations()
+        return {"reservations": [r.to_dict() for r in release_batch(data.get('reservation_ids'))]}
+
+    return run_inventory_action(action)
+
+@app.route('/api/v1/inventory/reservations/<reservation_id>/commit', methods=['POST'])
+def confirm_reservation(reservation_id):
+    """Xác nhận phiếu giữ chỗ khi đơn hàng đã thanh toán."""
+    def action():
+        expire_reservations()
+        return commit_reservation(reservation_id).to_dict()
+
+    return run_inventory_action(action)
+
+@app.route('/api/v1/inventory/reservations/<reservation_id>/release', methods=['POST'])
+def cancel_reservation(reservation_id):
+    """Hủy phiếu giữ chỗ và hoàn lại tồn kho."""
+    def action():
+        expire_reservations()
+        return release_reservation(reservation_id).to_dict()
+
+    return run_inventory_action(action)
 
 if __name__ == '__main__':
+    # Server dev; production chạy qua common/serve.py (xem Dockerfile)
     initialize_db()
     print("Catalog Service đang chạy trên cổng 5002...")
-    app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.environ.get('CATALOG_PORT', 5002)), debug=True)
\ No newline at end of file
@@ -1,40 +1,110 @@
 # catalog-service/database.py
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import validates
+from functools import lru_cache
+from datetime import datetime
 import json
+import uuid
 
 db = SQLAlchemy()
 
+@lru_cache(maxsize=4096)
+def parse_specs(raw_specs):
+    """Giải mã chuỗi JSON specs một lần rồi dùng lại (dict trả về chỉ được đọc, không sửa)."""
+    return json.loads(raw_specs) if raw_specs else {}
+
+# Các trường của xe mà API trả về (dùng cho tham số fields= của danh sách xe)
+CAR_FIELDS = ('id', 'model_name', 'base_price', 'description', 'specs', 'image_url')
+
 class CarModel(db.Model):
     """Mô hình chi tiết các mẫu xe VinFast."""
     __tablename__ = 'car_models'
     
     id = db.Column(db.Integer, primary_key=True) 
     model_name = db.Column(db.String(100), unique=True, nullable=False)
-    base_price = db.Column(db.Integer, nullable=False)
+    base_price = db.Column(db.Integer, nullable=False, index=True)
     description = db.Column(db.Text)
     specs = db.Column(db.Text) 
     image_url = db.Column(db.String(255), nullable=True) # <-- Trường ảnh mới
+    # Tách từ specs ra cột riêng để lọc theo loại động cơ bằng index
+    motor_type = db.Column(db.String(50), index=True)
     
     inventory_items = db.relationship('Inventory', backref='car', lazy=True)
 
-    def to_dict(self):
-        """Trả về chi tiết xe dưới dạng Dict."""
-        specs_dict = json.loads(self.specs) if self.specs else {} 
-        return {
-            'id': self.id,
-            'model_name': self.model_name,
-            'base_price': self.base_price,
-            'description': self.description,
-            'specs': specs_dict,
-            'image_url': self.image_url # <-- Đảm bảo trường này được trả về
-        }
+    @validates('specs')
+    def _sync_motor_type(self, key, value):
+        """Giữ cột motor_type luôn khớp với specs."""
+        self.motor_type = parse_specs(value).get('motor_type')
+        return value
+
+    def to_dict(self, stock_quantity=None, fields=None):
+        """Trả về chi tiết xe dưới dạng Dict (kèm tổng tồn kho nếu đã tính sẵn).
+
+        `fields` giới hạn các trường trả về; chỉ các cột được yêu cầu mới được đọc.
+        """
+        data = {}
+        for name in fields or CAR_FIELDS:
+            if name == 'specs':
+                data['specs'] = parse_specs(self.specs)
+            elif name in CAR_FIELDS:
+                data[name] = getattr(self, name) # image_url cũng được trả về ở đây
+        if stock_quantity is not None and (not fields or 'stock_quantity' in fields):
+            data['stock_quantity'] = stock_quantity # Trường quan trọng cho Admin Chart
+        return data
 
 class Inventory(db.Model):
     """Mô hình theo dõi tồn kho tại các đại lý/khu vực."""
     __tablename__ = 'inventory'
     
+    __table_args__ = (
+        # Phủ truy vấn SUM tồn kho theo xe và lọc theo chi nhánh mà không cần đọc bảng
+        db.Index('ix_inventory_car_stock', 'car_model_id', 'stock_quantity'),
+        db.Index('ix_inventory_location_car', 'dealer_location', 'car_model_id', 'stock_quantity'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     car_model_id = db.Column(db.Integer, db.ForeignKey('car_models.id'), nullable=False) 
     dealer_location = db.Column(db.String(100), default='Hà Nội')
-    stock_quantity = db.Column(db.Integer, default=0)
\ No newline at end of file
+    stock_quantity = db.Column(db.Integer, default=0)
+
+class Reservation(db.Model):
+    """Phiếu giữ hàng tạm thời: giữ chỗ (held) -> xác nhận (committed) hoặc hoàn kho (released/expired)."""
+    __tablename__ = 'reservations'
+    __table_args__ = (
+        # Quét nhanh các phiếu giữ chỗ đã quá hạn
+        db.Index('ix_reservations_status_expires', 'status', 'expires_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    car_model_id = db.Column(db.Integer, db.ForeignKey('car_models.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Integer, nullable=False) # Giá tại thời điểm giữ chỗ
+    allocations = db.Column(db.Text, nullable=False)   # JSON {inventory_id: số lượng đã trừ}
+    status = db.Column(db.String(20), default='held')  # held, committed, released, expired
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'reservation_id': self.id,
+            'car_id': self.car_model_id,
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat()
+        }
+
+def ensure_schema():
+    """Bổ sung cột và index mới cho DB đã tồn tại (db.create_all không sửa bảng cũ)."""
+    columns = {c['name'] for c in inspect(db.engine).get_columns('car_models')}
+    if 'motor_type' not in columns:
+        db.session.execute(text('ALTER TABLE car_models ADD COLUMN motor_type VARCHAR(50)'))
+        for car_id, specs in db.session.execute(text('SELECT id, specs FROM car_models')).all():
+            db.session.execute(text('UPDATE car_models SET motor_type = :motor_type WHERE id = :id'),
+                               {'motor_type': parse_specs(specs).get('motor_type'), 'id': car_id})
+        db.session.commit()
+    for table in (CarModel.__table__, Inventory.__table__, Reservation.__table__):
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -0,0 +1,249 @@
+# catalog-service/reservations.py
+"""Engine giữ chỗ tồn kho (reserve -> commit/release) phục vụ Saga của Order Service.
+
+Kho không bao giờ bị đọc-sửa-ghi trong Python: mỗi lần trừ là một câu UPDATE có
+điều kiện `stock_quantity >= n`, nên hai đơn hàng đồng thời không thể cùng vượt qua
+bước kiểm tra tồn kho. Các hàm ở đây chỉ flush; route gọi tới tự commit/rollback
+để mọi thay đổi của một request nằm trong một transaction.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from database import db, CarModel, Inventory, Reservation
+
+# Thời gian giữ chỗ mặc định cho đơn chưa thanh toán (giây)
+DEFAULT_HOLD_SECONDS = int(os.environ.get("RESERVATION_TTL_SECONDS", 900))
+MAX_HOLD_SECONDS = 24 * 3600
+
+# Số dòng tối đa trong một lần giữ chỗ/xác nhận/hủy theo lô
+MAX_BATCH_ITEMS = 50
+
+# Số lần đọc lại tồn kho khi câu UPDATE có điều kiện bị tranh chấp bởi request khác
+TAKE_STOCK_ATTEMPTS = 3
+
+# Chu kỳ (giây) quét phiếu quá hạn ở nền; 0 = chỉ quét khi có request giữ chỗ/xác nhận/hủy
+SWEEP_INTERVAL = float(os.environ.get("RESERVATION_SWEEP_SECONDS", 30))
+
+
+class ReservationError(Exception):
+    """Lỗi nghiệp vụ khi giữ chỗ, kèm mã HTTP tương ứng."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _change_stock(inventory_id, delta, minimum=None):
+    """Cộng/trừ tồn kho của một dòng bằng một câu UPDATE; trả về True nếu cập nhật được."""
+    statement = update(Inventory).where(Inventory.id == inventory_id)
+    if minimum is not None:
+        statement = statement.where(Inventory.stock_quantity >= minimum)
+    statement = statement.values(stock_quantity=Inventory.stock_quantity + delta) \
+        .execution_options(synchronize_session=False)
+    return db.session.execute(statement).rowcount == 1
+
+
+def _take_stock(car_id, quantity):
+    """Trừ `quantity` xe (ưu tiên chi nhánh nhiều hàng), trả về {inventory_id: số lượng đã trừ}."""
+    allocations = {}
+    remaining = quantity
+    for _ in range(TAKE_STOCK_ATTEMPTS):
+        rows = db.session.execute(
+            select(Inventory.id, Inventory.stock_quantity)
+            .where(Inventory.car_model_id == car_id, Inventory.stock_quantity > 0)
+            .order_by(Inventory.stock_quantity.desc())
+        ).all()
+        if sum(available for _, available in rows) < remaining:
+            break
+        for inventory_id, available in rows:
+            take = min(available, remaining)
+            if _change_stock(inventory_id, -take, minimum=take):
+                allocations[inventory_id] = allocations.get(inventory_id, 0) + take
+                remaining -= take
+            if remaining == 0:
+                return allocations
+
+    total_available = db.session.execute(
+        select(db.func.coalesce(db.func.sum(Inventory.stock_quantity), 0))
+        .where(Inventory.car_model_id == car_id)
+    ).scalar() + (quantity - remaining)
+    raise ReservationError(f"Hết hàng! Hiện chỉ còn {total_available} chiếc")
+
+
+def _restore_stock(reservation):
+    for inventory_id, amount in json.loads(reservation.allocations).items():
+        _change_stock(int(inventory_id), amount)
+
+
+def _set_status(reservation_id, new_status, now=None):
+    """Chuyển phiếu từ 'held' sang trạng thái mới; chỉ một request thắng nếu chạy đồng thời."""
+    statement = update(Reservation).where(Reservation.id == reservation_id, Reservation.status == 'held')
+    if now is not None:
+        statement = statement.where(Reservation.expires_at > now)
+    statement = statement.values(status=new_status).execution_options(synchronize_session=False)
+    return db.session.execute(statement).rowcount == 1
+
+
+def expire_reservations(now=None, limit=100):
+    """Hoàn kho cho các phiếu giữ chỗ đã quá hạn mà chưa được xác nhận."""
+    now = now or datetime.utcnow()
+    expired = Reservation.query.filter(Reservation.status == 'held', Reservation.expires_at <= now) \
+        .limit(limit).all()
+    for reservation in expired:
+        if _set_status(reservation.id, 'expired'):
+            _restore_stock(reservation)
+    return len(expired)
+
+
+class ExpirySweeper:
+    """Luồng nền hoàn kho cho phiếu quá hạn định kỳ, kể cả khi không có request giữ chỗ mới."""
+
+    def __init__(self, app, interval=SWEEP_INTERVAL, batch=100):
+        self.app = app
+        self.interval = interval
+        self.batch = batch
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # gunicorn preload: luồng của master không theo sang worker sau fork, mỗi worker tự khởi động
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='reservation-sweeper', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sweep()
+
+    def sweep(self):
+        """Hoàn kho mọi phiếu đã quá hạn, mỗi lô một transaction; lỗi (DB bận) thì để lần sau."""
+        with self.app.app_context():
+            try:
+                while True:
+                    expired = expire_reservations(limit=self.batch)
+                    db.session.commit()
+                    if expired < self.batch:
+                        return
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Lỗi quét phiếu giữ chỗ quá hạn: {str(e)}")
+            finally:
+                db.session.remove()
+
+
+def reserve(car_id, quantity, hold_seconds=None, status='held'):
+    """Giữ chỗ `quantity` xe; trả về phiếu giữ chỗ kèm đơn giá trong cùng một lượt gọi."""
+    if not car_id:
+        raise ReservationError("Thiếu ID mẫu xe")
+    if not isinstance(quantity, int) or quantity < 1:
+        raise ReservationError("Số lượng phải là số nguyên dương")
+    hold_seconds = min(int(hold_seconds or DEFAULT_HOLD_SECONDS), MAX_HOLD_SECONDS)
+
+    unit_price = db.session.execute(select(CarModel.base_price).where(CarModel.id == car_id)).scalar()
+    if unit_price is None:
+        raise ReservationError("Mẫu xe không tồn tại", 404)
+
+    now = datetime.utcnow()
+    reservation = Reservation(
+        car_model_id=car_id,
+        quantity=quantity,
+        unit_price=unit_price,
+        allocations=json.dumps(_take_stock(car_id, quantity)),
+        status=status,
+        created_at=now,
+        expires_at=now + timedelta(seconds=hold_seconds)
+    )
+    db.session.add(reservation)
+    db.session.flush()
+    return reservation
+
+
+def _get_reservation(reservation_id):
+    reservation = db.session.get(Reservation, reservation_id)
+    if reservation is None:
+        raise ReservationError("Phiếu giữ chỗ không tồn tại", 404)
+    return reservation
+
+
+def commit_reservation(reservation_id):
+    """Xác nhận phiếu giữ chỗ (đơn đã thanh toán): số lượng đã trừ trở thành vĩnh viễn."""
+    reservation = _get_reservation(reservation_id)
+    if not _set_status(reservation_id, 'committed', now=datetime.utcnow()):
+        db.session.refresh(reservation)
+        if reservation.status == 'committed':
+            return reservation
+        if reservation.status in ('held', 'expired'):
+            # Quá hạn: kho được hoàn lại ở lần quét expire_reservations kế tiếp
+            raise ReservationError("Phiếu giữ chỗ đã hết hạn", 410)
+        raise ReservationError(f"Phiếu giữ chỗ đang ở trạng thái {reservation.status}", 409)
+    db.session.refresh(reservation)
+    return reservation
+
+
+def release_reservation(reservation_id):
+    """Hủy phiếu giữ chỗ và hoàn lại tồn kho (bù trừ khi đơn hàng thất bại/bị hủy)."""
+    reservation = _get_reservation(reservation_id)
+    if _set_status(reservation_id, 'released'):
+        _restore_stock(reservation)
+    else:
+        db.session.refresh(reservation)
+        if reservation.status == 'committed':
+            raise ReservationError("Phiếu giữ chỗ đã được xác nhận, không thể hủy", 409)
+    db.session.refresh(reservation)
+    return reservation
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def reserve_batch(items, hold_seconds=None):
+    """Giữ chỗ cả giỏ hàng trong một transaction: đủ hàng cho mọi dòng hoặc không giữ gì."""
+    if not items:
+        raise ReservationError("Giỏ hàng trống")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ReservationError(f"Tối đa {MAX_BATCH_ITEMS} dòng mỗi lần giữ chỗ")
+    # Kiểm tra từng dòng trước khi sắp xếp: body JSON có thể lẫn kiểu (chuỗi/số) hoặc sai cấu trúc
+    for line, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ReservationError(f"Dòng {line}: phải là object {{car_id, quantity}}")
+        if not _is_int(item.get('car_id')) or item['car_id'] < 1:
+            raise ReservationError(f"Dòng {line}: car_id phải là số nguyên dương")
+        if not _is_int(item.get('quantity', 1)) or item.get('quantity', 1) < 1:
+            raise ReservationError(f"Dòng {line}: số lượng phải là số nguyên dương")
+    # Trừ kho theo thứ tự car_id cố định để các giỏ hàng đồng thời không khóa chéo nhau
+    ordered = sorted(enumerate(items), key=lambda pair: (int(pair[1]['car_id']), pair[0]))
+    reservations = [None] * len(items)
+    for position, item in ordered:
+        try:
+            reservations[position] = reserve(item['car_id'], item.get('quantity', 1), hold_seconds)
+        except ReservationError as e:
+            raise ReservationError(f"Xe #{item.get('car_id')}: {e.message}", e.status)
+    return reservations
+
+
+def _batch_ids(reservation_ids):
+    if not reservation_ids or not isinstance(reservation_ids, list):
+        raise ReservationError("Thiếu danh sách reservation_ids")
+    if len(reservation_ids) > MAX_BATCH_ITEMS:
+        raise ReservationError(f"Tối đa {MAX_BATCH_ITEMS} phiếu mỗi lần")
+    return reservation_ids
+
+
+def commit_batch(reservation_ids):
+    """Xác nhận nhiều phiếu giữ chỗ cùng lúc; một phiếu lỗi thì cả lô bị hủy bỏ."""
+    return [commit_reservation(reservation_id) for reservation_id in _batch_ids(reservation_ids)]
+
+
+def release_batch(reservation_ids):
+    """Hủy nhiều phiếu giữ chỗ và hoàn kho trong một transaction."""
+    return [release_reservation(reservation_id) for reservation_id in _batch_ids(reservation_ids)]
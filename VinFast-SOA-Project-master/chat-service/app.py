@@ -1,44 +1,110 @@
+import os
+import sys
+import uuid
+if __name__ == '__main__':
+    # Server dev chạy eventlet: vá socket/threading trước mọi import để luồng nền của
+    # message bus không chặn event loop (worker eventlet của gunicorn tự vá sẵn)
+    import eventlet
+    eventlet.monkey_patch()
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO, emit, join_room
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, or_
+from datetime import datetime, timezone
 from flask_cors import CORS
-import os
+from common import metrics, profiling
+from common.bus import INBOUND_QUEUE, create_bus, room_channel
+from common.db import configure_database
+from common.deadline import init_app as init_deadlines
+from persistence import MessageWriter
 
 app = Flask(__name__)
 # Cấu hình CORS mở rộng để đảm bảo Gateway và Frontend đều có thể kết nối
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Số liệu độ trễ/DB/in-flight tại /metrics và header Server-Timing (xem common/metrics.py)
+metrics.init_app(app, 'chat')
+# Profile theo yêu cầu (header X-Profile hoặc PROFILE_SAMPLE_RATE), xem common/profiling.py
+profiling.init_app(app, 'chat')
+
 # Cấu hình SocketIO
 # async_mode='eventlet' thường ổn định nhất trong môi trường Docker
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode=None)
+# Khi chạy nhiều worker, các worker chia sẻ room/emit qua message queue (redis://...);
+# channel riêng để không lẫn với Gateway khi dùng chung một redis
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=None,
+                    message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None,
+                    channel='vinfast-chat')
 
-# Kết nối Database SQLite
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///chat_service.db")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Kết nối Database SQLite (WAL, busy timeout, pool... xem common/db.py)
+configure_database(app, "sqlite:///chat_service.db")
 db = SQLAlchemy(app)
 
+# Deadline từ Gateway/Order Service (X-Deadline-Ms): request đến nơi đã hết hạn bị trả 504
+init_deadlines(app)
+
 class Message(db.Model):
     """Mô hình lưu trữ tin nhắn chat cho từng đơn hàng"""
+    # Lịch sử chat luôn được đọc theo một đơn hàng, sắp theo thời gian (keyset theo timestamp, id)
+    __table_args__ = (
+        db.Index('ix_message_order_timestamp_id', 'order_id', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, nullable=False) # Gắn với mã đơn hàng
     sender_role = db.Column(db.String(20))           # 'admin', 'customer' hoặc 'system'
     sender_name = db.Column(db.String(100))
     content = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    # Giờ UTC đến micro giây (CURRENT_TIMESTAMP của SQLite chỉ chính xác đến giây)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
         """Trả về dữ liệu dạng dictionary để truyền qua Socket/API"""
         return {
+            "id": self.id,
             "order_id": self.order_id, 
             "role": self.sender_role,
             "name": self.sender_name, 
             "content": self.content,
-            "time": self.timestamp.strftime("%H:%M")
+            "time": self.timestamp.strftime("%H:%M"),
+            "timestamp": self.timestamp.isoformat() + "Z"
         }
 
-# Khởi tạo bảng dữ liệu
-with app.app_context():
-    db.create_all()
+def broadcast(payload):
+    """Phát tin tới phòng: client nối thẳng Chat Service và các worker Gateway qua bus"""
+    socketio.emit('receive_message', payload, room=str(payload['order_id']))
+    metrics.record_event('receive_message', 'out')
+    try:
+        bus.publish(room_channel(payload['order_id']), payload)
+    except Exception as e:
+        # Client qua Gateway vẫn lấy lại được tin bằng API lịch sử khi tin đã được ghi
+        print(f"❌ Lỗi publish tin nhắn lên message bus: {str(e)}")
+
+def announce_persisted(notice):
+    """Báo id thật ({order_id, client_id, id}) của tin đã phát trước khi được ghi theo lô"""
+    socketio.emit('message_persisted', notice, room=str(notice['order_id']))
+    try:
+        # Trường event cho Gateway biết emit sự kiện nào (mặc định receive_message)
+        bus.publish(room_channel(notice['order_id']), dict(notice, event='message_persisted'))
+    except Exception as e:
+        print(f"❌ Lỗi publish id tin nhắn lên message bus: {str(e)}")
+
+# Ghi tin nhắn theo lô hoặc đồng bộ tùy CHAT_PERSISTENCE; batched phát ngay, báo id sau (xem persistence.py)
+message_writer = MessageWriter(app, db, broadcast, on_persisted=announce_persisted)
+metrics.register_collector(message_writer.collect)
+
+# Số tin nhắn trả về mỗi trang lịch sử
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
+def parse_timestamp(value):
+    """Đọc thời điểm ISO 8601 (chấp nhận hậu tố Z/múi giờ), trả về giờ UTC không kèm tzinfo"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
 
 @socketio.on('join')
 def on_join(data):
@@ -47,40 +113,107 @@ def on_join(data):
         # Luôn ép kiểu về String để tránh lệch Room với Gateway
         room = str(data['order_id'])
         join_room(room)
-        print(f"✅ User joined room: {room}")
+        metrics.record_event('join')
+
+def store_and_broadcast(order_id, role, name, content, client_id=None):
+    """Lưu tin nhắn và phát tới TOÀN BỘ phòng; client_id (id tạm) để Client ghép với id thật sau này"""
+    new_msg = Message(
+        order_id=order_id,
+        sender_role=role,
+        sender_name=name,
+        content=content,
+        timestamp=datetime.utcnow()
+    )
+    if not (isinstance(client_id, str) and 0 < len(client_id) <= 64):
+        client_id = uuid.uuid4().hex
+    new_msg.client_id = client_id
+    # Ghi ngay (sync) hoặc phát ngay rồi đưa vào hàng đợi ghi theo lô (batched)
+    message_writer.save(new_msg)
+
+def handle_inbound(data):
+    """Tin nhắn Client gửi qua Gateway (hàng đợi INBOUND_QUEUE), mỗi tin chỉ một worker xử lý"""
+    if 'order_id' not in data or 'content' not in data:
+        return
+    metrics.record_event('send_message', 'bus')
+    with app.app_context():
+        try:
+            store_and_broadcast(data['order_id'], data.get('role', 'customer'),
+                                data.get('name', 'Khách hàng'), data['content'], data.get('client_id'))
+        except Exception as e:
+            print(f"❌ Lỗi chat: {str(e)}")
+            db.session.rollback()
+
+# Message bus dùng chung với Gateway (MESSAGE_BUS_URL, xem common/bus.py)
+bus = create_bus()
+# Tiến trình chỉ chạy --init (common/serve.py) không lấy tin: tin lấy ra sẽ mất khi nó thoát
+if os.environ.get('SERVE_INIT') != '1':
+    bus.consume(INBOUND_QUEUE, handle_inbound)
 
 @socketio.on('send_message')
 def handle_message(data):
-    """Xử lý nhận tin nhắn mới và bắn tới các thành viên trong phòng"""
+    """Xử lý nhận tin nhắn mới từ client nối thẳng vào Chat Service"""
     if 'order_id' not in data or 'content' not in data: 
         return
+    metrics.record_event('send_message')
         
-    room = str(data['order_id'])
     try:
-        # 1. Lưu tin nhắn vào Database
-        new_msg = Message(
-            order_id=data['order_id'],
-            sender_role=data.get('role', 'customer'),
-            sender_name=data.get('name', 'Khách hàng'),
-            content=data['content']
-        )
-        db.session.add(new_msg)
-        db.session.commit()
-        
-        # 2. Phát tin nhắn tới TOÀN BỘ những người trong phòng
-        # Sử dụng socketio.emit để đảm bảo tin nhắn đi xuyên qua các tiến trình
-        socketio.emit('receive_message', new_msg.to_dict(), room=room)
-        
+        store_and_broadcast(data['order_id'], data.get('role', 'customer'),
+                            data.get('name', 'Khách hàng'), data['content'], data.get('client_id'))
     except Exception as e:
         print(f"❌ Lỗi chat: {str(e)}")
         db.session.rollback()
 
 @app.route('/api/v1/chat/<int:order_id>', methods=['GET'])
 def get_history(order_id):
-    """API lấy lại lịch sử tin nhắn khi load lại trang"""
+    """API lấy lịch sử tin nhắn theo trang (cũ -> mới trong mỗi trang).
+
+    Mặc định trả về `limit` tin mới nhất. `before=<id>`: trang cũ hơn tin đó;
+    `after=<id>` hoặc `since=<ISO timestamp>`: các tin mới hơn (không dùng chung với
+    `before`). Header X-Next-Cursor là id để gọi trang kế tiếp theo cùng chiều (không có
+    nếu đã hết).
+    """
     try:
-        messages = Message.query.filter_by(order_id=order_id).order_by(Message.timestamp.asc()).all()
-        return jsonify([m.to_dict() for m in messages]), 200
+        limit = min(max(int(request.args.get('limit', DEFAULT_HISTORY_LIMIT)), 1), MAX_HISTORY_LIMIT)
+        before = int(request.args['before']) if request.args.get('before') else None
+        after = int(request.args['after']) if request.args.get('after') else None
+        since = parse_timestamp(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({"error": "Tham số phân trang không hợp lệ"}), 400
+    if before is not None and (after is not None or since is not None):
+        return jsonify({"error": "Không dùng 'before' cùng với 'after'/'since'"}), 400
+
+    try:
+        query = Message.query.filter(Message.order_id == order_id)
+        cursor_id = before or after
+        if cursor_id:
+            cursor = db.session.get(Message, cursor_id)
+            if cursor is None or cursor.order_id != order_id:
+                return jsonify({"error": "Con trỏ không hợp lệ"}), 400
+
+        if after or since:
+            # Chiều mới hơn: (timestamp, id) > con trỏ, sắp tăng dần
+            if after:
+                query = query.filter(or_(Message.timestamp > cursor.timestamp,
+                                         and_(Message.timestamp == cursor.timestamp, Message.id > cursor.id)))
+            if since:
+                query = query.filter(Message.timestamp >= since)
+            messages = query.order_by(Message.timestamp.asc(), Message.id.asc()).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+        else:
+            # Chiều cũ hơn: lấy `limit` tin mới nhất trước con trỏ rồi đảo lại cho đúng thứ tự hiển thị
+            if before:
+                query = query.filter(or_(Message.timestamp < cursor.timestamp,
+                                         and_(Message.timestamp == cursor.timestamp, Message.id < cursor.id)))
+            messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit][::-1]
+
+        response = jsonify([m.to_dict() for m in messages])
+        if has_more and messages:
+            edge = messages[-1] if (after or since) else messages[0]
+            response.headers['X-Next-Cursor'] = str(edge.id)
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -92,21 +225,26 @@ def system_notify():
     content = data.get('content')
     
     if order_id and content:
-        room = str(order_id)
-        new_msg = Message(
-            order_id=order_id,
-            sender_role='system',
-            sender_name='Hệ thống',
-            content=content
-        )
-        db.session.add(new_msg)
-        db.session.commit()
-        
         # Bắn thông báo real-time tới tất cả người dùng trong phòng
-        socketio.emit('receive_message', new_msg.to_dict(), room=room)
+        store_and_broadcast(order_id, 'system', 'Hệ thống', content)
         return jsonify({"status": "success"}), 200
     return jsonify({"status": "failed"}), 400
 
+@app.route('/api/v1/chat/persistence/stats', methods=['GET'])
+def persistence_stats():
+    """Số liệu ghi tin nhắn: độ sâu hàng đợi, số lô đã ghi, thời gian flush"""
+    return jsonify(message_writer.stats()), 200
+
+def initialize_db():
+    """Tạo bảng và index còn thiếu (chạy một lần khi khởi động, trước khi fork các worker)"""
+    with app.app_context():
+        # create_all không thêm index cho bảng đã có sẵn nên tạo riêng
+        db.create_all()
+        for index in Message.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+        print("Chat Service Database initialized!")
+
 if __name__ == '__main__':
-    # Khởi chạy trên cổng 5005 nội bộ
-    socketio.run(app, host='0.0.0.0', port=5005, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # Server dev trên cổng 5005 nội bộ; production chạy qua common/serve.py (xem Dockerfile)
+    initialize_db()
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('CHAT_PORT', 5005)), allow_unsafe_werkzeug=True)
\ No newline at end of file
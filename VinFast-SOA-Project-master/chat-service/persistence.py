@@ -0,0 +1,188 @@
+# chat-service/persistence.py
+"""Ghi tin nhắn chat xuống DB theo lô (write-behind).
+
+Chế độ CHAT_PERSISTENCE:
+  sync     mỗi tin nhắn một transaction ngay trong handler
+  batched  (mặc định) tin nhắn vào hàng đợi và được ghi theo lô khi đủ CHAT_BATCH_SIZE tin,
+           sau CHAT_FLUSH_INTERVAL_MS, hoặc khi tiến trình dừng. Nếu tiến trình chết đột
+           ngột có thể mất tối đa một lô chưa ghi (tin đã phát nhưng không bao giờ có id thật).
+
+Việc phát tới phòng chat (callback `broadcast`) không chờ DB ở chế độ batched: tin được
+phát ngay khi nhận với `id` null và `client_id` (id tạm do client gửi hoặc server sinh).
+Sau khi lô chứa tin được commit, callback `on_persisted` nhận {order_id, client_id, id} để
+báo id thật (sự kiện message_persisted); Client dùng id này cho con trỏ before/after của
+API lịch sử. Độ trễ từ lúc nhận tới khi có id thật (persist_lag_ms trong stats) tối đa
+khoảng CHAT_FLUSH_INTERVAL_MS cộng thời gian commit một lô; độ trễ phát tin không đổi.
+Ở chế độ sync tin được phát sau khi commit, payload đã có id nên không có message_persisted.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from flask import has_app_context
+
+MODE = os.environ.get("CHAT_PERSISTENCE", "batched")
+BATCH_SIZE = int(os.environ.get("CHAT_BATCH_SIZE", 200))
+FLUSH_INTERVAL = int(os.environ.get("CHAT_FLUSH_INTERVAL_MS", 50)) / 1000
+MAX_QUEUE = int(os.environ.get("CHAT_MAX_QUEUE", 10000))
+
+
+class MessageWriter:
+    """Lưu tin nhắn theo chế độ sync hoặc batched, kèm số liệu hàng đợi và thời gian flush."""
+
+    def __init__(self, app, db, broadcast, on_persisted=None, mode=MODE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        if mode not in ('sync', 'batched'):
+            raise ValueError(f"CHAT_PERSISTENCE không hợp lệ: {mode}")
+        self.app = app
+        self.db = db
+        # broadcast(payload): phát tin tới phòng, đúng một lần mỗi tin
+        # on_persisted({order_id, client_id, id}): báo id thật của tin đã phát trước khi ghi (batched)
+        self.broadcast = broadcast
+        self.on_persisted = on_persisted
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._stats = {
+            'enqueued': 0, 'persisted': 0, 'failed': 0, 'sync_fallbacks': 0,
+            'flushes': 0, 'max_batch': 0, 'flush_ms_total': 0.0, 'flush_ms_max': 0.0,
+            'lag_samples': 0, 'lag_ms_total': 0.0, 'lag_ms_max': 0.0
+        }
+
+    @staticmethod
+    def payload(message):
+        """Payload phát tới phòng: to_dict() kèm client_id (thuộc tính tạm, không lưu DB)."""
+        return dict(message.to_dict(), client_id=getattr(message, 'client_id', None))
+
+    def save(self, message):
+        """Lưu tin nhắn (ORM object chưa gắn session) và phát tới phòng qua `broadcast`."""
+        if self.mode == 'sync':
+            self._write([message])
+            self.broadcast(self.payload(message))
+            return
+        self._ensure_started()
+        # Phát trước khi vào hàng đợi: sau đó object thuộc về luồng ghi, và message_persisted
+        # của tin (phát từ luồng ghi) luôn đến sau receive_message
+        self.broadcast(self.payload(message))
+        message.received_at = time.perf_counter()
+        try:
+            self._queue.put_nowait(message)
+            self._count('enqueued')
+        except queue.Full:
+            # Hàng đợi đầy (DB chậm): ghi ngay để tạo áp lực ngược thay vì bỏ tin nhắn
+            self._count('sync_fallbacks')
+            self._write([message], notify=True)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _next_batch(self):
+        """Chờ tin đầu tiên, rồi gom thêm tới khi đủ lô hoặc hết thời gian chờ flush."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch, notify=True)
+
+    def _write(self, messages, notify=False):
+        """Ghi một lô trong một transaction (dùng app context của request nếu có)."""
+        if has_app_context():
+            return self._commit(messages, notify)
+        with self.app.app_context():
+            return self._commit(messages, notify)
+
+    def _commit(self, messages, notify):
+        started = time.perf_counter()
+        persisted = []
+        try:
+            self.db.session.add_all(messages)
+            if notify:
+                # flush để DB cấp id, đọc trước commit (sau commit object bị expire, đọc lại tốn 1 query/tin)
+                self.db.session.flush()
+                persisted = [{'order_id': m.order_id, 'client_id': getattr(m, 'client_id', None), 'id': m.id}
+                             for m in messages]
+            self.db.session.commit()
+            ok = True
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"❌ Lỗi ghi {len(messages)} tin nhắn: {str(e)}")
+            ok = False
+        finished = time.perf_counter()
+        elapsed_ms = (finished - started) * 1000
+        lags_ms = [(finished - m.received_at) * 1000 for m in messages if hasattr(m, 'received_at')] if ok else []
+        with self._lock:
+            self._stats['persisted' if ok else 'failed'] += len(messages)
+            self._stats['flushes'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(messages))
+            self._stats['flush_ms_total'] += elapsed_ms
+            self._stats['flush_ms_max'] = max(self._stats['flush_ms_max'], elapsed_ms)
+            self._stats['lag_samples'] += len(lags_ms)
+            self._stats['lag_ms_total'] += sum(lags_ms)
+            self._stats['lag_ms_max'] = max([self._stats['lag_ms_max']] + lags_ms)
+        if ok and self.on_persisted is not None:
+            for notice in persisted:
+                try:
+                    self.on_persisted(notice)
+                except Exception as e:
+                    print(f"❌ Lỗi báo id tin nhắn {notice['id']}: {str(e)}")
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def close(self, timeout=10):
+        """Dừng nhận việc và ghi nốt các tin còn trong hàng đợi."""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def collect(self):
+        """Số liệu hàng đợi ghi cho /metrics (common/metrics.py)."""
+        stats = self.stats()
+        samples = [('chat_messages_total', 'counter', (('result', key),), stats[key])
+                   for key in ('enqueued', 'persisted', 'failed', 'sync_fallbacks')]
+        samples += [
+            ('chat_writer_flushes_total', 'counter', (), stats['flushes']),
+            ('chat_writer_queue_depth', 'gauge', (), stats['queue_depth']),
+            ('chat_writer_flush_ms_max', 'gauge', (), stats['flush_ms_max']),
+            ('chat_writer_persist_lag_ms_max', 'gauge', (), stats['persist_lag_ms_max'])
+        ]
+        return samples
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total_ms = stats.pop('flush_ms_total')
+        stats['flush_ms_avg'] = round(total_ms / stats['flushes'], 2) if stats['flushes'] else 0.0
+        stats['flush_ms_max'] = round(stats['flush_ms_max'], 2)
+        # Độ trễ từ lúc nhận tới khi tin có id thật trong DB (chỉ tin đi qua hàng đợi)
+        lag_total, samples = stats.pop('lag_ms_total'), stats.pop('lag_samples')
+        stats['persist_lag_ms_avg'] = round(lag_total / samples, 2) if samples else 0.0
+        stats['persist_lag_ms_max'] = round(stats.pop('lag_ms_max'), 2)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['mode'] = self.mode
+        return stats
@@ -0,0 +1,2 @@
+# common/__init__.py
+"""Mã dùng chung cho các service (được copy vào từng image Docker)."""
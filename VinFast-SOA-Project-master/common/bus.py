@@ -0,0 +1,223 @@
+# common/bus.py
+"""Message bus dùng chung giữa Gateway và Chat Service cho chat real-time.
+
+Các kiểu kênh:
+  - Phòng chat (pub/sub): `room_channel(order_id)`. Chat Service publish tin đã lưu,
+    mỗi worker Gateway chỉ subscribe các phòng đang có client kết nối tới chính nó.
+  - Hàng đợi tin gửi lên (work queue): INBOUND_QUEUE. Gateway đẩy tin client gửi,
+    mỗi tin chỉ được đúng một worker Chat Service lấy ra xử lý (không lưu trùng).
+  - Xóa cache Gateway (pub/sub): CACHE_INVALIDATION_CHANNEL. Worker vừa chuyển một request
+    ghi publish tiền tố cache cần xóa, mọi worker Gateway (cache riêng từng tiến trình) cùng xóa.
+
+MESSAGE_BUS_URL:
+  redis://host:6379/0  dùng Redis (nhiều tiến trình/máy)
+  memory://            bus trong tiến trình (chạy thử, benchmark, Gateway + Chat cùng process).
+                       Đẩy tin vào hàng đợi chưa có ai consume trong tiến trình sẽ báo
+                       BusUnavailable thay vì để tin nằm trong hàng đợi không ai đọc.
+
+Mất kết nối Redis được xử lý ở luồng nền với backoff lũy thừa có jitter, không chặn
+request: sau khi kết nối lại, các phòng đang theo dõi được subscribe lại.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+MESSAGE_BUS_URL = os.environ.get("MESSAGE_BUS_URL", "memory://")
+INBOUND_QUEUE = "chat:inbound"
+CACHE_INVALIDATION_CHANNEL = "gateway:cache:invalidate"
+
+# Backoff khi kết nối lại (giây)
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30
+
+
+class BusUnavailable(Exception):
+    """Bus không chuyển được tin tới nơi xử lý."""
+
+
+def room_channel(order_id):
+    return f"chat:room:{order_id}"
+
+
+def backoff_delays(minimum=RECONNECT_MIN_DELAY, maximum=RECONNECT_MAX_DELAY):
+    """Dãy thời gian chờ tăng gấp đôi (full jitter) để các worker không kết nối lại cùng lúc."""
+    delay = minimum
+    while True:
+        yield random.uniform(minimum, delay)
+        delay = min(delay * 2, maximum)
+
+
+class LocalBus:
+    """Bus trong tiến trình: handler được gọi ngay trong luồng publish."""
+
+    def __init__(self):
+        self._handlers = {}
+        self._queues = {}
+        self._consumers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            handler(channel, message)
+
+    def subscribe(self, channel, handler):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+
+    def unsubscribe(self, channel, handler):
+        with self._lock:
+            handlers = self._handlers.get(channel, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._handlers.pop(channel, None)
+
+    def _queue(self, name):
+        with self._lock:
+            return self._queues.setdefault(name, queue.Queue())
+
+    def push(self, name, message):
+        # Tiến trình khác (vd. Chat Service chạy riêng) không đọc được hàng đợi trong bộ nhớ
+        with self._lock:
+            if name not in self._consumers:
+                raise BusUnavailable(f"Không có tiến trình nào xử lý hàng đợi {name} (MESSAGE_BUS_URL=memory://)")
+        self._queue(name).put(message)
+
+    def consume(self, name, handler):
+        """Chạy luồng nền lấy tin từ hàng đợi `name` và gọi handler(message)."""
+        work = self._queue(name)
+        with self._lock:
+            self._consumers.add(name)
+
+        def run():
+            while True:
+                message = work.get()
+                try:
+                    handler(message)
+                except Exception as e:
+                    print(f"❌ Lỗi xử lý tin từ {name}: {str(e)}")
+
+        threading.Thread(target=run, name=f"bus-consume-{name}", daemon=True).start()
+
+
+class RedisBus:
+    """Bus qua Redis: PUBLISH/SUBSCRIBE cho phòng chat, LPUSH/BRPOP cho hàng đợi."""
+
+    def __init__(self, url):
+        import redis
+        self._errors = (redis.ConnectionError, redis.TimeoutError)
+        self._redis = redis.Redis.from_url(url, socket_keepalive=True, health_check_interval=30)
+        self._handlers = {}
+        # Thay đổi subscribe chờ luồng listener áp dụng (PubSub chỉ dùng trong một luồng)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, json.dumps(message))
+
+    def push(self, name, message):
+        self._redis.lpush(name, json.dumps(message))
+
+    def subscribe(self, channel, handler):
+        with self._lock:
+            handlers = self._handlers.setdefault(channel, [])
+            if not handlers:
+                self._pending.append(('subscribe', channel))
+            handlers.append(handler)
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='bus-listener', daemon=True)
+                self._listener.start()
+
+    def unsubscribe(self, channel, handler):
+        with self._lock:
+            handlers = self._handlers.get(channel, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers and channel in self._handlers:
+                del self._handlers[channel]
+                self._pending.append(('unsubscribe', channel))
+
+    def _dispatch(self, message):
+        channel = message['channel'].decode()
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        payload = json.loads(message['data'])
+        for handler in handlers:
+            try:
+                handler(channel, payload)
+            except Exception as e:
+                print(f"❌ Lỗi xử lý tin trên {channel}: {str(e)}")
+
+    def _listen(self):
+        delays = backoff_delays()
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                with self._lock:
+                    channels = list(self._handlers)
+                    self._pending = []
+                if channels:
+                    pubsub.subscribe(*channels)
+                delays = backoff_delays()
+                while True:
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for action, channel in pending:
+                        getattr(pubsub, action)(channel)
+                    if not pubsub.subscribed:
+                        time.sleep(0.05)
+                        continue
+                    message = pubsub.get_message(timeout=0.05)
+                    if message and message['type'] == 'message':
+                        self._dispatch(message)
+            except self._errors as e:
+                delay = next(delays)
+                print(f"⚠️ Mất kết nối message bus ({str(e)}), thử lại sau {delay:.1f}s")
+                time.sleep(delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def consume(self, name, handler):
+        """Chạy luồng nền lấy tin từ hàng đợi `name` (BRPOP) và gọi handler(message)."""
+
+        def run():
+            delays = backoff_delays()
+            while True:
+                try:
+                    item = self._redis.brpop(name, timeout=1)
+                    delays = backoff_delays()
+                except self._errors as e:
+                    delay = next(delays)
+                    print(f"⚠️ Mất kết nối message bus ({str(e)}), thử lại sau {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                if item is None:
+                    continue
+                try:
+                    handler(json.loads(item[1]))
+                except Exception as e:
+                    print(f"❌ Lỗi xử lý tin từ {name}: {str(e)}")
+
+        threading.Thread(target=run, name=f"bus-consume-{name}", daemon=True).start()
+
+
+_local_bus = LocalBus()
+
+
+def create_bus(url=MESSAGE_BUS_URL):
+    """Tạo bus theo URL; memory:// dùng chung một LocalBus trong tiến trình."""
+    if url.startswith('memory://'):
+        return _local_bus
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBus(url)
+    raise ValueError(f"MESSAGE_BUS_URL không hỗ trợ: {url}")
@@ -0,0 +1,76 @@
+# common/db.py
+"""Cấu hình kết nối DB dùng chung cho mọi service (Flask-SQLAlchemy).
+
+SQLite (mặc định): bật WAL để người đọc không chặn người ghi, synchronous=NORMAL
+(an toàn với WAL, bớt fsync mỗi commit), chờ khóa thay vì báo "database is locked"
+ngay lập tức, và mmap để đọc không cần copy qua buffer của SQLite.
+DB khác (DATABASE_URL=postgresql://...): cấu hình pool, pre-ping và recycle.
+
+Biến môi trường:
+  SQLITE_JOURNAL_MODE (WAL), SQLITE_SYNCHRONOUS (NORMAL), SQLITE_BUSY_TIMEOUT_MS (5000),
+  SQLITE_MMAP_SIZE (256MB), SQLITE_CACHE_SIZE_KB (20000)
+  DB_POOL_SIZE (10), DB_MAX_OVERFLOW (20), DB_POOL_TIMEOUT (10), DB_POOL_RECYCLE (1800)
+"""
+
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 20000))
+
+
+def is_sqlite(database_uri):
+    return database_uri.startswith("sqlite")
+
+
+def engine_options(database_uri):
+    """Tham số create_engine phù hợp với loại DB."""
+    if is_sqlite(database_uri):
+        # timeout của pysqlite chính là busy timeout: chờ khóa ghi thay vì lỗi ngay
+        return {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        # Kiểm tra kết nối trước khi dùng để bỏ kết nối đã bị DB/proxy đóng
+        "pool_pre_ping": True
+    }
+
+
+def sqlite_pragmas():
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY"
+    ]
+
+
+def tune_sqlite_connection(dbapi_connection, connection_record):
+    """Áp dụng PRAGMA cho mỗi kết nối SQLite mới (PRAGMA chỉ có hiệu lực trên kết nối đó)."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def configure_database(app, default_uri):
+    """Đặt DATABASE_URL (hoặc `default_uri`) và engine options cho app, trước khi khởi tạo SQLAlchemy."""
+    database_uri = os.environ.get("DATABASE_URL", default_uri)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+    if is_sqlite(database_uri) and not event.contains(Engine, "connect", tune_sqlite_connection):
+        event.listen(Engine, "connect", tune_sqlite_connection)
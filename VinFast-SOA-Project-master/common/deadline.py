@@ -0,0 +1,149 @@
+# common/deadline.py
+"""Lan truyền deadline của request qua các service (Gateway -> Order -> Catalog/Chat).
+
+Gateway đặt header X-Deadline-Ms = số ms còn lại của ngân sách route (timeout trong
+routes.json). Mỗi service đọc header khi nhận request, đổi thành mốc thời gian cục bộ
+(time.monotonic, không phụ thuộc đồng hồ giữa các máy), và:
+  - trả 504 ngay nếu request đến nơi đã hết hạn,
+  - gọi service khác với timeout = min(timeout mặc định, thời gian còn lại) và header
+    X-Deadline-Ms đã trừ phần đã dùng,
+  - dừng sớm (check_deadline) trước các bước tốn kém khi Client đã thôi chờ.
+Số request bị hủy vì hết deadline được đếm theo từng bước, xem /metrics/deadlines
+(và deadline_cancelled_total trong /metrics).
+"""
+
+import threading
+import time
+from flask import g, has_request_context, jsonify, request
+from common import metrics
+
+DEADLINE_HEADER = 'X-Deadline-Ms'
+
+
+class DeadlineExceeded(Exception):
+    """Hết deadline trước/trong bước `stage`: dừng xử lý, trả 504."""
+
+    def __init__(self, stage):
+        super().__init__(f"Hết thời gian xử lý yêu cầu ({stage})")
+        self.stage = stage
+
+
+class Deadline:
+    """Mốc hết hạn của một request theo đồng hồ monotonic của tiến trình."""
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds):
+        return cls(time.monotonic() + seconds)
+
+    @classmethod
+    def from_header(cls, value):
+        """Đọc X-Deadline-Ms; header thiếu hoặc sai định dạng thì không có deadline (None)."""
+        try:
+            return cls.after(int(value) / 1000) if value is not None else None
+        except ValueError:
+            return None
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, default=None, stage='outbound'):
+        """Timeout cho lời gọi ra ngoài: không vượt quá thời gian còn lại."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return min(default, remaining) if default else remaining
+
+    def header_value(self):
+        return str(max(int(self.remaining() * 1000), 0))
+
+    def earliest(self, other):
+        """Deadline nào đến trước (other có thể là None)."""
+        return self if other is None or self.expires_at <= other.expires_at else other
+
+
+class DeadlineStats:
+    """Đếm request có deadline và số việc bị hủy vì hết hạn, theo từng bước."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._with_deadline = 0
+        self._cancelled = {}
+
+    def received(self):
+        with self._lock:
+            self._with_deadline += 1
+
+    def cancelled(self, stage):
+        with self._lock:
+            self._cancelled[stage] = self._cancelled.get(stage, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'requests_with_deadline': self._with_deadline,
+                    'cancelled_total': sum(self._cancelled.values()),
+                    'cancelled': dict(self._cancelled)}
+
+    def collect(self):
+        """Số liệu cho /metrics (common/metrics.py)."""
+        snapshot = self.snapshot()
+        samples = [('deadline_requests_total', 'counter', (), snapshot['requests_with_deadline'])]
+        samples += [('deadline_cancelled_total', 'counter', (('stage', stage),), count)
+                    for stage, count in snapshot['cancelled'].items()]
+        return samples
+
+
+stats = DeadlineStats()
+metrics.register_collector(stats.collect)
+
+
+def current_deadline():
+    """Deadline của request đang xử lý (None nếu Client/Gateway không gửi)."""
+    return g.get('deadline') if has_request_context() else None
+
+
+def check_deadline(stage):
+    """Ném DeadlineExceeded nếu request hiện tại đã hết hạn."""
+    deadline = current_deadline()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(stage)
+
+
+def outbound_timeout(default, stage='outbound'):
+    """Timeout (giây) cho lời gọi sang service khác, thu nhỏ theo deadline còn lại."""
+    deadline = current_deadline()
+    return deadline.timeout(default, stage) if deadline is not None else default
+
+
+def outbound_headers(headers=None):
+    """Header cho lời gọi sang service khác, kèm X-Deadline-Ms đã trừ thời gian đã dùng."""
+    headers = dict(headers or {})
+    deadline = current_deadline()
+    if deadline is not None:
+        headers[DEADLINE_HEADER] = deadline.header_value()
+    return headers
+
+
+def deadline_response(error):
+    stats.cancelled(error.stage)
+    return jsonify({"message": str(error)}), 504
+
+
+def init_app(app):
+    """Đọc deadline ở đầu mỗi request, trả 504 cho DeadlineExceeded và mở /metrics/deadlines."""
+
+    @app.before_request
+    def read_deadline():
+        g.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+        if g.deadline is not None:
+            stats.received()
+            if g.deadline.expired():
+                return deadline_response(DeadlineExceeded('arrival'))
+
+    app.register_error_handler(DeadlineExceeded, deadline_response)
+    app.add_url_rule('/metrics/deadlines', 'deadline_metrics', lambda: (jsonify(stats.snapshot()), 200))
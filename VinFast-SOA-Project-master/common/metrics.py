@@ -0,0 +1,251 @@
+# common/metrics.py
+"""Số liệu độ trễ/thông lượng dùng chung cho mọi service, xuất tại GET /metrics.
+
+Định dạng text của Prometheus (không cần thư viện ngoài):
+  http_request_duration_seconds   histogram theo route (rule của Flask), method, status
+  http_requests_in_flight         số request đang xử lý
+  db_query_duration_seconds       histogram thời gian mỗi câu SQL (qua SQLAlchemy)
+  db_queries_per_request          histogram số câu SQL mỗi request
+  upstream_request_duration_seconds  lời gọi từ Gateway tới service nội bộ (upstream, outcome)
+  socketio_events_total           số sự kiện Socket.IO (event, direction); tốc độ = rate()
+và các số liệu riêng của từng service (collector), ví dụ hàng đợi ghi chat, breaker.
+
+Mỗi phản hồi có header Server-Timing (`<service>;dur=`, `<service>-db;dur=`,
+`<service>-upstream;dur=`), Gateway ghép thêm Server-Timing của service phía sau.
+Mỗi worker gunicorn giữ số liệu riêng (label `worker` = pid).
+
+METRICS_ENABLED=0: không gắn hook nào, không có /metrics, các hàm ghi số liệu trả về ngay.
+"""
+
+import bisect
+import os
+import threading
+import time
+from flask import Response, g, has_request_context, request
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Biên các bucket (giây) của histogram thời gian
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    'http_request_duration_seconds': 'Thời gian xử lý request HTTP',
+    'http_requests_in_flight': 'Số request HTTP đang xử lý',
+    'db_query_duration_seconds': 'Thời gian thực thi mỗi câu SQL',
+    'db_queries_per_request': 'Số câu SQL trong một request HTTP',
+    'upstream_request_duration_seconds': 'Thời gian gọi service nội bộ từ Gateway',
+    'socketio_events_total': 'Số sự kiện Socket.IO nhận/gửi'
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class Registry:
+    """Kho số liệu của tiến trình; labels là tuple các cặp (tên, giá trị)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+        self.constant_labels = ()
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add(self, name, labels=(), delta=1):
+        """Cộng/trừ một gauge (ví dụ số request đang xử lý)."""
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def register_collector(self, collect):
+        """collect() trả về các bộ (tên, 'counter'|'gauge', labels, giá trị), gọi khi xuất /metrics."""
+        self._collectors.append(collect)
+
+    def _samples(self):
+        with self._lock:
+            histograms = [(k, list(h.buckets), list(h.counts), h.sum, h.count)
+                          for k, h in self._histograms.items()]
+            scalars = [(name, 'counter', labels, v) for (name, labels), v in self._counters.items()]
+            scalars += [(name, 'gauge', labels, v) for (name, labels), v in self._gauges.items()]
+        for collect in self._collectors:
+            try:
+                scalars.extend(collect())
+            except Exception as e:
+                print(f"❌ Lỗi thu thập số liệu: {str(e)}")
+        return histograms, scalars
+
+    def render(self):
+        """Xuất toàn bộ số liệu theo định dạng text của Prometheus."""
+        histograms, scalars = self._samples()
+        base = self.constant_labels + (('worker', os.getpid()),)
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), buckets, counts, total, count in sorted(histograms, key=lambda h: str(h[0])):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(base + labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(base + labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(base + labels)} {count}")
+        for name, kind, labels, value in sorted(scalars, key=lambda s: (s[0], str(s[2]))):
+            header(name, kind)
+            lines.append(f"{name}{_format_labels(base + tuple(labels))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_service = 'app'
+
+
+def register_collector(collect):
+    if ENABLED:
+        registry.register_collector(collect)
+
+
+def record_event(event, direction='in'):
+    """Đếm một sự kiện Socket.IO (direction: in = Client gửi lên, out = server phát đi)."""
+    if ENABLED:
+        registry.inc('socketio_events_total', (('event', event), ('direction', direction)))
+
+
+def observe_upstream(service, outcome, seconds):
+    """Ghi một lời gọi từ Gateway tới service nội bộ (outcome: mã HTTP hoặc 'error')."""
+    if not ENABLED:
+        return
+    registry.observe('upstream_request_duration_seconds', (('upstream', service), ('outcome', str(outcome))), seconds)
+    timing = g.get('metrics') if has_request_context() else None
+    if timing is not None:
+        timing['upstream'] += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    registry.observe('db_query_duration_seconds', (), elapsed)
+    timing = g.get('metrics') if has_request_context() else None
+    if timing is not None:
+        timing['db_count'] += 1
+        timing['db_time'] += elapsed
+
+
+def _handle_db_error(exception_context):
+    # Câu SQL lỗi không qua after_cursor_execute: bỏ mốc bắt đầu của nó
+    starts = exception_context.connection.info.get('metrics_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _install_db_hooks():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_db_error)
+
+
+def server_timing(timing, elapsed):
+    parts = [f"{_service};dur={elapsed * 1000:.1f}"]
+    if timing['db_count']:
+        parts.append(f'{_service}-db;dur={timing["db_time"] * 1000:.1f};desc="{timing["db_count"]} queries"')
+    if timing['upstream']:
+        parts.append(f"{_service}-upstream;dur={timing['upstream'] * 1000:.1f}")
+    return ', '.join(parts)
+
+
+def set_service(service):
+    """Tên service gắn vào mọi số liệu (label `service`) và Server-Timing."""
+    global _service
+    _service = service
+    registry.constant_labels = (('service', service),)
+
+
+def render():
+    return registry.render()
+
+
+def init_app(app, service):
+    """Gắn hook đo request/DB và route /metrics; gọi ngay sau khi tạo app (trước các before_request khác)."""
+    if not ENABLED:
+        return
+    set_service(service)
+    _install_db_hooks()
+
+    @app.before_request
+    def start_timer():
+        g.metrics = {'start': time.perf_counter(), 'db_count': 0, 'db_time': 0.0, 'upstream': 0.0}
+        registry.add('http_requests_in_flight')
+
+    @app.after_request
+    def record_request(response):
+        timing = g.get('metrics')
+        if timing is None:
+            return response
+        elapsed = time.perf_counter() - timing['start']
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = (('route', route), ('method', request.method), ('status', response.status_code))
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('db_queries_per_request', (('route', route),), timing['db_count'], COUNT_BUCKETS)
+        # Giữ Server-Timing của service phía sau (Gateway chuyển nguyên header về)
+        upstream = response.headers.get('Server-Timing')
+        ours = server_timing(timing, elapsed)
+        response.headers['Server-Timing'] = f"{ours}, {upstream}" if upstream else ours
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.get('metrics') is not None:
+            registry.add('http_requests_in_flight', delta=-1)
+
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(render(), mimetype='text/plain; version=0.0.4'))
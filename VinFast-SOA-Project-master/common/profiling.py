@@ -0,0 +1,312 @@
+# common/profiling.py
+"""Profile theo yêu cầu cho từng request, dùng chung cho các Flask app.
+
+Bật cho một request bằng header `X-Profile: <PROFILING_TOKEN>` (Gateway chuyển tiếp
+header này nên một lượt gọi qua Gateway được profile ở mọi service), hoặc ngẫu nhiên
+theo PROFILE_SAMPLE_RATE (0..1). Mỗi profile gồm:
+  - sample: lấy mẫu call stack của luồng xử lý request mỗi PROFILE_INTERVAL_MS ms,
+    xuất dạng collapsed stack (flamegraph.pl, speedscope, inferno đọc trực tiếp);
+  - cprofile: profile tất định bằng cProfile, tải file .prof cho snakeviz/flameprof.
+    Dùng mặc định cho worker eventlet (Chat, Gateway) vì luồng lấy mẫu là green thread;
+  - nhật ký SQL: từng câu lệnh và thời gian (không lưu tham số vì có thể chứa dữ liệu cá nhân).
+Chọn chế độ bằng header `X-Profile-Mode: sample|cprofile`.
+
+Kết quả lưu thành file trong PROFILE_DIR (dùng chung giữa các worker, giữ tối đa
+PROFILE_MAX_STORED bản mới nhất). Phản hồi có header X-Profile-Id (`<service>:<id>`).
+Xem lại (cần header X-Profile-Token: <PROFILING_TOKEN>):
+  GET /debug/profiles                   danh sách profile
+  GET /debug/profiles/<id>              chi tiết (JSON: SQL, top hàm, ...)
+  GET /debug/profiles/<id>/collapsed    collapsed stack cho flame graph
+  GET /debug/profiles/<id>/pstats       file .prof của cProfile
+Không đặt PROFILING_TOKEN thì header X-Profile và các endpoint trên bị tắt.
+"""
+
+import cProfile
+import glob
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import Response, abort, g, has_request_context, jsonify, request, send_file
+
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+MAX_STORED = int(os.environ.get("PROFILE_MAX_STORED", 50))
+MAX_SQL_STATEMENTS = 500
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_MODE_HEADER = 'X-Profile-Mode'
+TOKEN_HEADER = 'X-Profile-Token'
+# Endpoint không tự profile chính nó
+SKIP_PREFIXES = ('/debug/profiles', '/metrics', '/health')
+
+
+def _green_threads():
+    """Worker đang chạy eventlet (thread đã bị monkey-patch)?"""
+    try:
+        from eventlet import patcher
+        return patcher.is_monkey_patched('thread')
+    except ImportError:
+        return False
+
+
+def _frame_label(code):
+    """Tên hàm kèm file rút gọn (bỏ đường dẫn tới site-packages/thư mục service)."""
+    path = code.co_filename
+    if 'site-packages' + os.sep in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    else:
+        path = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Luồng nền đọc call stack của một luồng khác theo chu kỳ, đếm theo collapsed stack."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    """Lưu profile thành file JSON (kèm .prof) trong một thư mục, xoay vòng theo số lượng."""
+
+    def __init__(self, directory, max_stored=MAX_STORED):
+        self.directory = directory
+        self.max_stored = max_stored
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, profile_id, ext):
+        # id do store sinh ra (hex); chặn đường dẫn lạ từ URL
+        if not profile_id.isalnum():
+            abort(404)
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, record, profiler=None):
+        if profiler is not None:
+            profiler.dump_stats(self.path(record['id'], 'prof'))
+        with open(self.path(record['id'], 'json'), 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        self._rotate()
+
+    def _rotate(self):
+        files = sorted(glob.glob(os.path.join(self.directory, '*.json')), key=os.path.getmtime)
+        for old in files[:max(len(files) - self.max_stored, 0)]:
+            for companion in (old, old[:-len('json')] + 'prof'):
+                try:
+                    os.remove(companion)
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id):
+        try:
+            with open(self.path(profile_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            abort(404)
+
+    def list(self):
+        files = sorted(glob.glob(os.path.join(self.directory, '*.json')), key=os.path.getmtime, reverse=True)
+        summaries = []
+        for path in files:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({k: record.get(k) for k in
+                              ('id', 'method', 'path', 'status', 'duration_ms', 'mode', 'sql_count', 'started_at')})
+        return summaries
+
+
+def _top_functions(profiler, limit=30):
+    """Các hàm tốn thời gian nhất (cumulative) từ cProfile."""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (cc, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({'function': f"{name} ({os.path.basename(filename)}:{line})", 'calls': ncalls,
+                     'tottime_ms': round(tottime * 1000, 3), 'cumtime_ms': round(cumtime * 1000, 3)})
+    rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    session = g.get('profile') if has_request_context() else None
+    if session is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    session = g.get('profile') if has_request_context() else None
+    starts = conn.info.get('profile_query_start')
+    if session is None or not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    session['sql_ms'] += elapsed_ms
+    session['sql_count'] += 1
+    if len(session['sql']) < MAX_SQL_STATEMENTS:
+        session['sql'].append({'statement': statement, 'executemany': executemany,
+                               'duration_ms': round(elapsed_ms, 3)})
+
+
+def _handle_db_error(exception_context):
+    starts = exception_context.connection.info.get('profile_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _install_db_hooks():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_db_error)
+
+
+def _token_matches(value):
+    return bool(PROFILING_TOKEN) and value is not None and hmac.compare_digest(value, PROFILING_TOKEN)
+
+
+def _wanted():
+    """Request hiện tại có cần profile không (header đặc quyền hoặc lấy mẫu ngẫu nhiên)."""
+    if request.path.startswith(SKIP_PREFIXES):
+        return False
+    if _token_matches(request.headers.get(PROFILE_HEADER)):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def init_app(app, service):
+    """Gắn hook profile và các endpoint /debug/profiles cho app."""
+    if not PROFILING_TOKEN and SAMPLE_RATE <= 0:
+        return
+    store = ProfileStore(os.environ.get("PROFILE_DIR",
+                                        os.path.join(tempfile.gettempdir(), 'vinfast-profiles', service)))
+    default_mode = 'cprofile' if _green_threads() else 'sample'
+    _install_db_hooks()
+
+    @app.before_request
+    def start_profile():
+        if not _wanted():
+            return
+        mode = request.headers.get(PROFILE_MODE_HEADER, default_mode)
+        if mode not in ('sample', 'cprofile') or (mode == 'sample' and _green_threads()):
+            mode = default_mode
+        session = {'mode': mode, 'start': time.perf_counter(), 'sql': [], 'sql_count': 0, 'sql_ms': 0.0,
+                   'started_at': datetime.now(timezone.utc).isoformat()}
+        if mode == 'cprofile':
+            session['profiler'] = cProfile.Profile()
+            session['profiler'].enable()
+        else:
+            session['sampler'] = StackSampler(threading.get_ident())
+            session['sampler'].start()
+        g.profile = session
+
+    def stop(session):
+        if session.get('profiler') is not None:
+            session['profiler'].disable()
+        if session.get('sampler') is not None:
+            session['sampler'].stop()
+        session['stopped'] = True
+
+    @app.after_request
+    def finish_profile(response):
+        session = g.get('profile')
+        if session is None or session.get('stopped'):
+            return response
+        stop(session)
+        record = {
+            'id': uuid.uuid4().hex[:16], 'service': service, 'worker': os.getpid(),
+            'method': request.method, 'path': request.path, 'query': request.query_string.decode(),
+            'status': response.status_code, 'started_at': session['started_at'],
+            'duration_ms': round((time.perf_counter() - session['start']) * 1000, 3), 'mode': session['mode'],
+            'sql_count': session['sql_count'], 'sql_ms': round(session['sql_ms'], 3), 'sql': session['sql']
+        }
+        if session['mode'] == 'cprofile':
+            record['top'] = _top_functions(session['profiler'])
+        else:
+            sampler = session['sampler']
+            record.update(interval_ms=sampler.interval * 1000, samples=sampler.samples, stacks=sampler.stacks)
+        try:
+            store.save(record, session.get('profiler'))
+        except OSError as e:
+            print(f"❌ Không lưu được profile: {str(e)}")
+            return response
+        # Giữ X-Profile-Id của service phía sau (Gateway chuyển nguyên header về)
+        ours = f"{service}:{record['id']}"
+        upstream = response.headers.get('X-Profile-Id')
+        response.headers['X-Profile-Id'] = f"{ours}, {upstream}" if upstream else ours
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        session = g.get('profile')
+        if session is not None and not session.get('stopped'):
+            stop(session)
+
+    def require_token():
+        if not _token_matches(request.headers.get(TOKEN_HEADER)):
+            abort(403)
+
+    def list_profiles():
+        require_token()
+        return jsonify(store.list()), 200
+
+    def get_profile(profile_id):
+        require_token()
+        return jsonify(store.load(profile_id)), 200
+
+    def get_collapsed(profile_id):
+        require_token()
+        stacks = store.load(profile_id).get('stacks')
+        if stacks is None:
+            return jsonify({"message": "Profile cProfile không có collapsed stack, dùng /pstats"}), 404
+        body = ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+        return Response(body, mimetype='text/plain')
+
+    def get_pstats(profile_id):
+        require_token()
+        path = store.path(profile_id, 'prof')
+        if not os.path.exists(path):
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{service}-{profile_id}.prof")
+
+    app.add_url_rule('/debug/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/debug/profiles/<profile_id>', 'get_profile', get_profile)
+    app.add_url_rule('/debug/profiles/<profile_id>/collapsed', 'get_profile_collapsed', get_collapsed)
+    app.add_url_rule('/debug/profiles/<profile_id>/pstats', 'get_profile_pstats', get_pstats)
@@ -0,0 +1,128 @@
+# common/serve.py
+"""Launcher production dùng chung: chạy một Flask app dưới gunicorn với nhiều worker.
+
+Thay cho server dev của Werkzeug (`app.run(debug=True)`), vốn chỉ có một tiến trình.
+
+Chạy (trong container, hoặc từ thư mục gốc dự án kèm --chdir):
+    python -m common.serve app:app --chdir user-service --port 5001 --init initialize_db
+    python -m common.serve app:app --chdir chat-service --port 5005 --socketio --init initialize_db
+
+- Số worker: WEB_CONCURRENCY, mặc định bằng số lõi CPU. Service HTTP thường dùng
+  worker gthread (WEB_THREADS luồng mỗi worker). Service Socket.IO dùng worker
+  eventlet; các worker chia sẻ room/emit qua SOCKETIO_MESSAGE_QUEUE (Chat) hoặc
+  MESSAGE_BUS_URL (chat qua Gateway, xem common/bus.py).
+- --init: hàm khởi tạo DB chạy đúng một lần trước khi fork, để các worker không cùng
+  chạy DDL. Service HTTP chạy ở master; service Socket.IO chạy trong một tiến trình con
+  (SERVE_INIT=1) để master không import app trước khi worker eventlet monkey-patch.
+- Preload: app được import một lần ở master rồi fork (SERVE_PRELOAD=1, mặc định cho
+  service HTTP). Service Socket.IO không preload, để eventlet kịp monkey-patch trong
+  từng worker.
+- Reload êm: `kill -HUP <master>` khởi động lại lần lượt từng worker, request đang
+  chạy được phục vụ xong (trong SERVE_GRACEFUL_TIMEOUT giây). Muốn nạp code mới
+  bằng HUP thì đặt SERVE_PRELOAD=0.
+"""
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+from gunicorn.app.base import BaseApplication
+from gunicorn.util import import_app
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def default_workers():
+    return env_int('WEB_CONCURRENCY', os.cpu_count() or 1)
+
+
+def build_options(args):
+    """Cấu hình gunicorn từ tham số dòng lệnh và biến môi trường."""
+    preload = os.environ.get('SERVE_PRELOAD', '0' if args.socketio else '1') == '1'
+    options = {
+        'bind': f"{args.host}:{args.port}",
+        'workers': args.workers or default_workers(),
+        'preload_app': preload,
+        'timeout': env_int('SERVE_TIMEOUT', 60),
+        'graceful_timeout': env_int('SERVE_GRACEFUL_TIMEOUT', 30),
+        'keepalive': env_int('SERVE_KEEPALIVE', 5),
+        # Thay worker định kỳ để tránh rò rỉ bộ nhớ (0 = tắt); jitter để không thay cùng lúc
+        'max_requests': env_int('SERVE_MAX_REQUESTS', 0),
+        'max_requests_jitter': env_int('SERVE_MAX_REQUESTS_JITTER', 100),
+        'accesslog': os.environ.get('SERVE_ACCESS_LOG') or None,
+        'errorlog': '-',
+        'proc_name': args.name or os.path.basename(os.getcwd()),
+    }
+    if args.socketio:
+        options['worker_class'] = 'eventlet'
+        options['worker_connections'] = env_int('WEB_WORKER_CONNECTIONS', 1000)
+    else:
+        options['worker_class'] = 'gthread'
+        options['threads'] = env_int('WEB_THREADS', 4)
+    return options
+
+
+class ServiceApplication(BaseApplication):
+    """Ứng dụng gunicorn nhận cấu hình trực tiếp từ code thay vì file gunicorn.conf."""
+
+    def __init__(self, app_uri, options):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return import_app(self.app_uri)
+
+
+def run_init(app_uri, init, isolated=False):
+    """Chạy hàm khởi tạo (tạo bảng, seed dữ liệu) một lần ở master, rồi đóng kết nối DB
+    để các worker sau khi fork không dùng chung socket của master.
+
+    isolated: chạy trong tiến trình con thay vì master (app không preload). App đọc
+    SERVE_INIT=1 để không khởi động luồng nền (vd. consumer message bus) trong tiến trình đó.
+    """
+    module_name = app_uri.split(':')[0]
+    if isolated:
+        subprocess.run([sys.executable, '-c', f"import {module_name}; {module_name}.{init}()"],
+                       check=True, env=dict(os.environ, SERVE_INIT='1'))
+        return
+    module = importlib.import_module(module_name)
+    getattr(module, init)()
+    db = getattr(module, 'db', None)
+    if db is not None:
+        with module.app.app_context():
+            db.engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('app', help='Đối tượng WSGI dạng module:biến, ví dụ app:app')
+    parser.add_argument('--chdir', help='Thư mục của service (mặc định: thư mục hiện tại)')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=env_int('PORT', 8000))
+    parser.add_argument('--workers', type=int, help='Số worker (mặc định WEB_CONCURRENCY hoặc số lõi CPU)')
+    parser.add_argument('--socketio', action='store_true', help='App có Flask-SocketIO: dùng worker eventlet')
+    parser.add_argument('--init', help='Tên hàm khởi tạo DB trong module app, chạy một lần trước khi fork')
+    parser.add_argument('--name', help='Tên tiến trình hiển thị trong ps/top')
+    args = parser.parse_args(argv)
+
+    if args.chdir:
+        os.chdir(args.chdir)
+    sys.path.insert(0, os.getcwd())
+
+    options = build_options(args)
+    if args.init:
+        run_init(args.app, args.init, isolated=not options['preload_app'])
+    ServiceApplication(args.app, options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,12 @@ try {
         }
     });
 
+    // Gateway từ chối tin nhắn (message bus không khả dụng): báo cho người gửi biết tin chưa đi
+    socket.on('chat_error', (data) => {
+        console.error("Lỗi chat:", data);
+        alert(data.message || "Không gửi được tin nhắn");
+    });
+
 } catch (e) {
     console.error("Socket.IO không thể khởi tạo:", e);
 }
@@ -49,6 +55,23 @@ function getAuthHeader() {
     };
 }
 
+// Tải hết các trang của một API phân trang theo header X-Next-Cursor.
+// `param`: tên tham số nhận con trỏ ('cursor'; lịch sử chat dùng 'before' và trang sau là tin cũ hơn nên `prepend`)
+async function fetchAllPages(url, options = {}, param = 'cursor', prepend = false) {
+    let items = [];
+    let cursor = null;
+    let response;
+    do {
+        const separator = url.includes('?') ? '&' : '?';
+        response = await fetch(cursor ? `${url}${separator}${param}=${encodeURIComponent(cursor)}` : url, options);
+        if (!response.ok) return { response, items };
+        const page = await response.json();
+        items = prepend ? page.concat(items) : items.concat(page);
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return { response, items };
+}
+
 function updateHeaderUI() {
     const authGroup = document.getElementById('auth-group');
     if (!authGroup) return;
@@ -180,12 +203,12 @@ async function openChat(orderId, name) {
     }
     
     try {
-        const res = await fetch(`${BASE_GATEWAY_URL}/chat/api/v1/chat/${cleanOrderId}`, { 
+        // Lịch sử trả theo trang (mới nhất trước): lùi theo `before` tới tin đầu tiên
+        const { response: res, items: messages } = await fetchAllPages(`${BASE_GATEWAY_URL}/chat/api/v1/chat/${cleanOrderId}?limit=200`, { 
             headers: getAuthHeader() 
-        });
+        }, 'before', true);
         
         if (res.ok) {
-            const messages = await res.json();
             chatMessages.innerHTML = ''; 
             if (!messages || messages.length === 0) {
                 chatMessages.innerHTML = '<p class="text-center text-gray-300 text-xs py-4">Chưa có tin nhắn nào.</p>';
@@ -265,8 +288,9 @@ async function loadCustomerOrders() {
     orderTableBody.innerHTML = '<tr><td colspan="4" class="text-center py-10">Đang tải đơn hàng...</td></tr>';
 
     try {
-        const res = await fetch(`${BASE_GATEWAY_URL}/orders/api/v1/orders`, { headers: getAuthHeader() });
-        const orders = await res.json();
+        // API trả theo trang: đi hết các trang để hiển thị mọi đơn của khách
+        const { response: res, items: orders } = await fetchAllPages(`${BASE_GATEWAY_URL}/orders/api/v1/orders?limit=500`, { headers: getAuthHeader() });
+        if (!res.ok) throw new Error("Không thể tải đơn hàng");
 
         if (!orders || orders.length === 0) {
             orderTableBody.innerHTML = '<tr><td colspan="4" class="text-center py-10">Bạn chưa đặt chiếc xe nào.</td></tr>';
@@ -305,37 +329,30 @@ async function loadDashboard() {
     if (!dashboardBody) return;
 
     try {
-        // Lấy danh sách đơn hàng
-        const orderRes = await fetch(`${BASE_GATEWAY_URL}/orders/api/v1/orders`, { headers: getAuthHeader() });
-        const orders = await orderRes.json();
+        // Một lời gọi BFF: đơn hàng đã kèm tên khách/tên xe + thống kê doanh thu (thay cho N lời gọi /users/<id>)
+        // Đơn hàng trả theo trang: đi tiếp theo next_cursor, thống kê lấy từ trang đầu
+        let dashboard = null;
+        const orders = [];
+        let cursor = null;
+        do {
+            const dashboardRes = await fetch(`${BASE_GATEWAY_URL}/bff/admin/dashboard?limit=500${cursor ? `&cursor=${cursor}` : ''}`, { headers: getAuthHeader() });
+            const page = await dashboardRes.json();
+            if (!dashboardRes.ok) throw new Error(page.message || page.error);
+            dashboard = dashboard || page;
+            orders.push(...page.orders);
+            cursor = page.next_cursor;
+        } while (cursor);
 
         // FIX URL CATALOG: Gọi đúng endpoint để Gateway điều hướng chuẩn
-        const carRes = await fetch(`${BASE_GATEWAY_URL}/catalog/catalog/cars`, { headers: getAuthHeader() });
-        const cars = await carRes.json();
-
-        let totalRevenue = 0;
-        let statusCounts = { 'Pending': 0, 'Paid': 0, 'Scheduled': 0, 'Confirmed': 0 };
-
-        const rows = await Promise.all(orders.map(async (order) => {
-            if (['Paid', 'Scheduled', 'Confirmed'].includes(order.status)) {
-                totalRevenue += (order.total_amount || 0);
-            }
-            statusCounts[order.status] = (statusCounts[order.status] || 0) + 1;
+        // Biểu đồ tồn kho chỉ cần tên xe và tồn kho nên yêu cầu đúng các trường này (đi hết các trang)
+        const { items: cars } = await fetchAllPages(`${BASE_GATEWAY_URL}/catalog/catalog/cars?fields=id,model_name,stock_quantity&limit=500`, { headers: getAuthHeader() });
 
-            // Lấy tên khách hàng
-            let userName = `Khách #${order.user_id}`;
-            try {
-                const userRes = await fetch(`${BASE_GATEWAY_URL}/users/api/v1/users/${order.user_id}`, { headers: getAuthHeader() });
-                if (userRes.ok) {
-                    const userData = await userRes.json();
-                    userName = userData.name || userData.username || userName;
-                }
-            } catch (e) {}
+        const totalRevenue = dashboard.summary.revenue || 0;
+        const statusCounts = Object.assign({ 'Pending': 0, 'Paid': 0, 'Scheduled': 0, 'Confirmed': 0 }, dashboard.summary.status_counts);
 
-            // Lấy tên xe từ mảng cars đã fetch (Dùng stock_quantity từ catalog service)
-            let carName = "VinFast EV";
-            const carInfo = cars.find(c => c.id === (order.items?.[0]?.car_model_id));
-            if (carInfo) carName = carInfo.model_name;
+        const rows = orders.map((order) => {
+            const userName = order.user_name;
+            const carName = order.items?.[0]?.model_name || "VinFast EV";
 
             let actionBtn = `<button class="bg-blue-600 text-white px-3 py-1 rounded hover:bg-blue-700 text-xs" onclick="showScheduleForm('${order.id}')">📅 Hẹn lịch</button>`;
             if (order.status === 'Scheduled' || order.status === 'Confirmed') {
@@ -351,7 +368,7 @@ async function loadDashboard() {
                     <td class="px-6 py-4"><span class="status ${order.status}">${order.status}</span></td>
                     <td class="px-6 py-4">${actionBtn}</td>
                 </tr>`;
-        }));
+        });
 
         dashboardBody.innerHTML = rows.join('');
         if (totalRevElem) totalRevElem.textContent = totalRevenue.toLocaleString() + " VND";
@@ -1,22 +1,57 @@
 # order-service/app.py
-from flask import Flask, request, jsonify
-from database import db, Order, OrderItem
 import os
+import sys
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request, jsonify
+from database import db, Order, OrderItem, ensure_schema
+from common import metrics, profiling
+from common.db import configure_database
+from common.deadline import (DeadlineExceeded, check_deadline, deadline_response, outbound_headers,
+                             outbound_timeout, init_app as init_deadlines)
 import requests 
+from datetime import datetime, timedelta
+from sqlalchemy import func
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 
-# Cấu hình Flask và DB
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///order_service.db")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Số liệu độ trễ/DB/in-flight tại /metrics và header Server-Timing (xem common/metrics.py)
+metrics.init_app(app, 'orders')
+# Profile theo yêu cầu (header X-Profile hoặc PROFILE_SAMPLE_RATE), xem common/profiling.py
+profiling.init_app(app, 'orders')
+
+# Cấu hình Flask và DB (WAL, busy timeout, pool... xem common/db.py)
+configure_database(app, "sqlite:///order_service.db")
 db.init_app(app)
 
+# Deadline từ Gateway (X-Deadline-Ms): timeout gọi Catalog/Chat không vượt quá phần còn lại
+init_deadlines(app)
+
 # Cấu hình URL các dịch vụ liên quan từ biến môi trường
 CATALOG_SERVICE_URL = os.environ.get("CATALOG_SERVICE_URL", "http://catalog:5002/api/v1")
 CHAT_SERVICE_URL = os.environ.get("CHAT_SERVICE_URL", "http://chat:5005/api/v1")
 
+# Thời gian Catalog giữ hàng cho đơn chưa thanh toán (giây)
+ORDER_HOLD_SECONDS = int(os.environ.get("ORDER_HOLD_SECONDS", 1800))
+
+# Session keep-alive dùng chung cho các lời gọi sang Catalog Service
+catalog_session = requests.Session()
+
+def release_reservations(reservation_ids):
+    """Bù trừ (compensation): hủy giữ chỗ bên Catalog khi không lưu được đơn hàng.
+
+    Không bị giới hạn bởi deadline của request: bước bù trừ phải chạy kể cả khi Client đã thôi chờ.
+    """
+    try:
+        catalog_session.post(f"{CATALOG_SERVICE_URL}/inventory/reservations/release",
+                             json={"reservation_ids": reservation_ids}, timeout=5)
+    except requests.exceptions.RequestException as e:
+        # Phiếu giữ chỗ vẫn tự hết hạn và hoàn kho bên Catalog
+        print(f"❌ Không thể hủy giữ chỗ {reservation_ids}: {str(e)}")
+
 # --- API 1: TẠO ĐƠN HÀNG (Trạng thái ban đầu: Pending) ---
 @app.route('/api/v1/orders', methods=['POST'])
 def create_order():
@@ -28,52 +63,54 @@ def create_order():
     
     try:
         user_id = int(user_id_raw)
-        items = data.get('items', [])
-        
-        # Bước 1: Tạo đơn với trạng thái Pending
-        new_order = Order(user_id=user_id, status='Pending', total_amount=0)
+    except ValueError:
+        return jsonify({"message": "Yêu cầu phải qua Gateway"}), 401
+
+    items = (data or {}).get('items', [])
+    if not items:
+        return jsonify({"message": "Đơn hàng phải có ít nhất một mẫu xe"}), 400
+
+    # Bước 1: Giữ chỗ toàn bộ giỏ hàng bên Catalog trong MỘT lượt gọi (đủ hàng hoặc không giữ gì).
+    # Chưa mở transaction nào ở DB đơn hàng trong lúc chờ mạng.
+    try:
+        response = catalog_session.post(
+            f"{CATALOG_SERVICE_URL}/inventory/reservations/batch",
+            json={"items": [{"car_id": i.get('car_id'), "quantity": i.get('quantity', 1)} for i in items],
+                  "ttl_seconds": ORDER_HOLD_SECONDS},
+            headers=outbound_headers(),
+            timeout=outbound_timeout(5, 'reserve')
+        )
+    except requests.exceptions.RequestException as e:
+        # Timeout vì hết deadline -> 504 thay vì báo Catalog lỗi
+        check_deadline('reserve')
+        return jsonify({"message": f"Lỗi kết nối Catalog Service: {str(e)}"}), 503
+
+    if response.status_code != 201:
+        try:
+            error_info = response.json().get('message', 'Hết hàng hoặc lỗi Catalog')
+        except ValueError:
+            error_info = 'Hết hàng hoặc lỗi Catalog'
+        return jsonify({"message": f"Thất bại: {error_info}"}), 400
+
+    reservations = response.json()['reservations']
+    reservation_ids = [r['reservation_id'] for r in reservations]
+
+    # Bước 2: Lưu đơn (trạng thái Pending) trong một transaction ngắn
+    try:
+        new_order = Order(user_id=user_id, status='Pending',
+                          total_amount=sum(r['unit_price'] * r['quantity'] for r in reservations))
+        new_order.items = [
+            OrderItem(car_model_id=r['car_id'], quantity=r['quantity'],
+                      unit_price=r['unit_price'], reservation_id=r['reservation_id'])
+            for r in reservations
+        ]
         db.session.add(new_order)
-        db.session.flush() 
-
-        total_confirmed_amount = 0
-        for item_data in items:
-            car_id = item_data.get('car_id')
-            qty = item_data.get('quantity', 1)
-
-            try:
-                # Gọi đồng bộ sang Catalog Service để trừ kho
-                response = requests.post(
-                    f"{CATALOG_SERVICE_URL}/inventory/reduce",
-                    json={"car_id": car_id, "quantity": qty},
-                    timeout=5
-                )
-                
-                if response.status_code != 200:
-                    error_info = response.json().get('message', 'Hết hàng hoặc lỗi Catalog')
-                    db.session.rollback()
-                    return jsonify({"message": f"Thất bại: {error_info}"}), 400
-
-                res_data = response.json()
-                unit_price = res_data.get('unit_price', 0)
-                total_confirmed_amount += unit_price * qty
-                
-                db.session.add(OrderItem(
-                    order_id=new_order.id, 
-                    car_model_id=car_id, 
-                    quantity=qty, 
-                    unit_price=unit_price
-                ))
-            except requests.exceptions.RequestException as e:
-                db.session.rollback()
-                return jsonify({"message": f"Lỗi kết nối Catalog Service: {str(e)}"}), 503
-
-        new_order.total_amount = total_confirmed_amount
         db.session.commit()
-        
         return jsonify(new_order.to_dict()), 201
 
     except Exception as e:
         db.session.rollback()
+        release_reservations(reservation_ids)
         return jsonify({"message": f"Lỗi xử lý đơn hàng: {str(e)}"}), 500
 
 # --- API 2: XÁC NHẬN THANH TOÁN ---
@@ -82,14 +119,36 @@ def process_payment(order_id):
     order = Order.query.get(order_id)
     if not order:
         return jsonify({"message": "Không tìm thấy đơn hàng"}), 404
+
+    payment_result = {"message": "Thanh toán thành công", "status": "Paid", "order_id": order.id}
+    # Thanh toán lặp lại (Client bấm lại/thử lại) không thay đổi gì
+    if order.status == 'Paid':
+        return jsonify(payment_result), 200
+    # Đơn đã hủy (hết hạn giữ xe) hoặc đã xử lý xong: không còn xe được giữ để thanh toán
+    if order.status != 'Pending':
+        return jsonify({"message": f"Đơn hàng đang ở trạng thái {order.status}, không thể thanh toán"}), 409
+
+    # Xác nhận các phiếu giữ chỗ bên Catalog (đơn cũ không có phiếu thì bỏ qua);
+    # chỉ chuyển sang Paid khi Catalog đã xác nhận giữ chỗ thành công
+    reservation_ids = [item.reservation_id for item in order.items if item.reservation_id]
+    if reservation_ids:
+        try:
+            response = catalog_session.post(f"{CATALOG_SERVICE_URL}/inventory/reservations/commit",
+                                            json={"reservation_ids": reservation_ids},
+                                            headers=outbound_headers(), timeout=outbound_timeout(5, 'commit'))
+        except requests.exceptions.RequestException as e:
+            check_deadline('commit')
+            return jsonify({"message": f"Lỗi kết nối Catalog Service: {str(e)}"}), 503
+        if response.status_code == 410:
+            order.status = 'Cancelled'
+            db.session.commit()
+            return jsonify({"message": "Đơn hàng đã hết thời gian giữ xe, vui lòng đặt lại"}), 409
+        if response.status_code != 200:
+            return jsonify({"message": "Không thể xác nhận giữ chỗ bên Catalog"}), 502
     
     order.status = 'Paid'
     db.session.commit()
-    return jsonify({
-        "message": "Thanh toán thành công", 
-        "status": "Paid",
-        "order_id": order.id
-    }), 200
+    return jsonify(payment_result), 200
 
 # --- API 3: ADMIN HẸN LỊCH (Bổ sung logic tích hợp Chat) ---
 @app.route('/api/v1/orders/<int:order_id>/confirm', methods=['PUT'])
@@ -114,11 +173,16 @@ def confirm_order(order_id):
         }
         
         # Gọi POST sang endpoint notify của Chat Service (không cần chờ phản hồi quá lâu)
-        requests.post(f"{CHAT_SERVICE_URL}/chat/system_notify", json=system_msg_payload, timeout=3)
+        requests.post(f"{CHAT_SERVICE_URL}/chat/system_notify", json=system_msg_payload,
+                      headers=outbound_headers(), timeout=outbound_timeout(3, 'notify'))
         
         db.session.commit()
         return jsonify({"message": "Đã xác nhận lịch hẹn và bắn thông báo chat", "status": "Scheduled"}), 200
         
+    except DeadlineExceeded as e:
+        # Client đã thôi chờ: vẫn lưu trạng thái đơn, bỏ qua thông báo chat
+        db.session.commit()
+        return deadline_response(e)
     except Exception as e:
         # Nếu có lỗi khi bắn chat, chúng ta vẫn nên commit trạng thái đơn hàng nhưng báo cảnh báo
         db.session.commit()
@@ -129,28 +193,92 @@ def confirm_order(order_id):
         }), 200
 
 # --- API 4: LẤY DANH SÁCH ĐƠN HÀNG ---
+# Giới hạn số đơn hàng trả về mỗi trang
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def parse_date(value, name):
+    """Đọc ngày dạng ISO (YYYY-MM-DD hoặc đầy đủ giờ), ném ValueError nếu sai định dạng."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Tham số '{name}' phải có dạng YYYY-MM-DD")
+
 @app.route('/api/v1/orders', methods=['GET'])
 def get_all_orders():
+    """Danh sách đơn hàng, mới nhất trước.
+
+    Query params (đều tùy chọn):
+    - limit, cursor: phân trang keyset theo id; trang kế tiếp trả trong header X-Next-Cursor
+    - status: lọc theo trạng thái; date_from, date_to: lọc theo ngày đặt (date_to tính cả ngày đó)
+    """
     user_id = request.headers.get('X-User-Id')
     role = request.headers.get('X-User-Role')
     
     if not user_id:
         return jsonify({"message": "Yêu cầu không hợp lệ hoặc chưa đăng nhập"}), 401
+
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        date_from = parse_date(request.args['date_from'], 'date_from') if request.args.get('date_from') else None
+        date_to = parse_date(request.args['date_to'], 'date_to') if request.args.get('date_to') else None
+    except ValueError as e:
+        return jsonify({"message": f"Tham số không hợp lệ: {str(e)}"}), 400
     
     try:
-        if role == 'admin':
-            # Admin xem toàn bộ
-            orders = Order.query.all()
-        else:
-            # Khách hàng CHỈ lấy đơn hàng của mình
-            orders = Order.query.filter_by(user_id=int(user_id)).all()
-            
-        return jsonify([order.to_dict() for order in orders]), 200
+        query = Order.query
+        if role != 'admin':
+            # Khách hàng CHỈ lấy đơn hàng của mình (Admin xem toàn bộ)
+            query = query.filter(Order.user_id == int(user_id))
+        if request.args.get('status'):
+            query = query.filter(Order.status == request.args['status'])
+        if date_from:
+            query = query.filter(Order.order_date >= date_from)
+        if date_to:
+            if len(request.args['date_to']) == 10:
+                date_to += timedelta(days=1)
+            query = query.filter(Order.order_date < date_to)
+        if cursor is not None:
+            query = query.filter(Order.id < cursor)
+
+        # Items của cả trang được tải bằng 1 query nhờ lazy='selectin'
+        orders = query.order_by(Order.id.desc()).limit(limit + 1).all()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        response = jsonify([order.to_dict() for order in orders])
+        if has_more:
+            response.headers['X-Next-Cursor'] = str(orders[-1].id)
+        return response, 200
     except Exception as e:
         return jsonify({"message": f"Lỗi lấy dữ liệu: {str(e)}"}), 500
 
-if __name__ == '__main__':
+# --- API 5: THỐNG KÊ ĐƠN HÀNG (Admin Dashboard) ---
+# Các trạng thái được tính vào doanh thu
+REVENUE_STATUSES = ('Paid', 'Scheduled', 'Confirmed')
+
+@app.route('/api/v1/orders/stats', methods=['GET'])
+def get_order_stats():
+    """Đếm đơn theo trạng thái và tổng doanh thu bằng một câu GROUP BY (cho Admin Dashboard)."""
+    if request.headers.get('X-User-Role') != 'admin':
+        return jsonify({"message": "Chỉ Admin mới có quyền thực hiện"}), 403
+
+    rows = db.session.query(Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0)) \
+        .group_by(Order.status).all()
+    return jsonify({
+        "status_counts": {status: count for status, count, _ in rows},
+        "revenue": sum(amount for status, _, amount in rows if status in REVENUE_STATUSES)
+    }), 200
+
+def initialize_db():
+    """Tạo bảng và index còn thiếu (chạy một lần khi khởi động)"""
     with app.app_context():
         db.create_all()
+        ensure_schema()
         print("Order Service Database initialized!")
-    app.run(host='0.0.0.0', port=5003)
\ No newline at end of file
+
+if __name__ == '__main__':
+    # Server dev; production chạy qua common/serve.py (xem Dockerfile)
+    initialize_db()
+    app.run(host='0.0.0.0', port=int(os.environ.get('ORDER_PORT', 5003)))
\ No newline at end of file
@@ -1,6 +1,7 @@
 # order-service/database.py
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -8,16 +9,22 @@ db = SQLAlchemy()
 class Order(db.Model):
     """Mô hình đơn hàng, liên kết với User Service (T1)."""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Phục vụ phân trang keyset (id giảm dần) khi lọc theo khách hàng hoặc trạng thái
+        db.Index('ix_orders_user_id_id', 'user_id', 'id'),
+        db.Index('ix_orders_status_id', 'status', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     # user_id: Khóa ngoại giả định, liên kết với User Service (T1)
     user_id = db.Column(db.Integer, nullable=False) 
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    order_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(50), default='Pending') # Pending, Paid, Scheduled, Confirmed, Cancelled
     total_amount = db.Column(db.Integer, default=0) # Tổng tiền
     
     # Mối quan hệ với các mặt hàng trong đơn hàng
-    items = db.relationship('OrderItem', backref='order', lazy='dynamic')
+    # selectin: tải items của cả trang đơn hàng bằng 1 query (không phải 1 query/đơn)
+    items = db.relationship('OrderItem', backref='order', lazy='selectin')
 
     def to_dict(self):
         """Chuyển đổi đối tượng Order thành dictionary để trả về JSON."""
@@ -29,7 +36,7 @@ class Order(db.Model):
             'status': self.status,
             'total_amount': self.total_amount,
             # Lấy chi tiết các mặt hàng
-            'items': [item.to_dict() for item in self.items.all()] 
+            'items': [item.to_dict() for item in self.items] 
         }
 
 class OrderItem(db.Model):
@@ -37,11 +44,13 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     # car_model_id: Khóa ngoại giả định, liên kết với Catalog Service (T2)
     car_model_id = db.Column(db.Integer, nullable=False) 
     quantity = db.Column(db.Integer, default=1)
     unit_price = db.Column(db.Integer, nullable=False) # Giá tại thời điểm đặt hàng
+    # reservation_id: Phiếu giữ chỗ bên Catalog Service, được xác nhận khi thanh toán
+    reservation_id = db.Column(db.String(36), nullable=True)
     
     def to_dict(self):
         """Chuyển đổi đối tượng OrderItem thành dictionary."""
@@ -52,4 +61,14 @@ class OrderItem(db.Model):
             'quantity': self.quantity,
             'unit_price': self.unit_price,
             'subtotal': self.quantity * self.unit_price
-        }
\ No newline at end of file
+        }
+
+def ensure_schema():
+    """Bổ sung cột và index mới cho DB đã tồn tại (db.create_all không sửa bảng cũ)."""
+    columns = {c['name'] for c in inspect(db.engine).get_columns('order_items')}
+    if 'reservation_id' not in columns:
+        db.session.execute(text('ALTER TABLE order_items ADD COLUMN reservation_id VARCHAR(36)'))
+        db.session.commit()
+    for table in (Order.__table__, OrderItem.__table__):
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -1,27 +1,59 @@
 # user-service/app.py
 
+import hmac
+import os
+import sys
+# Thư mục gốc dự án chứa package common/ khi chạy local (trong container common/ nằm cạnh app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from flask import Flask, request, jsonify
 import jwt 
 import datetime
-import os
 from flask_cors import CORS 
-from passlib.context import CryptContext
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
+from cache import TTLCache
+from passwords import HasherBusy, PasswordHasher
+from common import metrics, profiling
+from common.db import configure_database
+from common.deadline import check_deadline, init_app as init_deadlines
 
 app = Flask(__name__)
 # Cho phép CORS để Gateway và Frontend có thể gọi API
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Số liệu độ trễ/DB/in-flight tại /metrics và header Server-Timing (xem common/metrics.py)
+metrics.init_app(app, 'users')
+# Profile theo yêu cầu (header X-Profile hoặc PROFILE_SAMPLE_RATE), xem common/profiling.py
+profiling.init_app(app, 'users')
+
 # --- CẤU HÌNH BẢO MẬT ---
 # Lấy Key từ Docker, nếu không có dùng key mặc định
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'vinfast_secret_key_mac_dinh_123')
+# Tin header X-User-Id do Gateway gắn (Gateway đã kiểm tra JWT) thay vì tự giải mã JWT.
+# Chỉ bật khi chạy sau Gateway, và chỉ tin request mang đúng X-Gateway-Secret = GATEWAY_SECRET
+TRUST_GATEWAY_HEADERS = os.environ.get('TRUST_GATEWAY_HEADERS', '0') == '1'
+GATEWAY_SECRET = os.environ.get('GATEWAY_SECRET', '')
+if TRUST_GATEWAY_HEADERS and not GATEWAY_SECRET:
+    print("⚠️ TRUST_GATEWAY_HEADERS=1 nhưng chưa đặt GATEWAY_SECRET: vẫn yêu cầu JWT cho mọi request")
 
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///user_service.db") 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Cấu hình DB (WAL, busy timeout, pool... xem common/db.py)
+configure_database(app, "sqlite:///user_service.db")
 
 db = SQLAlchemy(app)
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
+# Deadline từ Gateway (X-Deadline-Ms): request đến nơi đã hết hạn bị trả 504
+init_deadlines(app)
+
+# Cache thông tin công khai của user (id, name, email, role) cho các API tra cứu
+user_cache = TTLCache(ttl=int(os.environ.get("USER_CACHE_TTL", 30)),
+                      max_entries=int(os.environ.get("USER_CACHE_MAX_ENTRIES", 10000)))
+
+# Số id + email tối đa trong một lần tra cứu theo lô
+MAX_BULK_LOOKUP = int(os.environ.get("MAX_BULK_LOOKUP", 200))
+
+# Băm mật khẩu trên process pool riêng (xem passwords.py)
+password_hasher = PasswordHasher()
 
 # --- MODEL DỮ LIỆU ---
 class User(db.Model):
@@ -34,11 +66,14 @@ class User(db.Model):
 
     def set_password(self, password):
         """Mã hóa mật khẩu"""
-        self.password_hash = pwd_context.hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password):
-        """Xác thực mật khẩu"""
-        return pwd_context.verify(password, self.password_hash)
+        """Xác thực mật khẩu; nếu hash cũ lỗi thời (đổi số vòng băm) thì thay bằng hash mới"""
+        valid, new_hash = password_hasher.verify_and_update(password, self.password_hash)
+        if valid and new_hash:
+            self.password_hash = new_hash
+        return valid
 
     def to_dict(self):
         """Trả về dữ liệu dạng dictionary cho Frontend"""
@@ -49,26 +84,66 @@ class User(db.Model):
             'role': self.role
         }
 
+# --- HÀM PHỤ TRỢ: Cache thông tin user ---
+def cache_user(user_data):
+    """Lưu thông tin user vào cache theo cả id và email"""
+    user_cache.set(('id', user_data['id']), user_data)
+    user_cache.set(('email', user_data['email'].lower()), user_data)
+
+def forget_user(user_id, *emails):
+    """Xóa user khỏi cache khi thông tin thay đổi"""
+    user_cache.delete(('id', user_id), *(('email', e.lower()) for e in emails if e))
+
 # --- HÀM PHỤ TRỢ: Lấy User từ Token ---
+def from_gateway():
+    """Request do Gateway chuyển tới (header X-Gateway-Secret khớp secret dùng chung)?"""
+    secret = request.headers.get('X-Gateway-Secret')
+    return bool(GATEWAY_SECRET) and secret is not None and hmac.compare_digest(secret, GATEWAY_SECRET)
+
 def get_user_from_token():
-    """Hàm giải mã token từ Header Authorization"""
+    """Lấy user hiện tại: ưu tiên header X-User-Id của Gateway, nếu không có thì tự giải mã token"""
+    gateway_user_id = request.headers.get('X-User-Id') if TRUST_GATEWAY_HEADERS and from_gateway() else None
+    if gateway_user_id:
+        try:
+            user_id = int(gateway_user_id)
+        except ValueError:
+            return None, "Token không hợp lệ hoặc đã hết hạn"
+    else:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return None, "Thiếu Token xác thực"
+        try:
+            token = auth_header.split(" ")[1]
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+            user_id = payload['user_id']
+        except Exception:
+            return None, "Token không hợp lệ hoặc đã hết hạn"
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return None, "User không tồn tại"
+    return user, None
+
+def is_internal_or_admin():
+    """API nội bộ: chỉ Gateway (kèm GATEWAY_SECRET) hoặc Admin (JWT role admin) được gọi"""
+    if from_gateway():
+        return True
     auth_header = request.headers.get('Authorization')
     if not auth_header:
-        return None, "Thiếu Token xác thực"
-    
+        return False
     try:
-        token = auth_header.split(" ")[1]
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
-        user_id = payload['user_id']
-        user = User.query.get(user_id)
-        if not user:
-            return None, "User không tồn tại"
-        return user, None
+        payload = jwt.decode(auth_header.split(" ")[1], JWT_SECRET_KEY, algorithms=['HS256'])
     except Exception:
-        return None, "Token không hợp lệ hoặc đã hết hạn"
+        return False
+    return payload.get('role') == 'admin'
 
 # --- API ENDPOINTS ---
 
+@app.errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    """Quá nhiều yêu cầu băm mật khẩu đang chờ: báo Client thử lại sau"""
+    return jsonify({"message": "Hệ thống đang bận, vui lòng thử lại sau"}), 503, {"Retry-After": "1"}
+
 @app.route('/api/v1/users/register', methods=['POST'])
 def register():
     """Đăng ký tài khoản mới"""
@@ -98,7 +173,12 @@ def login():
     password = data.get('password')
     user = User.query.filter_by(email=email).first()
 
+    # Băm mật khẩu là bước tốn CPU nhất: bỏ qua nếu bên gọi đã hết thời gian chờ
+    check_deadline('hash')
     if user and user.verify_password(password):
+        # Lưu hash mới nếu mật khẩu vừa được băm lại theo cấu hình hiện tại
+        if user in db.session.dirty:
+            db.session.commit()
         token_payload = {
             'user_id': user.id,
             'role': user.role,
@@ -117,10 +197,57 @@ def login():
 @app.route('/api/v1/users/<int:user_id>', methods=['GET'])
 def get_user_info(user_id):
     """Lấy thông tin một user cụ thể (Dùng cho Admin Dashboard)"""
-    user = User.query.get(user_id)
-    if user:
-        return jsonify(user.to_dict()), 200
-    return jsonify({"message": "User không tồn tại"}), 404
+    user_data = user_cache.get(('id', user_id))
+    if user_data is None:
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({"message": "User không tồn tại"}), 404
+        user_data = user.to_dict()
+        cache_user(user_data)
+    return jsonify(user_data), 200
+
+@app.route('/api/v1/users/bulk', methods=['POST'])
+def get_users_bulk():
+    """Lấy thông tin nhiều user theo danh sách id và/hoặc email bằng một query (Dùng cho Admin Dashboard)"""
+    if not is_internal_or_admin():
+        return jsonify({"message": "API nội bộ, chỉ Gateway hoặc Admin được gọi"}), 403
+    data = request.json or {}
+    ids = data.get('ids') or []
+    emails = data.get('emails') or []
+
+    if not isinstance(ids, list) or not isinstance(emails, list):
+        return jsonify({"message": "ids và emails phải là danh sách"}), 400
+    if len(ids) + len(emails) > MAX_BULK_LOOKUP:
+        return jsonify({"message": f"Tối đa {MAX_BULK_LOOKUP} id/email mỗi lần"}), 400
+    try:
+        ids = {int(i) for i in ids}
+    except (TypeError, ValueError):
+        return jsonify({"message": "ids phải là số nguyên"}), 400
+    emails = {str(e).lower() for e in emails}
+
+    # Lấy từ cache trước, chỉ truy vấn DB phần còn thiếu (một query cho cả id và email)
+    cached = list(user_cache.get_many([('id', i) for i in ids]).values()) + \
+        list(user_cache.get_many([('email', e) for e in emails]).values())
+    missing_ids = ids - {u['id'] for u in cached}
+    missing_emails = emails - {u['email'].lower() for u in cached}
+
+    found = []
+    if missing_ids or missing_emails:
+        users = User.query.filter(
+            User.id.in_(missing_ids) | func.lower(User.email).in_(missing_emails)
+        ).all()
+        found = [user.to_dict() for user in users]
+        for user_data in found:
+            cache_user(user_data)
+
+    result = {u['id']: u for u in cached + found}
+    return jsonify({
+        "users": list(result.values()),
+        "not_found": {
+            "ids": sorted(ids - set(result)),
+            "emails": sorted(emails - {u['email'].lower() for u in result.values()})
+        }
+    }), 200
 
 @app.route('/api/v1/users/update', methods=['PUT'])
 def update_profile():
@@ -132,6 +259,7 @@ def update_profile():
     data = request.json
     new_name = data.get('name')
     new_email = data.get('email')
+    old_email = user.email
 
     if new_name:
         user.name = new_name
@@ -142,6 +270,7 @@ def update_profile():
         user.email = new_email
 
     db.session.commit()
+    forget_user(user.id, old_email, user.email)
     return jsonify({"message": "Cập nhật thành công!", "user": user.to_dict()}), 200
 
 @app.route('/api/v1/users/change-password', methods=['PUT'])
@@ -177,7 +306,8 @@ def get_user_role_stats():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-if __name__ == '__main__':
+def initialize_db():
+    """Tạo bảng và tài khoản Admin mặc định (chạy một lần khi khởi động)"""
     with app.app_context():
         db.create_all()
         # Tạo tài khoản Admin mặc định
@@ -187,6 +317,14 @@ if __name__ == '__main__':
             db.session.add(admin)
             db.session.commit()
             print("✅ Đã khởi tạo Admin mặc định: admin@vinfast.com / admin123")
+    # Không để pool băm của tiến trình khởi tạo bị fork sang các worker
+    password_hasher.shutdown()
+
+if __name__ == '__main__':
+    # Server dev; production chạy qua common/serve.py (xem Dockerfile)
+    initialize_db()
+    password_hasher.start()
 
-    print("User Service đang khởi động trên cổng 5001...")
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    port = int(os.environ.get('USER_PORT', 5001))
+    print(f"User Service đang khởi động trên cổng {port}...")
+    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+# user-service/passwords.py
+"""Băm/xác thực mật khẩu trên process pool riêng, có giới hạn hàng đợi.
+
+PBKDF2 tốn CPU và giữ GIL, nên chạy ngay trong luồng request sẽ làm các request
+khác (kể cả API nhẹ) phải xếp hàng khi có nhiều người đăng nhập cùng lúc. Ở đây
+mỗi lần băm được đẩy sang một process con; khi số việc đang chờ vượt
+PASSWORD_QUEUE_DEPTH thì từ chối ngay (503) thay vì để hàng đợi dài vô hạn.
+
+Cấu hình qua biến môi trường:
+  PASSWORD_HASH_ROUNDS   số vòng PBKDF2 (đổi giá trị -> hash cũ được băm lại khi đăng nhập)
+  PASSWORD_WORKERS       số process băm (0 = băm ngay trong luồng request)
+  PASSWORD_QUEUE_DEPTH   số việc băm tối đa đang chạy + chờ
+  PASSWORD_HASH_TIMEOUT  số giây chờ tối đa một việc băm
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from passlib.context import CryptContext
+
+HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", 29000))
+WORKERS = int(os.environ.get("PASSWORD_WORKERS", os.cpu_count() or 1))
+QUEUE_DEPTH = int(os.environ.get("PASSWORD_QUEUE_DEPTH", max(WORKERS, 1) * 8))
+HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+# min/max_desired_rounds = HASH_ROUNDS: hash có số vòng khác cấu hình hiện tại bị coi là lỗi thời
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=HASH_ROUNDS,
+    pbkdf2_sha256__min_desired_rounds=HASH_ROUNDS,
+    pbkdf2_sha256__max_desired_rounds=HASH_ROUNDS
+)
+
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password, password_hash):
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+class HasherBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy hoặc việc băm chờ quá lâu."""
+
+
+class PasswordHasher:
+    """Chạy việc băm trên process pool, giới hạn số việc đồng thời bằng semaphore."""
+
+    def __init__(self, workers=WORKERS, queue_depth=QUEUE_DEPTH, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Tạo process pool và khởi động sẵn các process (gọi trước khi nhận request)."""
+        if self.workers <= 0:
+            return
+        with self._lock:
+            if self._executor is None:
+                # spawn: process con không kế thừa luồng/kết nối DB của tiến trình web
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        for future in [self._executor.submit(_hash, 'warmup') for _ in range(self.workers)]:
+            future.result()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            if self._executor is None:
+                self.start()
+            return self._executor.submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify_and_update(self, password, password_hash):
+        """Trả về (đúng mật khẩu?, hash mới nếu hash cũ cần băm lại theo cấu hình hiện tại)."""
+        return self._run(_verify_and_update, password, password_hash)
+
+    def shutdown(self):
+        """Đóng pool; lần băm kế tiếp sẽ tạo pool mới (ví dụ trong worker sau khi fork)."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None